@@ -0,0 +1,7 @@
+# Mock LLM server
+from .mock_server import *
+
+# Synthetic input
+from .data import *
+
+# Scenarios: python -m bench.run {throughput,resume,suite}
@@ -0,0 +1,77 @@
+import random
+
+import pandas as pd
+
+from utils import ChunkWriter
+
+
+COLUMNS = ["공정", "세부공정", "설비", "물질", "유해위험요인", "감소대책", "사고분류"]
+
+# 실제 위험성평가 workbook과 비슷한 길이/어휘의 값들
+PROCESSES = ["가설공사", "토공사", "철근콘크리트공사", "철골공사", "조적공사", "전기공사", "설비공사", "도장공사", "방수공사", "해체공사"]
+SUB_PROCESSES = ["비계 설치", "거푸집 조립", "철근 배근", "콘크리트 타설", "자재 양중", "용접 작업", "배관 설치", "굴착", "되메우기", None]
+EQUIPMENT = ["이동식 크레인", "고소작업대", "타워크레인", "굴착기", "지게차", "용접기", "그라인더", "전동드릴", "사다리", None]
+MATERIALS = ["시멘트", "페인트", "신나", "용접봉", "철근", "합판", "석면", None, None, None]
+HAZARDS = [
+    "작업발판 단부에서 이동 중 안전난간 미설치로 추락 위험",
+    "인양 중인 자재가 결속 불량으로 낙하하여 하부 작업자와 충돌 위험",
+    "그라인더 작업 중 회전날에 손가락이 말려 끼임 위험",
+    "가설전선 피복 손상 부위 접촉으로 감전 위험",
+    "밀폐공간 내 환기 불량으로 산소결핍에 의한 질식 위험",
+    "용접 불티가 가연물에 비산되어 화재 발생 및 화상 위험",
+    "굴착면 붕괴로 작업자가 토사에 깔림 위험",
+    "바닥 자재 정리 불량으로 이동 중 걸려 넘어짐 위험",
+    "절단 작업 중 날카로운 단부에 베임 위험",
+    "분진이 많은 환경에서 장시간 작업으로 호흡기 질환 위험",
+]
+MEASURES = [
+    "안전난간 설치 및 안전대 착용 철저",
+    "양중 전 결속상태 확인 및 하부 출입통제",
+    "회전체 방호덮개 설치 및 장갑 착용 금지",
+    "누전차단기 설치 및 전선 피복 상태 점검",
+    "작업 전 산소농도 측정 및 강제 환기",
+    "불티 비산방지포 설치 및 소화기 비치",
+    "굴착면 기울기 준수 및 흙막이 설치",
+    "작업장 정리정돈 및 통로 확보",
+    "보호장갑 착용 및 절단면 보호캡 설치",
+    "방진마스크 착용 및 살수 작업",
+]
+
+# HAZARDS와 같은 순서의 정답 사고 유형 (유사 라벨 인덱스 벤치마크용)
+HAZARD_TYPES = ["떨어짐", "충돌 및 접촉", "끼임", "감전", "질식", "화상", "깔림", "넘어짐", "절상(절단,찔림,베임)", "질병"]
+
+
+def synthetic_frame(n_rows: int, duplicate_ratio: float = 0.3, seed: int = 0, start: int = 0, labeled: bool = False) -> pd.DataFrame:
+    """
+    workbook 컬럼 구조의 synthetic row. duplicate_ratio만큼은 앞서 나온 row를 그대로 반복 (실제 데이터의 중복 비율 흉내).
+    start는 chunk 단위로 생성할 때 row 번호가 이어지도록 하는 offset. labeled면 사고분류에 HAZARD_TYPES의 정답 유형을 채움 (평가 벤치마크용).
+    """
+    rng = random.Random(seed * 1_000_003 + start)
+    rows = []
+    for i in range(start, start + n_rows):
+        if rows and rng.random() < duplicate_ratio:
+            rows.append(dict(rng.choice(rows)))
+            continue
+        hazard = rng.randrange(len(HAZARDS))
+        rows.append({
+            "공정": rng.choice(PROCESSES),
+            "세부공정": rng.choice(SUB_PROCESSES),
+            "설비": rng.choice(EQUIPMENT),
+            "물질": rng.choice(MATERIALS),
+            # 같은 문장이라도 위치 번호를 붙여 고유 content가 충분히 나오도록 함
+            "유해위험요인": f"{HAZARDS[hazard]} (구역 {i % 997})",
+            "감소대책": MEASURES[hazard],
+            "사고분류": HAZARD_TYPES[hazard] if labeled else None,
+        })
+    return pd.DataFrame(rows, columns=COLUMNS)
+
+
+def write_synthetic(path: str, n_rows: int, duplicate_ratio: float = 0.3, seed: int = 0, chunksize: int = 10_000, labeled: bool = False) -> str:
+    """synthetic row를 chunk 단위로 생성해서 xlsx/csv/parquet 파일로 저장 (100k row도 메모리에 한 번에 올리지 않음)."""
+    with ChunkWriter(path) as writer:
+        for start in range(0, n_rows, chunksize):
+            writer.write(synthetic_frame(min(chunksize, n_rows - start), duplicate_ratio, seed, start, labeled))
+    return path
+
+
+__all__ = ["COLUMNS", "HAZARD_TYPES", "synthetic_frame", "write_synthetic"]
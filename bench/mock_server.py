@@ -0,0 +1,344 @@
+import email.parser
+import hashlib
+import json
+import math
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from fire import Fire
+
+from prompts import ACCIDENT_TYPES
+
+
+_PACKED_ITEM = re.compile(r"^(\d+)\.$", re.M)
+
+
+def parse_latency(spec: str):
+    """
+    응답 지연 분포. "const:0.05", "uniform:0.02:0.2", "lognormal:0.8:0.5"(중앙값, sigma).
+    random.Random을 받아 초 단위 지연을 반환하는 함수를 돌려줌.
+    """
+    kind, *params = str(spec).split(":")
+    params = [float(param) for param in params]
+    if kind == "const":
+        return lambda rng: params[0]
+    if kind == "uniform":
+        return lambda rng: rng.uniform(params[0], params[1])
+    if kind == "lognormal":
+        return lambda rng: rng.lognormvariate(math.log(params[0]), params[1])
+    raise ValueError(f"unknown latency distribution: {spec}")
+
+
+def _stable_random(*parts) -> random.Random:
+    """같은 입력(content, 시도 차수)에는 항상 같은 답을 하도록 입력 해시로 seed."""
+    seed = hashlib.sha256("\x1f".join(str(part) for part in parts).encode("utf-8")).digest()[:8]
+    return random.Random(int.from_bytes(seed, "big"))
+
+
+class MockLLM:
+    """
+    OpenAI/Ollama 호환 mock의 응답 생성기.
+    latency: parse_latency 형식, rate_limit: 429를 돌려줄 확률, pass_rates: 시도 차수별 평가 PASS 확률(마지막 값 반복).
+    disagreement: n= 샘플링에서 두 번째 이후 샘플이 다른 라벨을 낼 확률.
+    errors: OpenAI 호환 경로(/v1)가 503을 돌려줄 확률 (Ollama 경로는 정상, failover 확인용).
+    stall: stall_time초 동안 응답하지 않을 확률 (꼬리 latency, hedge/deadline 확인용).
+    """
+
+    def __init__(self, latency: str = "lognormal:0.8:0.5", rate_limit: float = 0.0, pass_rates: str = "0.7,0.9,1.0", seed: int = 0, retry_after: float = 0.05, disagreement: float = 0.2,
+                 errors: float = 0.0, stall: float = 0.0, stall_time: float = 30.0):
+        self.latency = parse_latency(latency)
+        self.rate_limit = float(rate_limit)
+        self.pass_rates = [float(rate) for rate in (pass_rates if isinstance(pass_rates, (list, tuple)) else str(pass_rates).split(","))]
+        self.retry_after = retry_after
+        self.disagreement = float(disagreement)
+        self.errors, self.stall, self.stall_time = float(errors), float(stall), float(stall_time)
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.files, self.batches = {}, {}
+        # 평가 프롬프트에는 시도 차수가 없으므로, 분류 응답을 만들 때 그 라벨 조합에 대한 판정을 미리 정해둠
+        self.verdicts = {}
+        self.stats = {"requests": 0, "rate_limited": 0, "classifier": 0, "evaluator": 0, "packed": 0, "batch_requests": 0, "prompt_tokens": 0, "errors": 0, "stalls": 0}
+
+    def count(self, name: str, value: int = 1) -> None:
+        with self.lock:
+            self.stats[name] += value
+
+    def sample_delay(self) -> float:
+        with self.lock:
+            return self.latency(self.rng)
+
+    def should_rate_limit(self) -> bool:
+        with self.lock:
+            return self.rng.random() < self.rate_limit
+
+    def should_fail(self) -> bool:
+        with self.lock:
+            return self.rng.random() < self.errors
+
+    def should_stall(self) -> bool:
+        with self.lock:
+            return self.rng.random() < self.stall
+
+    def pass_probability(self, attempt: int) -> float:
+        return self.pass_rates[min(attempt, len(self.pass_rates)) - 1]
+
+    def _labels(self, content: str, attempt: int = 1, sample: int = 0) -> list:
+        """content와 시도 차수로 정해지는 라벨. 같은 라벨 조합을 평가할 때의 판정도 이때 정함."""
+        if sample and _stable_random("sample", content, attempt, sample).random() < self.disagreement:
+            # 다수결과 어긋나는 샘플: 판정은 기록하지 않음
+            rng = _stable_random("labels", content, attempt, sample)
+            return sorted(rng.sample(ACCIDENT_TYPES, rng.choice((1, 2))), key=ACCIDENT_TYPES.index)
+        rng = _stable_random("labels", content, attempt)
+        labels = sorted(rng.sample(ACCIDENT_TYPES, rng.choice((1, 1, 2, 3))), key=ACCIDENT_TYPES.index)
+        verdict = "PASS" if rng.random() < self.pass_probability(attempt) else "FAIL"
+        with self.lock:
+            self.verdicts[";".join(labels)] = verdict
+        return labels
+
+    def _verdict(self, labels: str) -> str:
+        labels = ";".join(label for label in ACCIDENT_TYPES if label in labels)
+        with self.lock:
+            return self.verdicts.get(labels) or ("PASS" if self.rng.random() < self.pass_rates[0] else "FAIL")
+
+    def answer(self, messages: list, structured: bool, sample: int = 0) -> str:
+        """메시지로부터 분류/평가/묶음 프롬프트를 구분해서 scripted 응답을 생성."""
+        text = "\n".join(str(message.get("content") or "") for message in messages)
+        last = str(messages[-1].get("content") or "") if messages else ""
+        # 분류 프롬프트의 재시도 차수 = 앞선 피드백 턴 수 + 1
+        attempt = text.count("사고 유형 분류 피드백") + 1
+
+        if "작업내용 목록:" in last:
+            self.count("packed")
+            items = _PACKED_ITEM.split(last.split("작업내용 목록:")[-1])[1:]
+            results = [
+                {"id": int(n), "labels": self._labels(item.split("차 사고 유형 분류 결과")[0].strip(), item.count("사고 유형 분류 피드백") + 1)}
+                for n, item in zip(items[::2], items[1::2])
+            ]
+            return json.dumps({"results": results}, ensure_ascii=False)
+        if "분류 결과 목록:" in last:
+            self.count("packed")
+            # 항목 = "n.\n<작업내용>\n사고 유형 분류 결과: <라벨>"
+            items = _PACKED_ITEM.split(last.split("분류 결과 목록:")[-1])[1:]
+            results = [
+                {"id": int(n), "result": self._verdict(item.split("사고 유형 분류 결과:")[-1]), "feedback": "누락된 사고 유형이 있습니다."}
+                for n, item in zip(items[::2], items[1::2])
+            ]
+            return json.dumps({"results": results}, ensure_ascii=False)
+
+        if "분류 결과를 평가" in text:
+            self.count("evaluator")
+            verdict = self._verdict(text.split("사고 유형 분류 결과")[-1])
+            reasons = [] if verdict == "PASS" else ["유해위험요인에 비해 누락된 사고 유형이 있습니다."]
+            if structured:
+                return json.dumps({"verdict": verdict, "reasons": reasons}, ensure_ascii=False)
+            return "\n".join([f"평가결과 = {verdict}", *(f"- {reason}" for reason in reasons)])
+
+        self.count("classifier")
+        content = text.split("건설 현장 작업내용:")[-1].split("차 사고 유형 분류")[0]
+        labels = self._labels(content.strip(), attempt, sample)
+        if structured:
+            return json.dumps({"labels": labels}, ensure_ascii=False)
+        return ";".join(labels)
+
+    def usage(self, messages: list, completion: str) -> dict:
+        """한글 기준 대략 1자=1token. system 메시지가 1024 token 이상이면 128 단위로 cached 처리 (OpenAI prompt caching 흉내)."""
+        prompt_tokens = sum(len(str(message.get("content") or "")) for message in messages)
+        system = sum(len(str(message.get("content") or "")) for message in messages if message.get("role") == "system")
+        cached = system // 128 * 128 if system >= 1024 else 0
+        self.count("prompt_tokens", prompt_tokens)
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": len(completion), "cached_tokens": cached}
+
+    def run_batch(self, batch_id: str, request: dict) -> dict:
+        """batch 입력 파일의 요청을 지연 없이 처리해서 출력 파일을 만들고 완료된 batch 객체를 반환."""
+        lines = []
+        for line in self.files[request["input_file_id"]].decode("utf-8").splitlines():
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            self.count("batch_requests")
+            body = item["body"]
+            content = self.answer(body["messages"], "response_format" in body)
+            lines.append(json.dumps({
+                "id": f"resp-{item['custom_id']}",
+                "custom_id": item["custom_id"],
+                "response": {"status_code": 200, "body": chat_completion(body["model"], content, self.usage(body["messages"], content))},
+                "error": None,
+            }, ensure_ascii=False))
+        output_id = self.add_file("\n".join(lines).encode("utf-8"))
+        batch = {
+            "id": batch_id, "object": "batch", "endpoint": request.get("endpoint"), "errors": None,
+            "input_file_id": request["input_file_id"], "completion_window": request.get("completion_window", "24h"),
+            "status": "completed", "output_file_id": output_id, "error_file_id": None, "created_at": int(time.time()),
+            "request_counts": {"total": len(lines), "completed": len(lines), "failed": 0}, "metadata": request.get("metadata"),
+        }
+        self.batches[batch_id] = batch
+        return batch
+
+    def add_file(self, payload: bytes) -> str:
+        with self.lock:
+            file_id = f"file-{len(self.files)}"
+            self.files[file_id] = payload
+        return file_id
+
+
+def chat_completion(model: str, content: str | list, usage: dict) -> dict:
+    contents = content if isinstance(content, list) else [content]
+    return {
+        "id": "chatcmpl-mock", "object": "chat.completion", "created": int(time.time()), "model": model,
+        "choices": [{"index": i, "finish_reason": "stop", "message": {"role": "assistant", "content": text}} for i, text in enumerate(contents)],
+        "usage": {
+            "prompt_tokens": usage["prompt_tokens"], "completion_tokens": usage["completion_tokens"],
+            "total_tokens": usage["prompt_tokens"] + usage["completion_tokens"],
+            "prompt_tokens_details": {"cached_tokens": usage["cached_tokens"]},
+        },
+    }
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # 헤더와 본문을 따로 write하므로 Nagle + delayed ACK로 요청마다 ~40ms가 더해지지 않도록 끔
+    disable_nagle_algorithm = True
+
+    @property
+    def llm(self) -> MockLLM:
+        return self.server.llm
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status: int, payload, content_type: str = "application/json", headers: dict = None) -> None:
+        data = payload if isinstance(payload, bytes) else json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def do_GET(self):
+        if self.path == "/stats":
+            return self._send(200, self.llm.stats)
+        match = re.fullmatch(r"/v1/files/([^/]+)/content", self.path)
+        if match and match.group(1) in self.llm.files:
+            return self._send(200, self.llm.files[match.group(1)], "application/octet-stream")
+        match = re.fullmatch(r"/v1/batches/([^/]+)", self.path)
+        if match and match.group(1) in self.llm.batches:
+            return self._send(200, self.llm.batches[match.group(1)])
+        self._send(404, {"error": {"message": f"not found: {self.path}"}})
+
+    def do_POST(self):
+        body = self._body()
+        if not body:
+            # 요청을 보내는 도중 클라이언트가 종료된 경우
+            self.close_connection = True
+            return None
+        self.llm.count("requests")
+        if self.path == "/v1/files":
+            return self._upload(body)
+        if self.path == "/v1/batches":
+            request = json.loads(body)
+            return self._send(200, self.llm.run_batch(f"batch-{len(self.llm.batches)}", request))
+        if self.path not in ("/v1/chat/completions", "/api/chat"):
+            return self._send(404, {"error": {"message": f"not found: {self.path}"}})
+
+        if self.llm.should_rate_limit():
+            self.llm.count("rate_limited")
+            headers = {"retry-after-ms": str(int(self.llm.retry_after * 1000)), "x-ratelimit-remaining-requests": "0"}
+            return self._send(429, {"error": {"message": "Rate limit reached (mock)", "type": "requests", "code": "rate_limit_exceeded"}}, headers=headers)
+        if self.path.startswith("/v1/") and self.llm.should_fail():
+            self.llm.count("errors")
+            return self._send(503, {"error": {"message": "Service unavailable (mock)", "type": "server_error", "code": None}})
+        if self.llm.should_stall():
+            self.llm.count("stalls")
+            time.sleep(self.llm.stall_time)
+        time.sleep(self.llm.sample_delay())
+
+        request = json.loads(body)
+        messages = request["messages"]
+        if self.path == "/api/chat":
+            return self._ollama(request, messages)
+        # n= 샘플링: prompt token은 한 번, completion token은 샘플 합계
+        contents = [self.llm.answer(messages, "response_format" in request, sample=i) for i in range(int(request.get("n") or 1))]
+        headers = {"x-ratelimit-remaining-requests": "10000", "x-ratelimit-remaining-tokens": "10000000"}
+        self._send(200, chat_completion(request["model"], contents, self.llm.usage(messages, "".join(contents))), headers=headers)
+
+    def _ollama(self, request: dict, messages: list) -> None:
+        content = self.llm.answer(messages, "format" in request)
+        usage = self.llm.usage(messages, content)
+        frames = [{"model": request["model"], "message": {"role": "assistant", "content": content[i:i + 8]}, "done": False} for i in range(0, len(content), 8)]
+        frames.append({"model": request["model"], "message": {"role": "assistant", "content": ""}, "done": True, "prompt_eval_count": usage["prompt_tokens"], "eval_count": usage["completion_tokens"]})
+        self._send(200, "".join(json.dumps(frame, ensure_ascii=False) + "\n" for frame in frames).encode("utf-8"), "application/x-ndjson")
+
+    def _upload(self, body: bytes) -> None:
+        """multipart/form-data에서 file 파트만 꺼내서 저장."""
+        message = email.parser.BytesParser().parsebytes(f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode("utf-8") + body)
+        payload = next((part.get_payload(decode=True) for part in message.walk() if part.get_filename()), b"")
+        file_id = self.llm.add_file(payload)
+        self._send(200, {"id": file_id, "object": "file", "bytes": len(payload), "created_at": int(time.time()), "filename": "batch.jsonl", "purpose": "batch", "status": "processed"})
+
+
+class _QuietServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # resume 시나리오에서 클라이언트를 SIGKILL하면 끊긴 연결 에러가 나므로 그 경우는 출력하지 않음
+        if isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            return
+        super().handle_error(request, client_address)
+
+
+class MockServer:
+    """백그라운드 스레드에서 도는 mock 서버. url은 OLLAMA_ENDPOINT, url + "/v1"은 OPENAI_BASE_URL로 사용."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, **config):
+        self.httpd = _QuietServer((host, port), MockHandler)
+        self.httpd.llm = MockLLM(**config)
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def stats(self) -> dict:
+        return dict(self.httpd.llm.stats)
+
+    def start(self) -> "MockServer":
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def serve(host: str = "127.0.0.1", port: int = 8765, **config):
+    """단독 실행: python -m bench.mock_server --port 8765 --latency const:0.1 --rate_limit 0.05"""
+    server = MockServer(host, port, **config)
+    print(f"mock LLM server: {server.url} (OPENAI_BASE_URL={server.url}/v1, OLLAMA_ENDPOINT={server.url})")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    Fire(serve)
+
+__all__ = ["MockLLM", "MockServer", "parse_latency"]
@@ -0,0 +1,529 @@
+import glob
+import itertools
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import httpx
+from fire import Fire
+
+from utils import KEY_COLUMNS, CheckpointStore, format_input_content, format_input_contents, group_rows, normalize_content
+from .data import HAZARD_TYPES, HAZARDS, synthetic_frame, write_synthetic
+from .mock_server import MockServer
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_PATH = os.path.join(ROOT, "bench", "results.jsonl")
+DEFAULT_SIZES = (1_000, 10_000, 100_000)
+# mock 서버에는 실제 rate limit이 없으므로 클라이언트 scheduler가 병목이 되지 않게 크게 잡음 (429는 --rate_limit으로 주입)
+BENCH_RATE_LIMITS = "gpt-4.1-mini=100000:1000000000,gpt-4.1=100000:1000000000"
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def save_result(result: dict, out: str = RESULTS_PATH) -> dict:
+    """결과를 JSONL 한 줄로 추가. commit/환경 정보를 같이 남겨서 회귀를 비교할 수 있게 함."""
+    result = dict(result, commit=git_revision(), python=platform.python_version(), ts=datetime.now().isoformat(timespec="seconds"))
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "a", encoding="utf-8") as f:
+        f.write(json.dumps(result, ensure_ascii=False) + "\n")
+    return result
+
+
+class Workspace:
+    """임시 작업 디렉터리 하나에 synthetic 입력, 체크포인트, 출력, 로그를 모아서 main.py를 subprocess로 실행."""
+
+    def __init__(self, rows: int, fmt: str = "csv", duplicate_ratio: float = 0.3, seed: int = 0, keep: bool = False, labeled: bool = False):
+        self.path = tempfile.mkdtemp(prefix="acc-bench-")
+        self.keep = keep
+        for name in ("data", "output", "logs"):
+            os.makedirs(os.path.join(self.path, name), exist_ok=True)
+        self.input = write_synthetic(os.path.join(self.path, "data", f"input.{fmt}"), rows, duplicate_ratio, seed, labeled=labeled)
+        self.rows = rows
+
+    def env(self, server: MockServer) -> dict:
+        return dict(
+            os.environ,
+            OPENAI_API_KEY="bench",
+            OPENAI_BASE_URL=server.url + "/v1",
+            OLLAMA_ENDPOINT=server.url,
+            TEMP_DIR=os.path.join(self.path, ".tmp"),
+            INPUT_DIR=os.path.join(self.path, "data"),
+            OUTPUT_DIR=os.path.join(self.path, "output"),
+            LLM_CACHE="off",
+            OPENAI_RATE_LIMITS=os.getenv("BENCH_RATE_LIMITS", BENCH_RATE_LIMITS),
+        )
+
+    def command(self, subcommand: str = "run", **options) -> list:
+        args = [sys.executable, os.path.join(ROOT, "main.py"), subcommand, "--input", self.input, "--format", "csv"]
+        for name, value in options.items():
+            if value is not None:
+                args += [f"--{name}", str(value)]
+        return args
+
+    def checkpointed(self) -> int:
+        store = CheckpointStore(os.path.join(self.path, ".tmp"))
+        return sum(1 for _ in store.iter_records()) if os.path.exists(os.path.join(store.path, "manifest.json")) else 0
+
+    def cleanup(self) -> None:
+        if not self.keep:
+            shutil.rmtree(self.path, ignore_errors=True)
+
+
+def run_process(args: list, env: dict, cwd: str, kill_when=None, poll: float = 0.2) -> dict:
+    """subprocess를 실행하고 wall time, peak RSS, 종료 코드를 측정. kill_when()이 True가 되면 SIGKILL."""
+    started = time.perf_counter()
+    # 콘솔 로그/tqdm 출력은 파이프 대신 파일로 받아서 자식 프로세스가 출력 때문에 막히지 않게 함
+    stderr = open(os.path.join(cwd, "stderr.log"), "ab+")
+    process = subprocess.Popen(args, env=env, cwd=cwd, stdout=subprocess.DEVNULL, stderr=stderr)
+    killed = False
+    # wait4로 이 자식 프로세스만의 rusage를 받음 (ru_maxrss는 Linux에서 KB). poll()은 자식을 먼저 회수해버리므로 사용하지 않음
+    while True:
+        pid, status, rusage = os.wait4(process.pid, 0 if kill_when is None else os.WNOHANG)
+        if pid:
+            break
+        if kill_when():
+            process.send_signal(signal.SIGKILL)
+            killed = True
+            _, status, rusage = os.wait4(process.pid, 0)
+            break
+        time.sleep(poll)
+    wall = time.perf_counter() - started
+    stderr.seek(0)
+    output = stderr.read().decode("utf-8", errors="replace")
+    stderr.close()
+    exit_code = process.returncode = os.waitstatus_to_exitcode(status)
+    if exit_code != 0 and not killed:
+        raise RuntimeError(f"main.py exited with {exit_code}\n{output[-4000:]}")
+    rss_kb = rusage.ru_maxrss / (1024 if sys.platform == "darwin" else 1)
+    return {"wall_time": round(wall, 3), "peak_rss_mb": round(rss_kb / 1024, 1), "killed": killed}
+
+
+def mock_options(latency: str, rate_limit: float, pass_rates: str, seed: int) -> dict:
+    return {"latency": latency, "rate_limit": rate_limit, "pass_rates": pass_rates, "seed": seed}
+
+
+def throughput(rows: int = 1_000, concurrency: int = 8, pack: int = 1, trial: int = 5, workflow: str = "loop", latency: str = "lognormal:0.05:0.5", rate_limit: float = 0.0,
+               pass_rates: str = "0.7,0.9,1.0", fmt: str = "csv", seed: int = 0, out: str = RESULTS_PATH, keep: bool = False) -> dict:
+    """N개 synthetic row에 대해 main.py run 전체를 실행: end-to-end wall time, rows/sec, peak RSS, mock 서버 요청 수."""
+    workspace = Workspace(rows, fmt, seed=seed, keep=keep)
+    try:
+        with MockServer(**mock_options(latency, rate_limit, pass_rates, seed)) as server:
+            measured = run_process(workspace.command(concurrency=concurrency, pack=pack, trial=trial, workflow=workflow), workspace.env(server), workspace.path)
+            stats = server.stats
+    finally:
+        workspace.cleanup()
+    return save_result({
+        "scenario": "throughput", "rows": rows, "concurrency": concurrency, "pack": pack, "trial": trial, "workflow": workflow,
+        "latency": latency, "rate_limit": rate_limit, "pass_rates": pass_rates, "format": fmt,
+        **measured, "rows_per_sec": round(rows / measured["wall_time"], 2), "server": stats,
+    }, out)
+
+
+def resume(rows: int = 1_000, kill_at: float = 0.5, concurrency: int = 8, trial: int = 5, latency: str = "lognormal:0.05:0.5", rate_limit: float = 0.0,
+           pass_rates: str = "0.7,0.9,1.0", fmt: str = "csv", seed: int = 0, out: str = RESULTS_PATH, keep: bool = False) -> dict:
+    """체크포인트에 kill_at 비율만큼 기록되면 SIGKILL하고 다시 실행: 재개 wall time과 다시 보낸 LLM 요청 수."""
+    workspace = Workspace(rows, fmt, seed=seed, keep=keep)
+    try:
+        with MockServer(**mock_options(latency, rate_limit, pass_rates, seed)) as server:
+            command = workspace.command(concurrency=concurrency, trial=trial)
+            first = run_process(command, workspace.env(server), workspace.path, kill_when=lambda: workspace.checkpointed() >= rows * kill_at)
+            before = server.stats
+            recovered = workspace.checkpointed()
+            second = run_process(command, workspace.env(server), workspace.path)
+            after = server.stats
+    finally:
+        workspace.cleanup()
+    return save_result({
+        "scenario": "resume", "rows": rows, "kill_at": kill_at, "concurrency": concurrency, "trial": trial,
+        "latency": latency, "rate_limit": rate_limit, "pass_rates": pass_rates, "format": fmt,
+        "killed_after": first["wall_time"], "killed": first["killed"], "recovered_rows": recovered,
+        "resume_time": second["wall_time"], "peak_rss_mb": second["peak_rss_mb"],
+        "resume_requests": after["requests"] - before["requests"], "requests_before_kill": before["requests"],
+    }, out)
+
+
+def measure(function, *args) -> tuple:
+    """(결과, 실행 시간, tracemalloc 기준 peak 메모리 MB). tracemalloc이 실행 시간을 부풀리므로 시간과 메모리는 따로 측정."""
+    started = time.perf_counter()
+    result = function(*args)
+    elapsed = time.perf_counter() - started
+    tracemalloc.start()
+    function(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, round(elapsed, 3), round(peak / 1024 / 1024, 1)
+
+
+def _group_rows_iterrows(df, mask) -> dict:
+    """비교용: row마다 iterrows로 Series를 만들어 렌더링하던 이전 방식."""
+    groups, contents = {}, {}
+    for i, (_, row) in enumerate(df.iterrows()):
+        if not mask.iloc[i]:
+            continue
+        content = format_input_content(row)
+        key = normalize_content(content)
+        contents.setdefault(key, content)
+        groups.setdefault(contents[key], []).append(i)
+    return groups
+
+
+def render(rows: int = 100_000, duplicate_ratio: float = 0.3, seed: int = 0, out: str = RESULTS_PATH) -> dict:
+    """프롬프트 렌더링 + 중복 그룹핑만 측정 (LLM 호출 없음): row 단위 iterrows 대비 컬럼 단위 렌더링의 시간/peak 메모리."""
+    df = synthetic_frame(rows, duplicate_ratio, seed)
+    mask = df["사고분류"].isna()
+    legacy, legacy_time, legacy_peak = measure(_group_rows_iterrows, df, mask)
+    groups, vector_time, vector_peak = measure(group_rows, df, mask)
+    if groups != legacy:
+        raise AssertionError("group_rows 결과가 row 단위 렌더링과 다릅니다")
+    return save_result({
+        "scenario": "render", "rows": rows, "groups": len(groups),
+        "iterrows_time": legacy_time, "iterrows_peak_mb": legacy_peak,
+        "vectorized_time": vector_time, "vectorized_peak_mb": vector_peak,
+        "speedup": round(legacy_time / vector_time, 1) if vector_time else None,
+    }, out)
+
+
+def perturb(content: str, rng: random.Random) -> str:
+    """띄어쓰기를 몇 군데 바꾸고 구역 번호를 바꾼 같은 작업내용 (현장/협력사마다 표기만 다른 row 흉내)."""
+    chars = list(re.sub(r"구역 (\d+)", lambda match: f"구역 {int(match.group(1)) + 1}", content))
+    for _ in range(3):
+        i = rng.randrange(len(chars))
+        chars[i] = "" if chars[i] == " " else chars[i] + " "
+    return "".join(chars)
+
+
+def neighbors(rows: int = 1_000_000, queries: int = 1_000, chunk: int = 10_000, seed: int = 0, out: str = RESULTS_PATH, keep: bool = False) -> dict:
+    """유사 라벨 인덱스: rows개 승인 결과로 빌드/저장/불러오기 시간과, 표기만 바꾼 row의 lookup latency와 라벨 일치율 (LLM 호출 없음)."""
+    # chains(프롬프트, 모델 client 모듈) import는 이 시나리오에서만 필요하므로 여기서 import (다른 시나리오의 bench CLI 시작 시간 단축)
+    from chains import MinHashIndex
+
+    path = tempfile.mkdtemp(prefix="acc-bench-neighbors-")
+    rng = random.Random(seed)
+    labels_of = dict(zip(HAZARDS, HAZARD_TYPES))
+    samples = []
+    try:
+        index = MinHashIndex(path)
+        started = time.perf_counter()
+        for start in range(0, rows, chunk):
+            df = synthetic_frame(min(chunk, rows - start), 0.0, seed, start)
+            contents = list(format_input_contents(df))
+            labels = [labels_of[hazard.rsplit(" (", 1)[0]] for hazard in df["유해위험요인"]]
+            index.add(contents, labels)
+            samples.extend(rng.sample(list(zip(contents, labels)), min(len(contents), max(1, queries * chunk // rows))))
+        index.flush()
+        build_time = time.perf_counter() - started
+        started = time.perf_counter()
+        index = MinHashIndex(path)
+        load_time = time.perf_counter() - started
+        latencies, hits = [], 0
+        for content, label in samples[:queries]:
+            query = perturb(content, rng)
+            started = time.perf_counter()
+            found, _ = index.match(query, 0.8)
+            latencies.append(time.perf_counter() - started)
+            hits += found == label
+        size_mb = os.path.getsize(os.path.join(path, "index.u32")) / 1024 / 1024
+    finally:
+        if not keep:
+            shutil.rmtree(path, ignore_errors=True)
+    latencies = sorted(latencies)
+    return save_result({
+        "scenario": "neighbors", "rows": rows, "indexed": len(index), "queries": len(latencies),
+        "build_time": round(build_time, 3), "build_rows_per_sec": round(rows / build_time, 1), "load_time": round(load_time, 3), "index_mb": round(size_mb, 1),
+        "lookup_p50_ms": round(latencies[len(latencies) // 2] * 1000, 3), "lookup_p99_ms": round(latencies[int(len(latencies) * 0.99)] * 1000, 3),
+        "match_rate": round(hits / len(latencies), 4),
+    }, out)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _percentile_ms(values: list, point: float) -> float | None:
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(len(values) * point))] * 1000, 1) if values else None
+
+
+def service(requests: int = 500, clients: int = 32, batch: int = 32, batch_wait: float = 0.05, queue: int = 1024, concurrency: int = 8, pack: int = 1,
+            latency: str = "lognormal:0.05:0.5", rate_limit: float = 0.0, pass_rates: str = "0.7,0.9,1.0", seed: int = 0, out: str = RESULTS_PATH, keep: bool = False) -> dict:
+    """
+    main.py serve를 mock LLM에 붙여서 end-to-end로 측정: clients개 스레드가 항목 1건씩 POST /classify.
+    첫 번째 pass(LLM 분류)와 같은 항목을 다시 보내는 두 번째 pass(체크포인트 응답)의 요청 latency, 처리량, 묶음 크기, 503(대기열 초과) 수.
+    """
+    workspace = Workspace(requests, seed=seed, keep=keep)
+    frame = synthetic_frame(requests, 0.3, seed)[KEY_COLUMNS].astype(object)
+    items = frame.where(frame.notna(), None).to_dict("records")
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        with MockServer(**mock_options(latency, rate_limit, pass_rates, seed)) as server, httpx.Client(base_url=base_url, timeout=600) as client:
+            args = workspace.command("serve", port=port, batch=batch, batch_wait=batch_wait, queue=queue, concurrency=concurrency, pack=pack)
+            stderr = open(os.path.join(workspace.path, "stderr.log"), "ab")
+            started = time.perf_counter()
+            process = subprocess.Popen(args, env=workspace.env(server), cwd=workspace.path, stdout=subprocess.DEVNULL, stderr=stderr)
+            try:
+                while True:
+                    if process.poll() is not None:
+                        raise RuntimeError(f"serve exited with {process.returncode}")
+                    try:
+                        client.get("/health").raise_for_status()
+                        break
+                    except httpx.TransportError:
+                        time.sleep(0.05)
+                startup = time.perf_counter() - started
+
+                def send(item: dict) -> tuple:
+                    sent = time.perf_counter()
+                    response = client.post("/classify", json=item)
+                    return response.status_code, time.perf_counter() - sent, response.json()
+
+                passes = []
+                for _ in range(2):
+                    started = time.perf_counter()
+                    with ThreadPoolExecutor(max_workers=clients) as executor:
+                        results = list(executor.map(send, items))
+                    wall = time.perf_counter() - started
+                    ok = [elapsed for status, elapsed, _ in results if status == 200]
+                    passes.append({
+                        "wall_time": round(wall, 3), "requests_per_sec": round(len(items) / wall, 1),
+                        "ok": len(ok), "overloaded": sum(status == 503 for status, _, _ in results),
+                        "checkpoint": sum(bool(body.get("checkpoint")) for status, _, body in results if status == 200),
+                        "p50_ms": _percentile_ms(ok, 0.5), "p95_ms": _percentile_ms(ok, 0.95), "p99_ms": _percentile_ms(ok, 0.99),
+                    })
+                metrics = client.get("/metrics").json()
+            finally:
+                process.send_signal(signal.SIGTERM)
+                process.wait(timeout=60)
+                stderr.close()
+            stats = server.stats
+    finally:
+        workspace.cleanup()
+    return save_result({
+        "scenario": "service", "requests": requests, "clients": clients, "batch": batch, "batch_wait": batch_wait, "queue": queue,
+        "concurrency": concurrency, "pack": pack, "latency": latency, "startup_time": round(startup, 3),
+        "classify": passes[0], "checkpoint": passes[1], "batcher": metrics["batcher"], "server": stats,
+    }, out)
+
+
+IMPORT_TIME = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+# CLI 시작 시 로드되면 안 되는 (사용 시점에 import해야 하는) 무거운 모듈
+DEFERRED_MODULES = ("openai", "httpx", "pandas", "tqdm", "sklearn")
+
+
+def import_profile(module: str = "main", top: int = 10) -> dict:
+    """python -X importtime으로 module import 비용을 측정: 전체 시간, 직접 import한 모듈 중 누적 시간 상위 top개, 로드된 무거운 모듈."""
+    env = {name: value for name, value in os.environ.items() if name != "OPENAI_API_KEY"}
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=ROOT, env=env, capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"import {module} failed without OPENAI_API_KEY\n{completed.stderr[-4000:]}")
+    imports = [(name, len(indent) // 2, int(cumulative)) for _, cumulative, indent, name in IMPORT_TIME.findall(completed.stderr)]
+    total = next(cumulative for name, depth, cumulative in imports if name == module and depth == 0)
+    # 직접 import는 module 줄 앞에 나오는 depth 1 항목 (importtime은 자식을 부모보다 먼저 출력)
+    children = [(name, cumulative) for name, depth, cumulative in imports if depth == 1]
+    loaded = {name.split(".")[0] for name, _, _ in imports}
+    return {
+        "import_ms": round(total / 1000, 1),
+        "top_imports_ms": {name: round(cumulative / 1000, 1) for name, cumulative in sorted(children, key=lambda item: -item[1])[:top]},
+        "deferred_loaded": [name for name in DEFERRED_MODULES if name in loaded],
+    }
+
+
+def startup(rows: int = 1_000, repeat: int = 5, budget_ms: float = None, seed: int = 0, out: str = RESULTS_PATH, keep: bool = False) -> dict:
+    """
+    CLI 시작 비용: import main 시간(-X importtime), main.py --help wall time, 모든 row가 체크포인트에 있는 재실행의 wall time과 LLM 요청 수.
+    budget_ms가 주어지면 import 시간이 이를 넘을 때 실패 (CI 회귀 검사용).
+    """
+    profile = import_profile()
+    workspace = Workspace(rows, seed=seed, keep=keep)
+    try:
+        help_times = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            subprocess.run([sys.executable, os.path.join(ROOT, "main.py"), "--help"], cwd=workspace.path, env=dict(os.environ, PAGER="cat"), capture_output=True, check=True)
+            help_times.append(time.perf_counter() - started)
+
+        with MockServer(latency="const:0.01") as server:
+            # shard worker 모드는 성공 후에도 체크포인트를 지우지 않으므로 두 번째 실행은 전부 체크포인트 적중
+            command = workspace.command(concurrency=8, shard=0, shards=1, namespace="startup")
+            first = run_process(command, workspace.env(server), workspace.path)
+            before = server.stats["requests"]
+            warm = run_process(command, workspace.env(server), workspace.path)
+            requests = server.stats["requests"] - before
+    finally:
+        workspace.cleanup()
+
+    result = save_result({
+        "scenario": "startup", "rows": rows, **profile,
+        "help_time": round(min(help_times), 3), "cold_run_time": first["wall_time"],
+        "checkpointed_run_time": warm["wall_time"], "checkpointed_peak_rss_mb": warm["peak_rss_mb"], "checkpointed_requests": requests,
+    }, out)
+    if budget_ms is not None and profile["import_ms"] > budget_ms:
+        raise RuntimeError(f"import main took {profile['import_ms']}ms (budget {budget_ms}ms): {profile['top_imports_ms']}")
+    return result
+
+
+def _percentile_us(values: list, point: float) -> float | None:
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(len(values) * point))] * 1_000_000, 1) if values else None
+
+
+def _timed_rows(contents: list, step) -> tuple:
+    """content마다 step(content)를 실행한 호출 스레드 시간 (전체 초, row별 latency 리스트)."""
+    latencies = []
+    started = time.perf_counter()
+    for content in contents:
+        row_started = time.perf_counter()
+        step(content)
+        latencies.append(time.perf_counter() - row_started)
+    return time.perf_counter() - started, latencies
+
+
+def logs(rows: int = 5_000, sample: float = 0.05, compress: str = "gzip", max_mb: float = 8, seed: int = 0, out: str = RESULTS_PATH, keep: bool = False) -> dict:
+    """
+    hot loop 로깅 비용 (LLM 호출 없음). 시도 1회(분류 + 평가)를 row마다 기록할 때:
+    프롬프트/응답 전문을 DEBUG로 FileHandler에 바로 쓰던 방식 vs LogPipeline(queue + background 스레드, JSONL, rotate/압축) + 샘플링 transcript.
+    호출 스레드 시간(row별 p50/p99), 남은 기록을 마치는 데 걸린 시간, 디스크 사용량.
+    """
+    import logging
+
+    from prompts import as_text, structured_classifier_messages_v3, structured_evaluator_messages_v3, with_labels
+    from utils import CompressedRotatingFileHandler, JsonFormatter, LogPipeline, TranscriptLog
+
+    path = tempfile.mkdtemp(prefix="acc-bench-logs-")
+    contents = list(format_input_contents(synthetic_frame(rows, 0.0, seed)))
+    response = json.dumps({"result": "PASS", "feedback": "분류 결과가 유해위험요인과 일치합니다."}, ensure_ascii=False)
+    try:
+        legacy = logging.getLogger("bench.logs.legacy")
+        legacy.setLevel(logging.DEBUG)
+        legacy.propagate = False
+        handler = logging.FileHandler(os.path.join(path, "legacy.log"), encoding="utf-8")
+        handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+        legacy.addHandler(handler)
+
+        def legacy_step(content: str) -> None:
+            prompt = structured_classifier_messages_v3(content)
+            legacy.debug(f"📝 사고 유형 분류 프롬프트 (시도 1/5)\n{as_text(prompt)}\n")
+            legacy.debug("📝 사고 유형 분류 결과 (시도 1/5)\n사고 유형: 떨어짐\n")
+            legacy.debug(f"🔍 평가 프롬프트 (시도 1/5)\n{as_text(with_labels(structured_evaluator_messages_v3(content), '떨어짐'))}\n")
+            legacy.debug(f"🔍 평가 결과 (시도 1/5)\n{response}\n")
+
+        legacy_time, legacy_latencies = _timed_rows(contents, legacy_step)
+        legacy.removeHandler(handler)
+        handler.close()
+
+        logger = logging.getLogger("bench.logs.pipeline")
+        logger.setLevel(logging.DEBUG)
+        logger.propagate = False
+        handler = CompressedRotatingFileHandler(os.path.join(path, "pipeline", "run.jsonl"), max_bytes=int(max_mb * (1 << 20)), compress=compress)
+        handler.setFormatter(JsonFormatter())
+        os.makedirs(os.path.join(path, "pipeline"))
+        pipeline = LogPipeline(logger, [handler])
+        transcript = TranscriptLog()
+        transcript.open(os.path.join(path, "pipeline", "run.transcripts.jsonl"), sample=sample, max_bytes=int(max_mb * (1 << 20)), compress=compress)
+
+        def pipeline_step(content: str) -> None:
+            with transcript.row_scope(transcript.trace(content)):
+                prompt = structured_classifier_messages_v3(content)
+                transcript.record("gpt-4.1-mini", prompt, "떨어짐")
+                logger.debug("📝 사고 유형 분류 결과 (시도 1/5)\n사고 유형: 떨어짐\n")
+                transcript.record("gpt-4.1", with_labels(structured_evaluator_messages_v3(content), "떨어짐"), response)
+                logger.debug("🔍 평가 결과 (시도 1/5): PASS")
+
+        pipeline_time, pipeline_latencies = _timed_rows(contents, pipeline_step)
+        started = time.perf_counter()
+        transcript.close()
+        pipeline.close()
+        drain_time = time.perf_counter() - started
+        legacy_mb = os.path.getsize(os.path.join(path, "legacy.log")) / 1024 / 1024
+        pipeline_mb = sum(entry.stat().st_size for entry in os.scandir(os.path.join(path, "pipeline"))) / 1024 / 1024
+        stats = transcript.stats()
+    finally:
+        if not keep:
+            shutil.rmtree(path, ignore_errors=True)
+    return save_result({
+        "scenario": "logs", "rows": rows, "sample": sample, "compress": compress, "max_mb": max_mb,
+        "legacy_time": round(legacy_time, 3), "legacy_row_p50_us": _percentile_us(legacy_latencies, 0.5),
+        "legacy_row_p99_us": _percentile_us(legacy_latencies, 0.99), "legacy_mb": round(legacy_mb, 2),
+        "pipeline_time": round(pipeline_time, 3), "pipeline_row_p50_us": _percentile_us(pipeline_latencies, 0.5),
+        "pipeline_row_p99_us": _percentile_us(pipeline_latencies, 0.99), "drain_time": round(drain_time, 3),
+        "pipeline_mb": round(pipeline_mb, 2), "transcripts": stats,
+    }, out)
+
+
+def _names(value) -> list:
+    return [str(item) for item in value] if isinstance(value, (tuple, list)) else str(value).split(",")
+
+
+def evaluation(rows: int = 1_000, sample: int = 200, prompts: str = "structured,v3", workflows: str = "loop,vote", classifiers: str = "gpt-4.1-mini,gpt-4.1-nano",
+               evaluators: str = "gpt-4.1", concurrency: int = 8, latency: str = "lognormal:0.05:0.5", pass_rates: str = "0.7,0.9,1.0", seed: int = 0,
+               out: str = RESULTS_PATH, keep: bool = False) -> dict:
+    """
+    evaluate 서브커맨드: 설정마다 따로 실행(설정별 새 응답 캐시)한 wall time/요청 수 대비, 모든 설정을 한 번에 동시 실행(응답 캐시 공유)한
+    wall time/요청 수와 설정별 micro-F1/단독 비용. 정답은 synthetic row의 HAZARD_TYPES (mock 응답은 무작위라 정확도 값 자체는 의미 없음).
+    """
+    prompts, workflows, classifiers, evaluators = _names(prompts), _names(workflows), _names(classifiers), _names(evaluators)
+    configs = list(itertools.product(prompts, workflows, classifiers, evaluators))
+    workspace = Workspace(rows, seed=seed, keep=keep, labeled=True)
+    try:
+        with MockServer(**mock_options(latency, 0.0, pass_rates, seed)) as server:
+            serial_time = 0.0
+            for i, (prompt, workflow, classifier, evaluator) in enumerate(configs):
+                env = dict(workspace.env(server), LLM_CACHE=os.path.join(workspace.path, f"serial-{i}.sqlite"))
+                command = workspace.command("evaluate", sample=sample, concurrency=concurrency, prompts=prompt, workflows=workflow, classifiers=classifier, evaluators=evaluator)
+                serial_time += run_process(command, env, workspace.path)["wall_time"]
+            serial_requests = server.stats["requests"]
+
+            env = dict(workspace.env(server), LLM_CACHE=os.path.join(workspace.path, "shared.sqlite"))
+            command = workspace.command(
+                "evaluate", sample=sample, concurrency=concurrency,
+                prompts=",".join(prompts), workflows=",".join(workflows), classifiers=",".join(classifiers), evaluators=",".join(evaluators),
+            )
+            shared = run_process(command, env, workspace.path)
+            shared_requests = server.stats["requests"] - serial_requests
+        reports = sorted(glob.glob(os.path.join(workspace.path, "output", "evaluation_*.json")))
+        with open(reports[-1], encoding="utf-8") as f:
+            report = json.load(f)
+    finally:
+        workspace.cleanup()
+    return save_result({
+        "scenario": "evaluation", "rows": rows, "sample": sample, "configs": len(configs), "concurrency": concurrency,
+        "latency": latency, "pass_rates": pass_rates,
+        "serial_time": round(serial_time, 3), "serial_requests": serial_requests,
+        "shared_time": shared["wall_time"], "shared_requests": shared_requests, "peak_rss_mb": shared["peak_rss_mb"],
+        "contents": report["contents"], "cache": report["cache"],
+        "results": {config["name"]: {"micro_f1": config["metrics"]["micro_f1"], "standalone_cost": config["standalone_cost"], "cache_hits": config["cache_hits"]} for config in report["configs"]},
+    }, out)
+
+
+def suite(sizes: str = ",".join(map(str, DEFAULT_SIZES)), concurrency: int = 8, latency: str = "lognormal:0.05:0.5", rate_limit: float = 0.01, out: str = RESULTS_PATH) -> list:
+    """기본 회귀 세트: 크기별 throughput + 가장 작은 크기의 resume."""
+    sizes = [int(size) for size in str(sizes).split(",")] if not isinstance(sizes, (tuple, list)) else list(sizes)
+    results = [throughput(rows=size, concurrency=concurrency, latency=latency, rate_limit=rate_limit, out=out) for size in sizes]
+    results.append(resume(rows=min(sizes), concurrency=concurrency, latency=latency, rate_limit=rate_limit, out=out))
+    return results
+
+
+if __name__ == "__main__":
+    Fire({"throughput": throughput, "resume": resume, "render": render, "neighbors": neighbors, "logs": logs, "service": service, "startup": startup, "evaluation": evaluation, "suite": suite})
+
+__all__ = ["evaluation", "logs", "neighbors", "render", "resume", "service", "startup", "suite", "throughput"]
@@ -1 +1,7 @@
-from .loop_work_flow import *
\ No newline at end of file
+from .loop_work_flow import *
+from .batch_work_flow import *
+from .packed_work_flow import *
+from .preclassifier import *
+from .policies import *
+from .neighbors import *
+from .evaluation import *
\ No newline at end of file
@@ -0,0 +1,90 @@
+from prompts import (
+    classifier_schema_v3,
+    evaluator_schema_v3,
+    prompt_version_structured_v3,
+    structured_classifier_messages_v3,
+    structured_evaluator_messages_v3,
+    with_feedback,
+    with_labels,
+)
+from models import batch_request, cache_key, fetch_batch_results, resolve_model, response_cache, submit_batch, wait_batch
+from .loop_work_flow import CLASSIFIER_MODEL, EVALUATOR_MODEL, review_labels, review_verdict
+
+
+def _run_batch(prompts: dict, model: str, version: str, poll_interval: float, logger, response_format: dict = None) -> dict:
+    """{id: prompt}를 batch로 실행. 캐시에 있는 prompt는 제출하지 않고, 받은 응답은 캐시에 저장."""
+    results, requests = {}, []
+    for custom_id, prompt in prompts.items():
+        cached = response_cache.get(cache_key(model, prompt, version))
+        if cached is not None:
+            results[custom_id] = cached
+        else:
+            requests.append(batch_request(custom_id, prompt, model=model, response_format=response_format))
+    logger.info(f"📦 {model} batch: 제출 {len(requests)}건, 캐시 {len(results)}건")
+    if not requests:
+        return results
+    batch = wait_batch(submit_batch(requests, metadata={"model": model}), poll_interval=poll_interval, logger=logger)
+    for custom_id, content in fetch_batch_results(batch).items():
+        response_cache.put(cache_key(model, prompts[custom_id], version), model, content)
+        results[custom_id] = content
+    return results
+
+
+def batch_model(spec: str) -> str:
+    """--classifier/--evaluator model spec의 Batch API 모델 이름. Batch API는 OpenAI만 지원."""
+    provider, model = resolve_model(spec)
+    if provider.name != "openai":
+        raise ValueError(f"batch only supports OpenAI models: {spec}")
+    return model
+
+
+def batch_workflow_v3(contents: dict, max_retries=5, logger=None, poll_interval=60, classifier=CLASSIFIER_MODEL, evaluator=EVALUATOR_MODEL) -> dict:
+    """
+    loop_workflow_v3를 Batch API로 여러 row에 대해 한꺼번에 실행.
+    round마다 분류 batch → 응답을 받은 row만 평가 batch → FAIL row는 피드백을 붙여 다음 round로.
+    {id: (labels, {"attempts": n, 복구 지표})}를 반환하며, 끝까지 응답을 받지 못한 row는 포함되지 않음.
+    """
+    if logger is None:
+        raise ValueError("logger must be provided from main.py")
+    classifier, evaluator = batch_model(classifier), batch_model(evaluator)
+
+    user_queries = {custom_id: structured_classifier_messages_v3(content) for custom_id, content in contents.items()}
+    last_labels, attempts, final = {}, {custom_id: 0 for custom_id in contents}, {}
+    repairs = {custom_id: {"label_repairs": 0, "verdict_repairs": 0, "dropped_labels": 0, "retries_avoided": 0} for custom_id in contents}
+
+    for retries in range(max_retries):
+        pending = {custom_id: query for custom_id, query in user_queries.items() if custom_id not in final}
+        if not pending:
+            break
+        logger.info(f"🔄 Batch round {retries + 1}/{max_retries}: {len(pending)} rows")
+
+        # 분류: 응답을 받은 row만 평가 단계로
+        labels = {
+            custom_id: review_labels(text, repairs[custom_id])
+            for custom_id, text in _run_batch(pending, classifier, prompt_version_structured_v3, poll_interval, logger, classifier_schema_v3).items()
+        }
+        for custom_id in labels:
+            attempts[custom_id] += 1
+        last_labels.update(labels)
+
+        evaluations = _run_batch(
+            {custom_id: with_labels(structured_evaluator_messages_v3(contents[custom_id]), label) for custom_id, label in labels.items()},
+            evaluator, prompt_version_structured_v3, poll_interval, logger, evaluator_schema_v3,
+        )
+        for custom_id, raw_evaluation in evaluations.items():
+            passed, evaluation_result = review_verdict(raw_evaluation, repairs[custom_id])
+            if passed:
+                final[custom_id] = last_labels[custom_id]
+                continue
+            # Updating the user_query for the next attempt with full history
+            user_queries[custom_id] = with_feedback(user_queries[custom_id], attempts[custom_id], labels[custom_id], evaluation_result)
+        logger.info(f"✅ Batch round {retries + 1}: PASS {len(final)} / {len(contents)}")
+
+    # 최대 round 도달: loop_workflow_v3와 같이 마지막 분류를 반환
+    passed = set(final)
+    for custom_id, labels in last_labels.items():
+        final.setdefault(custom_id, labels)
+    return {custom_id: (labels, dict(repairs[custom_id], attempts=attempts[custom_id], passed=custom_id in passed)) for custom_id, labels in final.items()}
+
+
+__all__ = ["batch_model", "batch_workflow_v3"]
@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+import asyncio
+import itertools
+import time
+from typing import TYPE_CHECKING
+
+from prompts import ACCIDENT_TYPES, PROMPT_VERSIONS
+from models import percentiles
+from .loop_work_flow import VOTES, VOTE_THRESHOLD, ainvoke_chain
+from .parsing import parse_labels
+from .policies import RetryPolicy
+
+if TYPE_CHECKING:  # 타입 힌트 전용 (numpy는 사용하는 함수 안에서 import)
+    import numpy as np
+
+
+EVAL_WORKFLOWS = ("loop", "vote")
+# 설정 선택 기준으로 쓸 수 있는 지표 (클수록 좋은 것만)
+TARGET_METRICS = ("micro_f1", "macro_f1", "exact_match")
+
+
+def label_matrix(values) -> np.ndarray:
+    """라벨 목록(세미콜론 등으로 구분한 문자열, 비어 있으면 라벨 없음)을 (row 수, 11) bool indicator 행렬로. 열 순서는 ACCIDENT_TYPES."""
+    import numpy as np
+
+    index = {label: j for j, label in enumerate(ACCIDENT_TYPES)}
+    matrix = np.zeros((len(values), len(ACCIDENT_TYPES)), dtype=bool)
+    for i, value in enumerate(values):
+        if isinstance(value, str) and value.strip():
+            labels, _ = parse_labels(value)
+            matrix[i, [index[label] for label in labels]] = True
+    return matrix
+
+
+def _ratio(numerator, denominator) -> np.ndarray:
+    import numpy as np
+
+    numerator, denominator = np.asarray(numerator, dtype=float), np.asarray(denominator, dtype=float)
+    return np.divide(numerator, denominator, out=np.zeros_like(numerator), where=denominator > 0)
+
+
+def multilabel_metrics(truth: np.ndarray, predicted: np.ndarray) -> dict:
+    """
+    (row, 유형) bool indicator 행렬 두 개로 유형별 precision/recall/F1/support, micro/macro 평균, exact match, Hamming loss를 계산.
+    분모가 0이면 0. macro 평균은 정답이나 예측에 한 번이라도 나온 유형만 대상으로 함.
+    """
+    tp = (truth & predicted).sum(axis=0)
+    fp = (~truth & predicted).sum(axis=0)
+    fn = (truth & ~predicted).sum(axis=0)
+    precision, recall = _ratio(tp, tp + fp), _ratio(tp, tp + fn)
+    f1 = _ratio(2 * tp, 2 * tp + fp + fn)
+    present = (tp + fp + fn) > 0
+    total_tp, total_fp, total_fn = tp.sum(), fp.sum(), fn.sum()
+    return {
+        "rows": int(truth.shape[0]),
+        "exact_match": round(float((truth == predicted).all(axis=1).mean()), 4) if truth.size else 0.0,
+        "hamming_loss": round(float((truth != predicted).mean()), 4) if truth.size else 0.0,
+        "micro_precision": round(float(_ratio(total_tp, total_tp + total_fp)), 4),
+        "micro_recall": round(float(_ratio(total_tp, total_tp + total_fn)), 4),
+        "micro_f1": round(float(_ratio(2 * total_tp, 2 * total_tp + total_fp + total_fn)), 4),
+        "macro_f1": round(float(f1[present].mean()), 4) if present.any() else 0.0,
+        "labels": {
+            label: {"precision": round(float(precision[j]), 4), "recall": round(float(recall[j]), 4), "f1": round(float(f1[j]), 4), "support": int(tp[j] + fn[j])}
+            for j, label in enumerate(ACCIDENT_TYPES)
+        },
+    }
+
+
+def evaluation_configs(prompts: list, workflows: list, classifiers: list, evaluators: list, votes: int = VOTES, vote_threshold: float = VOTE_THRESHOLD, policy_options: dict = None) -> list:
+    """(프롬프트 버전 × workflow × 분류 모델 × 평가 모델) 조합. loop 설정은 설정마다 RetryPolicy를 따로 만듦 (PASS 라벨 캐시가 설정끼리 섞이지 않도록)."""
+    configs = []
+    for prompt, workflow, classifier, evaluator in itertools.product(prompts, workflows, classifiers, evaluators):
+        if prompt not in PROMPT_VERSIONS:
+            raise ValueError(f"unknown prompt version: {prompt} (choose from {', '.join(PROMPT_VERSIONS)})")
+        if workflow not in EVAL_WORKFLOWS:
+            raise ValueError(f"unknown workflow: {workflow} (choose from {', '.join(EVAL_WORKFLOWS)})")
+        options = {"votes": votes, "vote_threshold": vote_threshold} if workflow == "vote" else {"policy": RetryPolicy.from_options(**(policy_options or {}))}
+        configs.append({
+            "name": f"{prompt}/{workflow}/{classifier}/{evaluator}",
+            "prompts": prompt, "workflow": workflow, "classifier": classifier, "evaluator": evaluator, "options": options,
+        })
+    return configs
+
+
+async def evaluate_configs(contents: list, configs: list, max_retries: int, logger, concurrency: int = 8, progress: bool = True) -> list:
+    """
+    모든 설정 × 고유 content를 하나의 event loop에서 최대 concurrency개씩 동시에 실행 (응답 캐시, rate limit, circuit은 설정끼리 공유).
+    설정마다 content 순서대로 (labels, info, elapsed) 리스트를 반환. 재시도까지 실패한 content는 labels가 None이고 info에 error.
+    """
+    from tqdm import tqdm
+
+    semaphore = asyncio.BoundedSemaphore(concurrency)
+    results = [[None] * len(contents) for _ in configs]
+
+    async def worker(c: int, j: int) -> None:
+        config = configs[c]
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                labels, info = await ainvoke_chain(
+                    contents[j], max_retries=max_retries, logger=logger, return_obj=True,
+                    classifier=config["classifier"], evaluator=config["evaluator"], prompts=config["prompts"], **config["options"],
+                )
+            except Exception as error:
+                # 한 row의 실패로 비교 전체를 멈추지 않음. 라벨 없음으로 채점하고 errors로 집계
+                logger.warning(f"평가 실패 [{config['name']}]: {type(error).__name__}: {error}")
+                labels, info = None, {"error": f"{type(error).__name__}: {error}"}
+            results[c][j] = (labels, info, time.perf_counter() - started)
+
+    # 설정 순서대로 넣어서 앞 설정이 채운 응답 캐시를 뒤 설정이 재사용 (프롬프트 버전과 분류 모델이 같으면 첫 분류 호출이 캐시 적중)
+    tasks = [asyncio.create_task(worker(c, j)) for c in range(len(configs)) for j in range(len(contents))]
+    with tqdm(total=len(tasks), desc=f"Evaluating {len(configs)} configs (x{concurrency})", disable=not progress) as pbar:
+        for future in asyncio.as_completed(tasks):
+            await future
+            pbar.update(1)
+    return results
+
+
+def config_report(config: dict, results: list, truth: np.ndarray, content_index: np.ndarray) -> dict:
+    """
+    설정 하나의 고유 content 결과를 row로 펼쳐서(content_index: row별 content 위치) 정확도 지표와 비용/latency/호출 요약을 계산.
+    standalone_cost는 응답 캐시 적중분의 추정 비용을 더한 값 (이 설정만 단독으로 실행했을 때의 비용), cost_per_1k는 고유 content 1000건당.
+    """
+    predicted = label_matrix([labels for labels, _, _ in results])[content_index]
+    infos = [info for _, info, _ in results]
+    elapsed = [seconds for _, _, seconds in results]
+    cost = sum(info.get("cost", 0.0) for info in infos)
+    standalone = cost + sum(info.get("saved_cost", 0.0) for info in infos)
+    return {
+        "name": config["name"],
+        "config": {name: config[name] for name in ("prompts", "workflow", "classifier", "evaluator")},
+        "metrics": multilabel_metrics(truth, predicted),
+        "contents": len(results),
+        "errors": sum("error" in info for info in infos),
+        "pass_rate": round(sum(bool(info.get("passed")) for info in infos) / len(infos), 4) if infos else 0.0,
+        "mean_attempts": round(sum(info.get("attempts") or 0 for info in infos) / len(infos), 3) if infos else 0.0,
+        "calls": sum(info.get("calls", 0) for info in infos),
+        "cache_hits": sum(info.get("cache_hits", 0) for info in infos),
+        "cost": round(cost, 6),
+        "standalone_cost": round(standalone, 6),
+        "cost_per_1k": round(standalone / len(infos) * 1000, 4) if infos else 0.0,
+        "latency": {name: value if value is None else round(value, 3) for name, value in percentiles(elapsed).items()},
+    }
+
+
+def cheapest_config(reports: list, metric: str = "micro_f1", target: float = 0.0) -> dict | None:
+    """metric이 target 이상인 설정 중 단독 비용이 가장 낮은 것 (같으면 metric이 높은 것). 없으면 None."""
+    if metric not in TARGET_METRICS:
+        raise ValueError(f"unknown metric: {metric} (choose from {', '.join(TARGET_METRICS)})")
+    eligible = [report for report in reports if report["metrics"][metric] >= target]
+    return min(eligible, key=lambda report: (report["standalone_cost"], -report["metrics"][metric]), default=None)
+
+
+__all__ = ["EVAL_WORKFLOWS", "TARGET_METRICS", "cheapest_config", "config_report", "evaluate_configs", "evaluation_configs", "label_matrix", "multilabel_metrics"]
@@ -1,5 +1,58 @@
-from prompts import user_query_v3, evaluator_prompt_v3
-from models import gpt_call, ollama_call
+from collections import Counter
+
+from prompts import ACCIDENT_TYPES, prompt_version, with_feedback, with_labels
+from models import estimate_tokens, gpt_call, llm_call, llm_call_async, llm_samples, llm_samples_async, metrics, span, summarize_calls
+from utils import transcripts
+from .parsing import format_feedback, parse_labels, parse_verdict
+from .policies import SAMPLE_VERSION, RetryPolicy, policy_savings
+
+
+CLASSIFIER_MODEL = "gpt-4.1-mini"
+EVALUATOR_MODEL = "gpt-4.1"
+VOTES = 5
+VOTE_THRESHOLD = 0.5
+
+
+def add_usage(total: dict, usage: dict) -> dict:
+    return {name: total.get(name, 0) + usage.get(name, 0) for name in ("prompt_tokens", "completion_tokens", "cached_tokens")}
+
+
+def review_labels(raw_labels: str, repairs: dict) -> str:
+    """분류 응답을 허용된 유형의 세미콜론 목록으로 정규화. 복구할 라벨이 없으면 원문을 그대로 평가에 넘김."""
+    labels, info = parse_labels(raw_labels)
+    repairs["label_repairs"] += info["repaired"]
+    repairs["dropped_labels"] += len(info["dropped"])
+    return ";".join(labels) if labels else raw_labels.strip()
+
+
+def review_verdict(raw_evaluation: str, repairs: dict) -> tuple:
+    """평가 응답을 (PASS 여부, 다음 시도에 넣을 피드백)으로. 형식만 어긋난 PASS를 로컬에서 복구하면 재시도 1회 절약으로 기록."""
+    verdict, feedback, repaired = parse_verdict(raw_evaluation)
+    repairs["verdict_repairs"] += repaired
+    if verdict == "PASS":
+        repairs["retries_avoided"] += repaired
+        return True, feedback
+    return False, format_feedback("FAIL", feedback) if verdict else raw_evaluation.strip()
+
+
+def vote_labels(raw_samples: list, threshold: float, repairs: dict) -> tuple:
+    """
+    샘플별 라벨 집합으로 라벨 단위 다수결: 득표율이 threshold를 넘는 라벨만 채택 (넘는 라벨이 없으면 최다 득표 라벨).
+    (채택한 라벨의 세미콜론 목록, 합의율 = 채택 결과와 라벨 집합이 같은 샘플 비율)을 반환.
+    """
+    samples = []
+    for raw_sample in raw_samples:
+        labels, info = parse_labels(raw_sample)
+        repairs["label_repairs"] += info["repaired"]
+        repairs["dropped_labels"] += len(info["dropped"])
+        samples.append(labels)
+    votes = Counter(label for labels in samples for label in labels)
+    voted = [label for label in ACCIDENT_TYPES if votes[label] > threshold * len(samples)]
+    if not voted and votes:
+        top = max(votes.values())
+        voted = [label for label in ACCIDENT_TYPES if votes[label] == top]
+    agreement = sum(labels == voted for labels in samples) / len(samples) if samples else 0.0
+    return ";".join(voted), agreement
 
 
 def loop_workflow_v1(user_query, evaluator_prompt, max_retries=5, logger=None) -> str:
@@ -78,49 +131,239 @@ def loop_workflow_v2(user_query, evaluator_prompt, max_retries=5, logger=None) -
         user_query += f"\n{retries}차 사고 유형 분류 피드백:\n\n{evaluation_result}\n\n"
 
 
-def loop_workflow_v3(user_query, evaluator_prompt, max_retries=5, logger=None) -> str:
-    """평가자가 생성된 요약을 통과할 때까지 최대 max_retries번 반복."""
+def _loop_steps(user_query, evaluator_prompt, max_retries=5, logger=None, version="", return_obj=False, classifier=CLASSIFIER_MODEL, evaluator=EVALUATOR_MODEL, classifier_format=None, evaluator_format=None, policy=None, seed=None):
+    """
+    loop_workflow_v3(_async)의 본체. LLM 호출이 필요할 때마다 ("call" 또는 "samples", kwargs)를 yield하고 (응답, usage)를 받음.
+    파싱/평가 생략/정책/usage 집계는 여기에만 두고, 실제 호출(동기/비동기)은 _run_steps/_arun_steps가 맡음.
+    """
     if logger is None:
         raise ValueError("logger must be provided from main.py")
+    policy = policy or RetryPolicy()
 
-    retries = 0
+    retries, usage = 0, {"prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0}
+    repairs = {"label_repairs": 0, "verdict_repairs": 0, "dropped_labels": 0, "retries_avoided": 0}
+    savings = policy_savings()
+    base = len(user_query) if isinstance(user_query, list) else 0
+    approved_key, previous_feedback = policy.approved_key(user_query, version), None
+    labels, attempt_tokens = "", 0
     while retries < max_retries:
-        # Prompting the user query
-        logger.debug(f"📝 사고 유형 분류 프롬프트 (시도 {retries + 1}/{max_retries})\n{user_query}\n")
-        
-        # Call the LLM to classify the accident type
-        labels = gpt_call(user_query, model="gpt-4.1-mini").strip()
+        # 재시도 token 예산이 소진되면 마지막 분류를 반환 (attempt_tokens는 직전 시도에 쓴 token)
+        if retries and not policy.allow_retry():
+            logger.debug("⛔ 재시도 token 예산 소진. 마지막 분류를 반환합니다.")
+            savings.update(early_exit="budget", saved_calls=savings["saved_calls"] + 2, saved_tokens=savings["saved_tokens"] + attempt_tokens)
+            return (labels, dict(usage, attempts=retries, passed=False, **repairs, **savings)) if return_obj else labels
+        attempt_tokens = usage["prompt_tokens"] + usage["completion_tokens"]
+
+        # Prompting the user query (history window 적용)
+        prompt, trimmed = policy.window(user_query, base)
+        savings["history_saved_tokens"] += trimmed
+
+        # Call the LLM to classify the accident type (첫 시도에 seed 라벨이 있으면 분류 호출을 생략)
+        if retries == 0 and seed:
+            labels = seed
+            savings.update(saved_calls=savings["saved_calls"] + 1, saved_tokens=savings["saved_tokens"] + estimate_tokens(prompt, classifier))
+        else:
+            raw_labels, call_usage = yield "call", {"prompt": prompt, "model": classifier, "version": version, "return_obj": True, "response_format": classifier_format}
+            labels = review_labels(raw_labels, repairs)
+            usage = add_usage(usage, call_usage)
         logger.debug(f"📝 사고 유형 분류 결과 (시도 {retries + 1}/{max_retries})\n사고 유형: {labels}\n")
-        
+
+        # 평가 생략: 이전에 PASS한 라벨과 같거나, 첫 시도에서 두 번 샘플링한 결과가 같으면
+        final_evaluator_prompt = with_labels(evaluator_prompt, labels)
+        early_exit = "cache" if policy.approved(approved_key, labels) else None
+        if early_exit is None and retries == 0 and policy.uses("agreement") and labels and not seed:
+            raw_sample, call_usage = yield "call", {"prompt": prompt, "model": classifier, "version": version + SAMPLE_VERSION, "return_obj": True, "response_format": classifier_format}
+            usage = add_usage(usage, call_usage)
+            savings["extra_calls"] += 1
+            savings["extra_tokens"] += call_usage.get("prompt_tokens", 0) + call_usage.get("completion_tokens", 0)
+            early_exit = "agreement" if policy.agrees(labels, raw_sample) else None
+        if early_exit is not None:
+            logger.debug(f"⏩ 평가 생략 ({early_exit}). 분류 결과를 그대로 승인합니다.")
+            savings.update(early_exit=early_exit, saved_calls=savings["saved_calls"] + 1, saved_tokens=savings["saved_tokens"] + estimate_tokens(final_evaluator_prompt, evaluator))
+            return (labels, dict(usage, attempts=retries + 1, passed=True, **repairs, **savings)) if return_obj else labels
+
         # Call Evaluator LLM to evaluate the classification
-        final_evaluator_prompt = evaluator_prompt + labels
-        evaluation_result = gpt_call(final_evaluator_prompt, model="gpt-4.1").strip()
-        logger.debug(f"🔍 평가 프롬프트 (시도 {retries + 1}/{max_retries})\n{final_evaluator_prompt}\n")
-        logger.debug(f"🔍 평가 결과 (시도 {retries + 1}/{max_retries})\n{evaluation_result}\n")
+        raw_evaluation, call_usage = yield "call", {"prompt": final_evaluator_prompt, "model": evaluator, "version": version, "return_obj": True, "response_format": evaluator_format}
+        passed, evaluation_result = review_verdict(raw_evaluation, repairs)
+        usage = add_usage(usage, call_usage)
+        logger.debug(f"🔍 평가 결과 (시도 {retries + 1}/{max_retries}): {'PASS' if passed else 'FAIL'}")
+        attempt_tokens = usage["prompt_tokens"] + usage["completion_tokens"] - attempt_tokens
+        if retries:
+            policy.charge(attempt_tokens)
 
-        if "평가결과 = PASS" in evaluation_result:
+        if passed:
             logger.debug("✅✅✅ 통과! 최종 사고 유형 분류가 승인되었습니다. ✅✅✅")
-            return labels
-        
+            policy.approve(approved_key, labels)
+            return (labels, dict(usage, attempts=retries + 1, passed=True, **repairs, **savings)) if return_obj else labels
+
         retries += 1
         logger.debug(f"🔄 재시도 필요... ({retries}/{max_retries})")
 
         # If max retries reached, return last attempt
         if retries >= max_retries:
             logger.debug("❌❌❌ 최대 재시도 횟수 도달. 마지막 분류를 반환합니다. ❌❌❌")
-            return labels
+            return (labels, dict(usage, attempts=retries, passed=False, **repairs, **savings)) if return_obj else labels
+
+        # 평가자 피드백이 직전 시도와 같으면 더 재시도해도 수렴하지 않는 것으로 보고 중단 (다음 시도 token은 이번 시도 이상으로 추정)
+        if policy.repeated(evaluation_result, previous_feedback):
+            logger.debug("⛔ 평가 피드백이 반복됩니다. 마지막 분류를 반환합니다.")
+            savings.update(early_exit="repeat", saved_calls=savings["saved_calls"] + 2, saved_tokens=savings["saved_tokens"] + attempt_tokens)
+            return (labels, dict(usage, attempts=retries, passed=False, **repairs, **savings)) if return_obj else labels
+        previous_feedback = evaluation_result
 
         # Updating the user_query for the next attempt with full history
-        user_query += f"\n{retries}차 사고 유형 분류 결과: {labels}\n"
-        user_query += f"\n{retries}차 사고 유형 분류 피드백:\n\n{evaluation_result}\n\n"
+        user_query = with_feedback(user_query, retries, labels, evaluation_result)
+
+
+def _voting_steps(user_query, evaluator_prompt, max_retries=5, logger=None, version="", return_obj=False, classifier=CLASSIFIER_MODEL, evaluator=EVALUATOR_MODEL, classifier_format=None, evaluator_format=None, votes=VOTES, threshold=VOTE_THRESHOLD):
+    """voting_workflow_v3(_async)의 본체. _loop_steps와 같이 호출만 yield."""
+    if logger is None:
+        raise ValueError("logger must be provided from main.py")
+
+    retries, usage = 0, {"prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0}
+    repairs = {"label_repairs": 0, "verdict_repairs": 0, "dropped_labels": 0, "retries_avoided": 0}
+    evaluations = 0
+    while retries < max_retries:
+        # Sample the classifier and vote per label
+        raw_samples, call_usage = yield "samples", {"prompt": user_query, "n": votes, "model": classifier, "version": version, "response_format": classifier_format}
+        labels, agreement = vote_labels(raw_samples, threshold, repairs)
+        usage = add_usage(usage, call_usage)
+        votes_info = {"agreement": round(agreement, 3), "unanimous": agreement == 1.0, "evaluations": evaluations}
+        logger.debug(f"🗳️ 사고 유형 투표 결과 (시도 {retries + 1}/{max_retries}, 합의율 {agreement:.0%})\n사고 유형: {labels}\n")
+
+        if agreement == 1.0 and labels:
+            logger.debug("✅✅✅ 만장일치! 평가 없이 사고 유형 분류가 승인되었습니다. ✅✅✅")
+            return (labels, dict(usage, attempts=retries + 1, passed=True, **repairs, **votes_info)) if return_obj else labels
+
+        # 투표가 갈린 경우에만 Evaluator LLM 호출
+        final_evaluator_prompt = with_labels(evaluator_prompt, labels)
+        raw_evaluation, call_usage = yield "call", {"prompt": final_evaluator_prompt, "model": evaluator, "version": version, "return_obj": True, "response_format": evaluator_format}
+        passed, evaluation_result = review_verdict(raw_evaluation, repairs)
+        usage = add_usage(usage, call_usage)
+        evaluations += 1
+        votes_info["evaluations"] = evaluations
+        logger.debug(f"🔍 평가 결과 (시도 {retries + 1}/{max_retries}): {'PASS' if passed else 'FAIL'}")
+
+        if passed:
+            logger.debug("✅✅✅ 통과! 최종 사고 유형 분류가 승인되었습니다. ✅✅✅")
+            return (labels, dict(usage, attempts=retries + 1, passed=True, **repairs, **votes_info)) if return_obj else labels
+
+        retries += 1
+        logger.debug(f"🔄 재시도 필요... ({retries}/{max_retries})")
+
+        # If max retries reached, return last vote
+        if retries >= max_retries:
+            logger.debug("❌❌❌ 최대 재시도 횟수 도달. 마지막 투표 결과를 반환합니다. ❌❌❌")
+            return (labels, dict(usage, attempts=retries, passed=False, **repairs, **votes_info)) if return_obj else labels
+
+        # Updating the user_query for the next vote with full history
+        user_query = with_feedback(user_query, retries, labels, evaluation_result)
+
+
+def _run_steps(steps) -> tuple | str:
+    """workflow 본체(generator)가 yield한 호출을 동기로 실행해서 결과를 돌려주고, 본체의 반환값을 반환."""
+    calls = {"call": llm_call, "samples": llm_samples}
+    try:
+        kind, request = next(steps)
+        while True:
+            kind, request = steps.send(calls[kind](**request))
+    except StopIteration as done:
+        return done.value
+
+
+async def _arun_steps(steps) -> tuple | str:
+    """_run_steps의 비동기 버전. 호출만 llm_call_async/llm_samples_async로 await."""
+    calls = {"call": llm_call_async, "samples": llm_samples_async}
+    try:
+        kind, request = next(steps)
+        while True:
+            kind, request = steps.send(await calls[kind](**request))
+    except StopIteration as done:
+        return done.value
+
+
+def loop_workflow_v3(user_query, evaluator_prompt, max_retries=5, logger=None, version="", return_obj=False, classifier=CLASSIFIER_MODEL, evaluator=EVALUATOR_MODEL, classifier_format=None, evaluator_format=None, policy=None, seed=None) -> tuple | str:
+    """
+    평가자가 생성된 요약을 통과할 때까지 최대 max_retries번 반복.
+    user_query/evaluator_prompt는 문자열 또는 메시지 리스트(classifier_messages_v3/evaluator_messages_v3).
+    classifier_format/evaluator_format은 JSON schema structured outputs(response_format). 응답 형식이 어긋나도 라벨과 판정은 로컬에서 복구.
+    policy(RetryPolicy)로 평가 생략, 반복 피드백 시 중단, history window, 재시도 token 예산을 적용.
+    seed(유사 row의 승인된 라벨)가 주어지면 첫 시도는 분류 호출 없이 seed를 바로 평가하고, FAIL이면 피드백과 함께 평소처럼 재시도.
+    return_obj면 시도 횟수, 통과 여부, row 단위 token usage(prompt/cached/completion), 복구 지표(label/verdict repairs, retries_avoided)와
+    정책 지표(early_exit, saved/extra calls·tokens)를 함께 반환.
+    """
+    return _run_steps(_loop_steps(
+        user_query, evaluator_prompt, max_retries=max_retries, logger=logger, version=version, return_obj=return_obj, classifier=classifier, evaluator=evaluator,
+        classifier_format=classifier_format, evaluator_format=evaluator_format, policy=policy, seed=seed,
+    ))
+
+
+async def loop_workflow_v3_async(user_query, evaluator_prompt, max_retries=5, logger=None, version="", return_obj=False, classifier=CLASSIFIER_MODEL, evaluator=EVALUATOR_MODEL, classifier_format=None, evaluator_format=None, policy=None, seed=None) -> tuple | str:
+    """loop_workflow_v3의 비동기 버전. 여러 row를 동시에 처리할 때 사용."""
+    return await _arun_steps(_loop_steps(
+        user_query, evaluator_prompt, max_retries=max_retries, logger=logger, version=version, return_obj=return_obj, classifier=classifier, evaluator=evaluator,
+        classifier_format=classifier_format, evaluator_format=evaluator_format, policy=policy, seed=seed,
+    ))
+
+
+def voting_workflow_v3(user_query, evaluator_prompt, max_retries=5, logger=None, version="", return_obj=False, classifier=CLASSIFIER_MODEL, evaluator=EVALUATOR_MODEL, classifier_format=None, evaluator_format=None, votes=VOTES, threshold=VOTE_THRESHOLD) -> tuple | str:
+    """
+    self-consistency 투표: 분류 응답 votes개를 한 번에 샘플링하고 라벨 단위 다수결로 결정.
+    모든 샘플이 같은 라벨 집합이면 평가 없이 승인하고, 투표가 갈린 경우에만 평가자를 호출. FAIL이면 피드백을 붙여 다시 투표 (최대 max_retries번).
+    return_obj면 loop_workflow_v3의 지표에 더해 합의율(agreement, 마지막 투표), 만장일치 여부, 평가 호출 수(evaluations)를 반환.
+    """
+    return _run_steps(_voting_steps(
+        user_query, evaluator_prompt, max_retries=max_retries, logger=logger, version=version, return_obj=return_obj, classifier=classifier, evaluator=evaluator,
+        classifier_format=classifier_format, evaluator_format=evaluator_format, votes=votes, threshold=threshold,
+    ))
+
+
+async def voting_workflow_v3_async(user_query, evaluator_prompt, max_retries=5, logger=None, version="", return_obj=False, classifier=CLASSIFIER_MODEL, evaluator=EVALUATOR_MODEL, classifier_format=None, evaluator_format=None, votes=VOTES, threshold=VOTE_THRESHOLD) -> tuple | str:
+    """voting_workflow_v3의 비동기 버전. 여러 row를 동시에 처리할 때 사용."""
+    return await _arun_steps(_voting_steps(
+        user_query, evaluator_prompt, max_retries=max_retries, logger=logger, version=version, return_obj=return_obj, classifier=classifier, evaluator=evaluator,
+        classifier_format=classifier_format, evaluator_format=evaluator_format, votes=votes, threshold=threshold,
+    ))
+
+
+def invoke_chain(input_content, max_retries, logger=None, return_obj=False, classifier=CLASSIFIER_MODEL, evaluator=EVALUATOR_MODEL, policy=None, votes=None, vote_threshold=VOTE_THRESHOLD, seed=None, prompts="structured"):
+    if logger is None:
+        raise ValueError("logger must be provided from main.py")
+    # votes가 주어지면 self-consistency 투표(voting_workflow_v3), 아니면 분류-평가-재시도 loop (seed: 첫 시도에 평가할 유사 row의 라벨, loop만 지원)
+    # prompts는 PROMPT_VERSIONS의 프롬프트 버전 (기본 structured, 평가 실행에서 v1/v2/v3/messages와 비교)
+    selected = prompt_version(prompts)
+    workflow, options = (voting_workflow_v3, {"votes": votes, "threshold": vote_threshold}) if votes else (loop_workflow_v3, {"policy": policy, "seed": seed})
+    # 프롬프트/응답 전문은 DEBUG 로그 대신 샘플링된 row만 transcript 로그에 기록
+    with span("invoke_chain", classifier=classifier, evaluator=evaluator, votes=votes), metrics.row_scope() as calls, transcripts.row_scope(transcripts.trace(input_content)):
+        final_labels, info = workflow(
+            selected["classifier"](input_content), selected["evaluator"](input_content), max_retries=max_retries, logger=logger,
+            version=selected["version"], return_obj=True, classifier=classifier, evaluator=evaluator,
+            classifier_format=selected.get("classifier_format"), evaluator_format=selected.get("evaluator_format"), **options,
+        )
+    info.update(summarize_calls(calls))
+    logger.debug(f"💡💡💡 최종 결과 💡💡💡\n위험성 평가:\n{input_content}\n사고 유형 분류: {final_labels}\n")
+    if return_obj:
+        return final_labels, info
+    return final_labels
 
 
-def invoke_chain(input_content, max_retries, logger=None):
+async def ainvoke_chain(input_content, max_retries, logger=None, return_obj=False, classifier=CLASSIFIER_MODEL, evaluator=EVALUATOR_MODEL, policy=None, votes=None, vote_threshold=VOTE_THRESHOLD, seed=None, prompts="structured"):
     if logger is None:
         raise ValueError("logger must be provided from main.py")
-    final_labels = loop_workflow_v3(user_query_v3.format(input_content), evaluator_prompt_v3, max_retries=max_retries, logger=logger)
+    # votes가 주어지면 self-consistency 투표(voting_workflow_v3), 아니면 분류-평가-재시도 loop (seed: 첫 시도에 평가할 유사 row의 라벨, loop만 지원)
+    selected = prompt_version(prompts)
+    workflow, options = (voting_workflow_v3_async, {"votes": votes, "threshold": vote_threshold}) if votes else (loop_workflow_v3_async, {"policy": policy, "seed": seed})
+    with span("invoke_chain", classifier=classifier, evaluator=evaluator, votes=votes), metrics.row_scope() as calls, transcripts.row_scope(transcripts.trace(input_content)):
+        final_labels, info = await workflow(
+            selected["classifier"](input_content), selected["evaluator"](input_content), max_retries=max_retries, logger=logger,
+            version=selected["version"], return_obj=True, classifier=classifier, evaluator=evaluator,
+            classifier_format=selected.get("classifier_format"), evaluator_format=selected.get("evaluator_format"), **options,
+        )
+    info.update(summarize_calls(calls))
     logger.debug(f"💡💡💡 최종 결과 💡💡💡\n위험성 평가:\n{input_content}\n사고 유형 분류: {final_labels}\n")
+    if return_obj:
+        return final_labels, info
     return final_labels
 
 
-__all__ = ["invoke_chain"]
\ No newline at end of file
+__all__ = ["CLASSIFIER_MODEL", "EVALUATOR_MODEL", "VOTES", "VOTE_THRESHOLD", "invoke_chain", "ainvoke_chain"]
\ No newline at end of file
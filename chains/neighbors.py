@@ -0,0 +1,249 @@
+from __future__ import annotations
+
+import json
+import os
+import re
+from typing import TYPE_CHECKING
+
+from prompts import ACCIDENT_TYPES
+from utils import file_lock
+
+if TYPE_CHECKING:  # 타입 힌트 전용 (numpy는 사용하는 함수 안에서 import)
+    import numpy as np
+
+
+NEIGHBOR_INDEX = os.getenv("NEIGHBOR_INDEX", os.path.join(".cache", "neighbors"))
+NEIGHBOR_MODES = ("reuse", "evaluate")
+RECORDS = "index.u32"
+META = "meta.json"
+SIGNATURE_BATCH = 512
+
+_MERSENNE = (1 << 61) - 1
+_MASK32 = 0xFFFFFFFF
+_VALUE_LINE = re.compile(r"^[ \t]*-[ \t]*[^:\n]+:[ \t]*(.*)$", re.MULTILINE)
+
+
+def content_text(input_content: str) -> str:
+    """format_input_content 결과에서 "- 공정: " 같은 필드 이름을 빼고 값만 공백 없이 이어붙임. 모든 row에 같은 필드 이름이 유사도를 부풀리지 않도록."""
+    values = _VALUE_LINE.findall(input_content) or [input_content]
+    return "|".join("".join(value.split()) for value in values)
+
+
+def encode_labels(labels: str) -> int:
+    """세미콜론 라벨 목록을 ACCIDENT_TYPES 순서의 bitmask로. 허용되지 않은 라벨이 있으면 0 (인덱스에 넣지 않음)."""
+    mask = 0
+    for label in str(labels).split(";"):
+        label = label.strip()
+        if not label:
+            continue
+        if label not in ACCIDENT_TYPES:
+            return 0
+        mask |= 1 << ACCIDENT_TYPES.index(label)
+    return mask
+
+
+def decode_labels(mask: int) -> str:
+    return ";".join(label for i, label in enumerate(ACCIDENT_TYPES) if mask >> i & 1)
+
+
+class MinHashIndex:
+    """
+    승인된 neo_사고분류 결과의 문자 n-gram MinHash + LSH(band) 인덱스. 띄어쓰기/표현만 조금 다른 작업내용의 가장 가까운 이웃 라벨을 찾음.
+    path 디렉터리에 [signature | 라벨 bitmask] 고정 길이 레코드를 append-only로 저장하고 (flush), 불러올 때 band별 정렬 배열을 다시 만듦.
+    모든 band key를 한 정렬 배열에 두고 searchsorted로 찾으므로 1M row에서도 lookup이 1ms 미만. 메모리는 1M row 기준 레코드 260MB + band 인덱스 100MB 정도.
+    """
+
+    def __init__(self, path: str = None, permutations: int = 64, bands: int = 8, shingle: int = 3, seed: int = 1, max_candidates: int = 256):
+        import numpy as np
+
+        if permutations % bands:
+            raise ValueError(f"permutations({permutations}) must be a multiple of bands({bands})")
+        self.path = path
+        self.meta = {"permutations": permutations, "bands": bands, "shingle": shingle, "seed": seed, "types": ACCIDENT_TYPES}
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, _MERSENNE, permutations, dtype=np.uint64)
+        self.b = rng.integers(0, _MERSENNE, permutations, dtype=np.uint64)
+        self.band_mix = rng.integers(1, 1 << 63, permutations // bands, dtype=np.uint64) | np.uint64(1)
+        self.band_salt = rng.integers(0, 1 << 63, bands, dtype=np.uint64)
+        self.digest_mix = rng.integers(1, 1 << 63, permutations + 1, dtype=np.uint64) | np.uint64(1)
+        self.width = permutations + 1
+        self.records = np.zeros((0, self.width), dtype=np.uint32)
+        self.size = self.saved = 0
+        self.seen = set()
+        self.max_candidates = max_candidates
+        self.stats = {"checked": 0, "matched": 0, "conflicts": 0, "added": 0}
+        if path is not None:
+            self.load()
+        else:
+            self._reindex()
+
+    @property
+    def signatures(self) -> np.ndarray:
+        return self.records[:self.size, :-1]
+
+    def _shingles(self, text: str) -> np.ndarray:
+        """문자 n-gram의 32bit hash (codepoint 다항식 + multiply-shift). n보다 짧은 텍스트는 전체를 하나의 n-gram으로."""
+        import numpy as np
+
+        n = self.meta["shingle"]
+        codes = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+        if len(codes) < n:
+            codes = np.concatenate([codes, np.zeros(n - len(codes), dtype=np.uint64)])
+        grams = np.zeros(len(codes) - n + 1, dtype=np.uint64)
+        for i in range(n):
+            grams = grams * np.uint64(0x10FFFF + 1) + codes[i:len(codes) - n + 1 + i]
+        return np.unique((grams * np.uint64(0x9E3779B97F4A7C15)) >> np.uint64(32))
+
+    def signature_batch(self, contents: list) -> np.ndarray:
+        """contents 각각의 MinHash signature (len(contents) × permutations, uint32)."""
+        import numpy as np
+
+        signatures = np.zeros((len(contents), self.meta["permutations"]), dtype=np.uint32)
+        # 중간 배열(n-gram 수 × permutations)이 너무 커지지 않게 SIGNATURE_BATCH개씩 계산
+        for offset in range(0, len(contents), SIGNATURE_BATCH):
+            hashes = [self._shingles(content_text(content)) for content in contents[offset:offset + SIGNATURE_BATCH]]
+            starts = np.cumsum([0] + [len(h) for h in hashes[:-1]])
+            # uint64 곱셈 overflow는 wrap-around (universal hash family로는 충분)
+            values = ((self.a[:, None] * np.concatenate(hashes) + self.b[:, None]) % np.uint64(_MERSENNE)) & np.uint64(_MASK32)
+            signatures[offset:offset + len(hashes)] = np.minimum.reduceat(values, starts, axis=1).T
+        return signatures
+
+    def signature(self, content: str) -> np.ndarray:
+        return self.signature_batch([content])[0]
+
+    def _band_keys(self, signatures: np.ndarray) -> np.ndarray:
+        """signature를 band별 64bit key로 (len × bands). band마다 salt를 섞어서 모든 band를 한 정렬 배열에 둘 수 있게 함."""
+        import numpy as np
+
+        rows = self.meta["permutations"] // self.meta["bands"]
+        banded = signatures.astype(np.uint64).reshape(len(signatures), self.meta["bands"], rows)
+        return (banded * self.band_mix).sum(axis=2, dtype=np.uint64) ^ self.band_salt
+
+    def _digests(self, records: np.ndarray) -> np.ndarray:
+        """[signature | 라벨 bitmask] 레코드의 64bit digest. 같은 signature와 라벨이 두 번 들어가지 않게 하는 데 사용."""
+        import numpy as np
+
+        return (records.astype(np.uint64) * self.digest_mix).sum(axis=1, dtype=np.uint64)
+
+    def _reindex(self) -> None:
+        """모든 band key를 하나의 (정렬된 key, row id) 배열로 다시 만들고, 이후 추가분은 recent dict에 모음."""
+        import numpy as np
+
+        keys = self._band_keys(self.signatures).ravel()
+        order = np.argsort(keys, kind="stable")
+        self.sorted_keys = keys[order]
+        self.sorted_ids = (order // self.meta["bands"]).astype(np.uint32)
+        self.indexed = self.size
+        self.recent = {}
+
+    def load(self) -> "MinHashIndex":
+        import numpy as np
+
+        os.makedirs(self.path, exist_ok=True)
+        meta_path = os.path.join(self.path, META)
+        if os.path.exists(meta_path):
+            with open(meta_path, encoding="utf-8") as f:
+                saved = json.load(f)
+            if saved != self.meta:
+                raise ValueError(f"neighbor index {self.path} was built with {saved}, not {self.meta}")
+        else:
+            with open(meta_path, "w", encoding="utf-8") as f:
+                json.dump(self.meta, f, ensure_ascii=False)
+        records_path = os.path.join(self.path, RECORDS)
+        records = np.fromfile(records_path, dtype=np.uint32) if os.path.exists(records_path) else np.zeros(0, dtype=np.uint32)
+        # 쓰다가 중단된 마지막 레코드는 버림 (flush에서 파일도 잘라냄)
+        self.size = self.saved = len(records) // self.width
+        self.records = records[:self.size * self.width].reshape(self.size, self.width).copy()
+        self.seen = set(self._digests(self.records).tolist())
+        self._reindex()
+        return self
+
+    def query(self, content: str = None, k: int = 5, signature: np.ndarray = None) -> list:
+        """
+        가장 가까운 이웃 최대 k개의 [(추정 Jaccard 유사도, labels)]. 같은 LSH bucket에 걸린 후보만 비교하고,
+        후보가 max_candidates보다 많으면 (비슷한 row가 몰린 bucket) 겹치는 band 수가 많은 후보만 남김.
+        """
+        import numpy as np
+
+        signature = self.signature(content) if signature is None else signature
+        keys = self._band_keys(signature[None, :])[0]
+        lo, hi = np.searchsorted(self.sorted_keys, keys, "left"), np.searchsorted(self.sorted_keys, keys, "right")
+        # bucket 하나에서는 최대 max_candidates개만 (거의 같은 row가 수만 개 몰린 bucket에서도 lookup 시간이 일정하도록)
+        candidates = [self.sorted_ids[start:min(stop, start + self.max_candidates)] for start, stop in zip(lo.tolist(), hi.tolist()) if stop > start]
+        candidates += [np.asarray(self.recent[key], dtype=np.uint32) for key in keys.tolist() if key in self.recent]
+        if not candidates:
+            return []
+        candidates = np.concatenate(candidates)
+        if len(candidates) > self.max_candidates:
+            ids, counts = np.unique(candidates, return_counts=True)
+            if len(ids) > self.max_candidates:
+                ids = ids[np.argpartition(-counts, self.max_candidates)[:self.max_candidates]]
+        else:
+            ids = np.unique(candidates)
+        similarity = (self.records[ids, :-1] == signature).mean(axis=1)
+        top = np.argsort(-similarity, kind="stable")[:k]
+        return [(float(similarity[t]), decode_labels(int(self.records[ids[t], -1]))) for t in top]
+
+    def match(self, content: str, threshold: float) -> tuple:
+        """
+        (labels, {"source": "neighbor", "similarity": ...}) 또는 (None, None).
+        threshold 이상인 이웃이 모두 같은 라벨일 때만 채택하고, 라벨이 갈리면 conflicts로 세고 LLM에 맡김.
+        """
+        self.stats["checked"] += 1
+        close = [(similarity, labels) for similarity, labels in self.query(content) if similarity >= threshold]
+        if not close:
+            return None, None
+        if len({labels for _, labels in close}) > 1:
+            self.stats["conflicts"] += 1
+            return None, None
+        self.stats["matched"] += 1
+        return close[0][1], {"source": "neighbor", "similarity": round(close[0][0], 3)}
+
+    def add(self, contents: list, labels: list) -> int:
+        """승인된 (content, labels)를 추가. 이미 같은 signature와 라벨로 들어 있으면 건너뜀. 추가한 개수를 반환 (디스크에는 flush에서 기록)."""
+        import numpy as np
+
+        masks = [encode_labels(label) for label in labels]
+        pairs = [(content, mask) for content, mask in zip(contents, masks) if mask]
+        if not pairs:
+            return 0
+        records = np.column_stack([self.signature_batch([content for content, _ in pairs]), np.array([mask for _, mask in pairs], dtype=np.uint32)])
+        added = 0
+        for record, digest, keys in zip(records, self._digests(records).tolist(), self._band_keys(records[:, :-1]).tolist()):
+            if digest in self.seen:
+                continue
+            self.seen.add(digest)
+            if self.size == len(self.records):
+                self.records = np.concatenate([self.records, np.zeros((max(1024, self.size), self.width), dtype=np.uint32)])
+            self.records[self.size] = record
+            for key in keys:
+                self.recent.setdefault(key, []).append(self.size)
+            self.size += 1
+            added += 1
+        self.stats["added"] += added
+        # recent dict가 커지면 정렬 배열로 합침
+        if self.size - self.indexed > max(10_000, self.indexed // 10):
+            self._reindex()
+        return added
+
+    def flush(self) -> None:
+        """아직 저장하지 않은 레코드를 append + fsync. 여러 프로세스(shard worker)가 같은 인덱스에 써도 레코드 단위로 섞이지 않도록 file lock 사용."""
+        if self.path is None or self.saved == self.size:
+            return
+        records_path = os.path.join(self.path, RECORDS)
+        with file_lock(records_path + ".lock"):
+            with open(records_path, "ab") as f:
+                record_bytes = self.width * 4
+                if f.tell() % record_bytes:
+                    f.truncate(f.tell() - f.tell() % record_bytes)
+                    f.seek(0, os.SEEK_END)
+                f.write(self.records[self.saved:self.size].tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+        self.saved = self.size
+
+    def __len__(self) -> int:
+        return self.size
+
+
+__all__ = ["NEIGHBOR_INDEX", "NEIGHBOR_MODES", "MinHashIndex", "content_text"]
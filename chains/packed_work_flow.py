@@ -0,0 +1,141 @@
+import json
+import re
+
+from prompts import (
+    classifier_messages_v3,
+    evaluator_messages_v3,
+    packed_evaluator_messages_v3,
+    packed_messages_v3,
+    prompt_version_packed_v3,
+    with_labels,
+)
+from models import estimate_tokens, llm_call, metrics, summarize_calls
+from utils import transcripts
+from .loop_work_flow import CLASSIFIER_MODEL, EVALUATOR_MODEL, invoke_chain
+from .parsing import parse_labels
+
+
+_JSON_BLOCK = re.compile(r"\{.*\}", re.DOTALL)
+
+
+def parse_packed_response(response: str, key: str) -> dict:
+    """{"results": [{"id": n, key: ...}, ...]} 응답을 {n: 값}으로 파싱. 형식이 깨진 항목은 빠짐."""
+    match = _JSON_BLOCK.search(response or "")
+    if match is None:
+        return {}
+    try:
+        results = json.loads(match.group(0)).get("results", [])
+    except (json.JSONDecodeError, AttributeError):
+        return {}
+    parsed = {}
+    for item in results:
+        if not isinstance(item, dict) or key not in item:
+            continue
+        try:
+            parsed[int(item["id"])] = item[key]
+        except (KeyError, TypeError, ValueError):
+            continue
+    return parsed
+
+
+def _as_labels(value) -> str | None:
+    """항목의 라벨을 허용된 유형의 세미콜론 목록으로 정규화. 유효한 라벨이 없으면 None (다음 round/fallback 대상)."""
+    if isinstance(value, list):
+        value = ";".join(str(label) for label in value)
+    if not isinstance(value, str):
+        return None
+    labels, _ = parse_labels(value)
+    return ";".join(labels) or None
+
+
+def packed_workflow_v3(contents: list, max_retries=5, logger=None, stats=None, classifier=CLASSIFIER_MODEL, evaluator=EVALUATOR_MODEL) -> list:
+    """
+    loop_workflow_v3를 K개 row를 하나의 번호 매긴 프롬프트로 묶어서 실행.
+    분류/평가 모두 JSON으로 받아 row별로 나누고, 파싱에 실패한 row는 단일 row 호출(invoke_chain)로 fallback.
+    contents 순서대로 (labels, {"attempts": n, "packed": bool, "passed": bool, 호출 지표})의 리스트를 반환.
+    stats가 주어지면 단일 호출 대비 prompt token 수를 누적.
+    """
+    if logger is None:
+        raise ValueError("logger must be provided from main.py")
+    stats = {} if stats is None else stats
+
+    histories = {i: "" for i in range(len(contents))}
+    attempts = {i: 0 for i in range(len(contents))}
+    last_labels, results, fallback = {}, {}, []
+    # 묶음 전체가 하나의 transcript (샘플링된 묶음만 프롬프트/응답 전문을 기록)
+    pack_calls, pack_trace = [], transcripts.trace("\n\n".join(contents))
+
+    for retries in range(max_retries):
+        pending = [i for i in range(len(contents)) if i not in results and i not in fallback]
+        if not pending:
+            break
+
+        # 분류: 항목마다 이전 분류 결과/피드백을 붙여서 번호를 매김
+        items = "\n".join(f"{n}.\n{contents[i]}{histories[i]}\n" for n, i in enumerate(pending, start=1))
+        packed_query = packed_messages_v3(items)
+        with metrics.row_scope(pack_calls), transcripts.row_scope(pack_trace):
+            parsed = parse_packed_response(llm_call(packed_query, model=classifier, version=prompt_version_packed_v3), "labels")
+        stats["packed_tokens"] = stats.get("packed_tokens", 0) + estimate_tokens(packed_query)
+        stats["single_tokens"] = stats.get("single_tokens", 0) + sum(
+            estimate_tokens(classifier_messages_v3(contents[i] + histories[i])) for i in pending
+        )
+
+        labels = {}
+        for n, i in enumerate(pending, start=1):
+            value = _as_labels(parsed.get(n))
+            if value is None:
+                fallback.append(i)
+                continue
+            labels[i] = value
+            attempts[i] += 1
+        last_labels.update(labels)
+        if not labels:
+            continue
+
+        # 평가: 작업내용과 분류 결과를 번호별로 묶어서 평가 (단일 호출의 evaluator 메시지와 동일한 정보)
+        evaluated = list(labels)
+        items = "\n".join(f"{n}.\n{contents[i]}\n사고 유형 분류 결과: {labels[i]}\n" for n, i in enumerate(evaluated, start=1))
+        packed_evaluator_prompt = packed_evaluator_messages_v3(items)
+        with metrics.row_scope(pack_calls), transcripts.row_scope(pack_trace):
+            evaluation_result = llm_call(packed_evaluator_prompt, model=evaluator, version=prompt_version_packed_v3)
+        verdicts = parse_packed_response(evaluation_result, "result")
+        feedbacks = parse_packed_response(evaluation_result, "feedback")
+        stats["packed_tokens"] = stats.get("packed_tokens", 0) + estimate_tokens(packed_evaluator_prompt)
+        stats["single_tokens"] = stats.get("single_tokens", 0) + sum(
+            estimate_tokens(with_labels(evaluator_messages_v3(contents[i]), labels[i])) for i in evaluated
+        )
+        logger.debug(f"🔍 묶음 평가 결과 (시도 {retries + 1}/{max_retries})\n{verdicts}\n{feedbacks}\n")
+
+        for n, i in enumerate(evaluated, start=1):
+            verdict = verdicts.get(n)
+            if not isinstance(verdict, str):
+                fallback.append(i)
+            elif verdict.strip().upper() == "PASS":
+                results[i] = (labels[i], {"attempts": attempts[i], "packed": True, "passed": True})
+            else:
+                histories[i] += f"\n{attempts[i]}차 사고 유형 분류 결과: {labels[i]}\n"
+                histories[i] += f"\n{attempts[i]}차 사고 유형 분류 피드백:\n\n{feedbacks.get(n, '')}\n\n"
+
+    # 최대 재시도 도달: loop_workflow_v3와 같이 마지막 분류를 반환
+    for i, labels in last_labels.items():
+        if i not in results and i not in fallback:
+            results[i] = (labels, {"attempts": attempts[i], "packed": True, "passed": False})
+
+    # 파싱 실패 row는 단일 row 체인으로 처리
+    for i in fallback:
+        logger.debug(f"↩️ 묶음 응답 파싱 실패, 단일 호출로 처리\n{contents[i]}\n")
+        labels, info = invoke_chain(contents[i], max_retries=max_retries, logger=logger, return_obj=True, classifier=classifier, evaluator=evaluator)
+        results[i] = (labels, dict(info, packed=False))
+
+    # 묶음 호출의 비용/latency는 묶음에 포함된 row에 균등하게 나눠서 기록 (fallback row는 단일 호출분에 더함)
+    share = summarize_calls(pack_calls)
+    for labels, info in results.values():
+        info["calls"] = round(info.get("calls", 0) + share["calls"] / len(contents), 3)
+        info["llm_latency"] = round(info.get("llm_latency", 0) + share["llm_latency"] / len(contents), 3)
+        info["cost"] = info.get("cost", 0) + share["cost"] / len(contents)
+    stats["rows"] = stats.get("rows", 0) + len(contents)
+    stats["fallback_rows"] = stats.get("fallback_rows", 0) + len(fallback)
+    return [results[i] for i in range(len(contents))]
+
+
+__all__ = ["packed_workflow_v3", "parse_packed_response"]
@@ -0,0 +1,111 @@
+import json
+import re
+
+from prompts import ACCIDENT_TYPES
+
+
+_JSON_OBJECT = re.compile(r"\{.*\}", re.DOTALL)
+# 괄호 안의 쉼표("절상(절단,찔림,베임)")는 구분자로 보지 않음
+_SPLIT = re.compile(r"[;\n/|·]+|,(?![^()]*\))")
+_STRIP = " \t'\"`*-•[]{}.:0123456789"
+_VERDICT = re.compile(r"평가결과\s*[=:]\s*\**\s*(PASS|FAIL)", re.IGNORECASE)
+_BARE_VERDICT = re.compile(r"\b(PASS|FAIL)\b", re.IGNORECASE)
+
+# 모델이 자주 쓰는 축약/변형 표현 → 허용된 사고 유형
+LABEL_ALIASES = {
+    "절상": "절상(절단,찔림,베임)",
+    "절단": "절상(절단,찔림,베임)",
+    "찔림": "절상(절단,찔림,베임)",
+    "베임": "절상(절단,찔림,베임)",
+    "충돌": "충돌 및 접촉",
+    "접촉": "충돌 및 접촉",
+    "충돌및접촉": "충돌 및 접촉",
+    "추락": "떨어짐",
+    "전도": "넘어짐",
+    "협착": "끼임",
+    "감김": "끼임",
+}
+
+
+def _load_json(text: str):
+    """응답 전체 또는 응답 안의 첫 JSON object를 파싱. 실패하면 None."""
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        pass
+    match = _JSON_OBJECT.search(text)
+    if match is None:
+        return None
+    try:
+        return json.loads(match.group(0))
+    except json.JSONDecodeError:
+        return None
+
+
+def normalize_label(label: str) -> str | None:
+    """단일 라벨을 허용된 11개 유형 중 하나로 정규화. 해당 없으면 None."""
+    label = str(label).rsplit(":", 1)[-1].strip(_STRIP)
+    if label in ACCIDENT_TYPES:
+        return label
+    compact = label.replace(" ", "")
+    if compact in LABEL_ALIASES:
+        return LABEL_ALIASES[compact]
+    for accident_type in ACCIDENT_TYPES:
+        if accident_type.replace(" ", "") == compact:
+            return accident_type
+    return None
+
+
+def parse_labels(text: str) -> tuple:
+    """
+    분류 응답을 ACCIDENT_TYPES 순서의 라벨 리스트로 파싱.
+    structured output({"labels": [...]})이 정상이면 그대로, 아니면 JSON 조각이나 세미콜론 목록에서 로컬로 복구.
+    (labels, {"repaired": bool, "dropped": [허용되지 않은 라벨]})을 반환. 복구할 라벨이 하나도 없으면 labels는 빈 리스트.
+    """
+    text = (text or "").strip()
+    payload = _load_json(text)
+    if isinstance(payload, dict) and isinstance(payload.get("labels"), list):
+        raw, repaired = payload["labels"], not text.startswith("{")
+    else:
+        raw, repaired = _SPLIT.split(text), True
+    found, dropped = set(), []
+    for item in raw:
+        label = normalize_label(item)
+        if label is None:
+            if str(item).strip(_STRIP):
+                dropped.append(str(item).strip())
+            continue
+        repaired = repaired or label != item
+        found.add(label)
+    labels = [label for label in ACCIDENT_TYPES if label in found]
+    return labels, {"repaired": repaired or bool(dropped), "dropped": dropped}
+
+
+def parse_verdict(text: str) -> tuple:
+    """
+    평가 응답에서 (verdict, feedback, repaired)를 파싱.
+    structured output({"verdict", "reasons"})이 아니면 "평가결과 = PASS/FAIL" 또는 단독 PASS/FAIL 표기에서 복구.
+    판정을 찾지 못하면 verdict는 None.
+    """
+    text = (text or "").strip()
+    payload = _load_json(text)
+    if isinstance(payload, dict) and str(payload.get("verdict", "")).upper() in ("PASS", "FAIL"):
+        reasons = payload.get("reasons") or []
+        reasons = [reasons] if isinstance(reasons, str) else reasons
+        feedback = "\n".join(f"- {reason}" for reason in reasons)
+        return payload["verdict"].upper(), feedback, not text.startswith("{")
+    match = _VERDICT.search(text)
+    if match is not None:
+        return match.group(1).upper(), text, match.group(0) not in ("평가결과 = PASS", "평가결과 = FAIL")
+    verdicts = {verdict.upper() for verdict in _BARE_VERDICT.findall(text)}
+    if len(verdicts) == 1:
+        return verdicts.pop(), text, True
+    return None, text, False
+
+
+def format_feedback(verdict: str, feedback: str) -> str:
+    """재시도 프롬프트에 넣을 평가 결과 문자열 (기존 자유 형식과 같은 "평가결과 = ..." 머리말)."""
+    return f"평가결과 = {verdict}\n{feedback}".strip()
+
+
+__all__ = ["LABEL_ALIASES", "format_feedback", "normalize_label", "parse_labels", "parse_verdict"]
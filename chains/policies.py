@@ -0,0 +1,117 @@
+import threading
+
+from models import cache_key, estimate_tokens, response_cache
+from prompts import window_history
+from .parsing import parse_labels
+
+
+EARLY_EXITS = ("agreement", "cache", "repeat")
+# RetryPolicy.from_options가 읽는 main.py 옵션 (loop workflow의 단일 row 호출에만 적용)
+POLICY_OPTIONS = ("early_exit", "history", "history_summary", "retry_budget")
+# 재현 가능한 두 번째 분류 샘플: 같은 프롬프트라도 응답 캐시 키가 달라지도록 version에 붙임
+SAMPLE_VERSION = "#sample2"
+APPROVED_VERSION = "#approved"
+
+
+class RetryBudget:
+    """실행 전체에서 공유하는 재시도 token 예산. 2번째 시도부터 사용한 prompt/completion token을 차감하고, 소진되면 더 이상 재시도하지 않음."""
+
+    def __init__(self, tokens: int):
+        self.tokens = int(tokens)
+        self.used = 0
+        self.denied = 0
+        self.lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self.lock:
+            if self.used < self.tokens:
+                return True
+            self.denied += 1
+            return False
+
+    def charge(self, tokens: int) -> None:
+        with self.lock:
+            self.used += tokens
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {"tokens": self.tokens, "used": self.used, "denied": self.denied}
+
+
+class RetryPolicy:
+    """
+    loop_workflow_v3의 조기 종료/재시도 정책.
+    - early_exit="agreement": 첫 시도에서 분류를 한 번 더 샘플링해서 두 결과가 같으면 평가 생략
+    - early_exit="cache": 같은 작업내용에 대해 이전에 PASS한 라벨과 같으면 평가 생략 (응답 캐시에 저장)
+    - early_exit="repeat": 평가자 피드백이 직전 시도와 같으면 재시도 중단
+    - history: 재시도 프롬프트에 마지막 N회 분류/피드백만 유지 (summarize면 잘라낸 시도는 라벨 요약으로 대체)
+    - budget: 실행 전체가 공유하는 재시도 token 예산 (RetryBudget)
+    """
+
+    def __init__(self, early_exit=(), history: int = None, summarize: bool = False, budget: RetryBudget = None):
+        if isinstance(early_exit, str):
+            early_exit = [name.strip() for name in early_exit.split(",") if name.strip()]
+        unknown = set(early_exit) - set(EARLY_EXITS)
+        if unknown:
+            raise ValueError(f"unknown early_exit policy: {sorted(unknown)} (choose from {EARLY_EXITS})")
+        self.early_exit = frozenset(early_exit)
+        self.history = None if history is None else int(history)
+        self.summarize = summarize
+        self.budget = budget
+
+    @classmethod
+    def from_options(cls, **kwargs) -> "RetryPolicy":
+        """main.py 옵션: --early_exit agreement,cache,repeat --history 2 --history_summary --retry_budget 200000"""
+        early_exit = kwargs.get("early_exit") or ()
+        if isinstance(early_exit, (tuple, list)):
+            early_exit = ",".join(early_exit)
+        budget = kwargs.get("retry_budget")
+        return cls(
+            early_exit=early_exit,
+            history=kwargs.get("history"),
+            summarize=bool(kwargs.get("history_summary")),
+            budget=RetryBudget(budget) if budget is not None else None,
+        )
+
+    def uses(self, name: str) -> bool:
+        return name in self.early_exit
+
+    def window(self, user_query, base: int) -> tuple:
+        """(이번 시도에 보낼 프롬프트, history를 잘라서 줄인 prompt token 수 추정)."""
+        prompt = window_history(user_query, base, self.history, self.summarize)
+        if prompt is user_query:
+            return prompt, 0
+        return prompt, max(0, estimate_tokens(user_query) - estimate_tokens(prompt))
+
+    def agrees(self, labels: str, raw_sample: str) -> bool:
+        """두 번째 샘플이 같은 라벨 집합인지 (순서/표기 차이는 parse_labels가 정규화)."""
+        sample, _ = parse_labels(raw_sample)
+        return bool(labels) and ";".join(sample) == labels
+
+    def approved_key(self, user_query, version: str) -> str:
+        return cache_key("approved", user_query, version + APPROVED_VERSION)
+
+    def approved(self, key: str, labels: str) -> bool:
+        return self.uses("cache") and bool(labels) and response_cache.get(key) == labels
+
+    def approve(self, key: str, labels: str) -> None:
+        if self.uses("cache") and labels:
+            response_cache.put(key, "approved", labels)
+
+    def repeated(self, feedback: str, previous: str | None) -> bool:
+        return self.uses("repeat") and previous is not None and " ".join(feedback.split()) == " ".join(previous.split())
+
+    def allow_retry(self) -> bool:
+        return self.budget is None or self.budget.allow()
+
+    def charge(self, tokens: int) -> None:
+        if self.budget is not None:
+            self.budget.charge(tokens)
+
+
+def policy_savings() -> dict:
+    """row 하나의 정책 지표. early_exit: 평가 생략/중단 사유, saved_*: 생략한 호출과 token (추정), extra_*: agreement 샘플 비용."""
+    return {"early_exit": None, "saved_calls": 0, "saved_tokens": 0, "history_saved_tokens": 0, "extra_calls": 0, "extra_tokens": 0}
+
+
+__all__ = ["EARLY_EXITS", "POLICY_OPTIONS", "RetryBudget", "RetryPolicy", "policy_savings"]
@@ -0,0 +1,145 @@
+import pickle
+import re
+
+try:
+    import ahocorasick
+except ImportError:  # pyahocorasick이 없으면 정규식 alternation으로 대체
+    ahocorasick = None
+
+from prompts import ACCIDENT_TYPES
+
+
+# (키워드, 사고 유형, 확신도). user_query_v3의 분류 지침에서 한 가지 유형으로만 해석되는 표현만 등록.
+# 0.95는 그 자체가 사고 유형 이름인 표현, 0.8은 다른 유형으로도 이어질 수 있는 넓은 표현 (기본 threshold 0.9 미만이라 단독으로는 LLM으로 보냄)
+KEYWORD_RULES = [
+    ("추락", "떨어짐", 0.95),
+    ("감전", "감전", 0.95),
+    ("누전", "감전", 0.8),
+    ("협착", "끼임", 0.95),
+    ("끼임", "끼임", 0.95),
+    ("감김", "끼임", 0.95),
+    ("말림", "끼임", 0.8),
+    ("질식", "질식", 0.95),
+    ("산소결핍", "질식", 0.95),
+    ("화상", "화상", 0.95),
+    ("폭발", "화상", 0.8),
+    ("화재", "화상", 0.8),
+    ("베임", "절상(절단,찔림,베임)", 0.95),
+    ("찔림", "절상(절단,찔림,베임)", 0.95),
+    ("절단", "절상(절단,찔림,베임)", 0.8),
+    ("깔림", "깔림", 0.95),
+    ("붕괴", "깔림", 0.8),
+    ("넘어짐", "넘어짐", 0.95),
+    ("미끄러", "넘어짐", 0.8),
+    ("분진", "질병", 0.8),
+    ("소음성 난청", "질병", 0.95),
+    ("낙하물", "충돌 및 접촉", 0.8),
+    ("비래", "충돌 및 접촉", 0.95),
+    ("충돌", "충돌 및 접촉", 0.8),
+    ("부딪", "충돌 및 접촉", 0.8),
+]
+
+_HAZARD_LINE = re.compile(r"^- 유해위험요인: (.*)$", re.MULTILINE)
+
+
+def hazard_text(input_content: str) -> str:
+    """format_input_content 결과에서 유해위험요인 줄만 추출 (분류 기준이 유해위험요인 중심이므로)."""
+    match = _HAZARD_LINE.search(input_content)
+    return match.group(1) if match else input_content
+
+
+class KeywordMatcher:
+    """KEYWORD_RULES를 한 번에 매칭하는 컴파일된 matcher (pyahocorasick이 있으면 Aho-Corasick automaton)."""
+
+    def __init__(self, rules: list = KEYWORD_RULES):
+        self.rules = {keyword: (label, confidence) for keyword, label, confidence in rules}
+        if ahocorasick is not None:
+            self.automaton = ahocorasick.Automaton()
+            for keyword in self.rules:
+                self.automaton.add_word(keyword, keyword)
+            self.automaton.make_automaton()
+            self.pattern = None
+        else:
+            self.automaton = None
+            self.pattern = re.compile("|".join(map(re.escape, sorted(self.rules, key=len, reverse=True))))
+
+    def find(self, text: str) -> list:
+        if self.automaton is not None:
+            return [keyword for _, keyword in self.automaton.iter(text)]
+        return self.pattern.findall(text)
+
+    def predict(self, text: str) -> tuple:
+        """(세미콜론 구분 labels, 확신도). 매칭이 없으면 (None, 0.0). 여러 유형이 걸리면 확신도를 낮춤."""
+        labels = {}
+        for keyword in self.find(text):
+            label, confidence = self.rules[keyword]
+            labels[label] = max(labels.get(label, 0.0), confidence)
+        if not labels:
+            return None, 0.0
+        ordered = [label for label in ACCIDENT_TYPES if label in labels]
+        confidence = min(labels.values()) * (0.9 ** (len(labels) - 1))
+        return ";".join(ordered), confidence
+
+
+class TfidfClassifier:
+    """이전에 승인된 neo_사고분류로 학습하는 문자 n-gram TF-IDF + 선형 multi-label 분류기 (scikit-learn 필요)."""
+
+    def __init__(self):
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.linear_model import LogisticRegression
+        from sklearn.multiclass import OneVsRestClassifier
+        from sklearn.preprocessing import MultiLabelBinarizer
+
+        self.vectorizer = TfidfVectorizer(analyzer="char_wb", ngram_range=(2, 4), min_df=2, sublinear_tf=True)
+        self.binarizer = MultiLabelBinarizer(classes=ACCIDENT_TYPES)
+        self.model = OneVsRestClassifier(LogisticRegression(max_iter=1000, class_weight="balanced"))
+
+    def fit(self, contents: list, labels: list) -> "TfidfClassifier":
+        targets = self.binarizer.fit_transform([[label.strip() for label in str(item).split(";") if label.strip() in ACCIDENT_TYPES] for item in labels])
+        self.model.fit(self.vectorizer.fit_transform(contents), targets)
+        return self
+
+    def predict(self, content: str) -> tuple:
+        """(labels, 확신도). 확신도는 선택/비선택 경계에 가장 가까운 label의 확률 기준."""
+        probabilities = self.model.predict_proba(self.vectorizer.transform([content]))[0]
+        chosen = [label for label, p in zip(self.binarizer.classes_, probabilities) if p >= 0.5]
+        if not chosen:
+            return None, 0.0
+        confidence = min(max(p, 1 - p) for p in probabilities)
+        return ";".join(chosen), float(confidence)
+
+
+class PreClassifier:
+    """invoke_chain 앞단의 로컬 분류기. 확신도가 threshold 이상인 row만 라벨링하고 나머지는 LLM으로 보냄."""
+
+    def __init__(self, threshold: float = 0.9, model: TfidfClassifier = None):
+        self.threshold = threshold
+        self.keywords = KeywordMatcher()
+        self.model = model
+        self.stats = {"checked": 0, "keyword": 0, "model": 0}
+
+    def predict(self, input_content: str) -> tuple:
+        """(labels, {"source": ..., "confidence": ...}) 또는 확신이 없으면 (None, None)."""
+        self.stats["checked"] += 1
+        labels, confidence = self.keywords.predict(hazard_text(input_content))
+        if labels is not None and confidence >= self.threshold:
+            self.stats["keyword"] += 1
+            return labels, {"source": "keyword", "confidence": round(confidence, 3)}
+        if self.model is not None:
+            labels, confidence = self.model.predict(input_content)
+            if labels is not None and confidence >= self.threshold:
+                self.stats["model"] += 1
+                return labels, {"source": "model", "confidence": round(confidence, 3)}
+        return None, None
+
+    def save(self, path: str) -> None:
+        with open(path, "wb") as f:
+            pickle.dump(self.model, f)
+
+    def load(self, path: str) -> "PreClassifier":
+        with open(path, "rb") as f:
+            self.model = pickle.load(f)
+        return self
+
+
+__all__ = ["ACCIDENT_TYPES", "KeywordMatcher", "PreClassifier", "TfidfClassifier"]
@@ -1,146 +1,951 @@
+from __future__ import annotations
+
+import asyncio
+import json
 import logging
 import os
-import pickle
+import shutil
+import signal
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
 from datetime import datetime
+from typing import TYPE_CHECKING
 
-import pandas as pd
 from dotenv import load_dotenv
 from fire import Fire
-from tqdm import tqdm
 
-from chains import invoke_chain
+from chains import (
+    CLASSIFIER_MODEL,
+    EVALUATOR_MODEL,
+    NEIGHBOR_INDEX,
+    NEIGHBOR_MODES,
+    POLICY_OPTIONS,
+    MinHashIndex,
+    PreClassifier,
+    RetryPolicy,
+    VOTE_THRESHOLD,
+    VOTES,
+    TfidfClassifier,
+    ainvoke_chain,
+    batch_workflow_v3,
+    cheapest_config,
+    config_report,
+    evaluate_configs,
+    evaluation_configs,
+    invoke_chain,
+    label_matrix,
+    packed_workflow_v3,
+)
+from models import RunReport, llm_timeout, metrics, resilience, response_cache, scheduler
+from utils import (
+    KEY_COLUMNS,
+    LEASE_TTL,
+    CheckpointStore,
+    ChunkWriter,
+    CompressedRotatingFileHandler,
+    Heartbeat,
+    JsonFormatter,
+    LeaseTable,
+    LogPipeline,
+    MicroBatcher,
+    ServiceServer,
+    apply_labels,
+    format_input_contents,
+    group_rows,
+    iter_chunks,
+    lease_owner,
+    normalize_content,
+    row_keys,
+    shard_index,
+    shard_namespace,
+    shard_run_id,
+    transcripts,
+)
+
+# pandas/tqdm과 LLM SDK는 실제로 쓰는 시점에 import (--help, 체크포인트만으로 끝나는 재실행의 시작 시간 단축)
+if TYPE_CHECKING:
+    import pandas as pd
 
 load_dotenv()
-tqdm.pandas(desc="Processing")
 
 TEMP_DIR = os.getenv("TEMP_DIR", '.tmp')
+INPUT_DIR = os.getenv("INPUT_DIR", 'data')
+OUTPUT_DIR = os.getenv("OUTPUT_DIR", 'output')
+LOG_DIR = os.getenv("LOG_DIR", 'logs')
+# 파일 로그와 transcript 로그는 LOG_MAX_MB마다 rotate하고 LOG_COMPRESS(gzip, zstd, none)로 압축
+LOG_MAX_BYTES = int(float(os.getenv("LOG_MAX_MB", 64)) * (1 << 20))
+LOG_COMPRESS = os.getenv("LOG_COMPRESS", "gzip")
+DEFAULT_INPUT = os.path.join(INPUT_DIR, "합본_전체_사고분류결과_v5.xlsx")
+
+
+USAGE_FIELDS = ("prompt_tokens", "cached_tokens", "completion_tokens")
+REPAIR_FIELDS = ("label_repairs", "verdict_repairs", "dropped_labels", "retries_avoided")
+CALL_FIELDS = ("passed", "calls", "llm_latency", "cost")
+POLICY_FIELDS = ("early_exit", "saved_calls", "saved_tokens", "history_saved_tokens", "extra_calls", "extra_tokens")
+VOTE_FIELDS = ("agreement", "unanimous", "evaluations")
+
+
+def broadcast(keys: pd.Series, positions: list, result: str, info: dict, elapsed: float) -> list:
+    """그룹의 분류 결과를 그룹에 속한 모든 row의 체크포인트 레코드로 펼침. token usage, 복구/호출 지표는 그룹의 첫 row에만 기록."""
+    ts = time.time()
+    records = [
+        {"key": keys.iloc[pos], "label": result, "attempts": info.get("attempts"), "elapsed": round(elapsed, 3), "ts": ts}
+        for pos in positions
+    ]
+    if records:
+        records[0].update((name, info[name]) for name in USAGE_FIELDS + REPAIR_FIELDS + CALL_FIELDS + POLICY_FIELDS + VOTE_FIELDS if name in info)
+    return records
+
+
+def usage_summary(records) -> dict:
+    """체크포인트 레코드의 token usage/복구 지표 합계와 LLM으로 분류한 고유 content 수."""
+    summary = dict.fromkeys(USAGE_FIELDS + REPAIR_FIELDS, 0)
+    summary["groups"] = 0
+    for record in records:
+        if "prompt_tokens" not in record:
+            continue
+        summary["groups"] += 1
+        for name in USAGE_FIELDS + REPAIR_FIELDS:
+            summary[name] += record.get(name) or 0
+    return summary
+
+
+def policy_summary(records) -> dict:
+    """체크포인트 레코드의 조기 종료 사유별 건수와 정책으로 절감한/추가로 쓴 호출·token 합계."""
+    summary = dict.fromkeys(POLICY_FIELDS[1:], 0)
+    summary["early_exit"] = {}
+    for record in records:
+        if record.get("early_exit"):
+            summary["early_exit"][record["early_exit"]] = summary["early_exit"].get(record["early_exit"], 0) + 1
+        for name in POLICY_FIELDS[1:]:
+            summary[name] += record.get(name) or 0
+    return summary
+
+
+def vote_summary(records) -> dict:
+    """self-consistency 투표 지표: 만장일치 건수, 평균 합의율, 평가 호출 수, row(고유 content)당 평균 LLM 호출 수."""
+    summary = {"groups": 0, "unanimous": 0, "agreement": 0.0, "evaluations": 0, "calls": 0}
+    for record in records:
+        if "agreement" not in record:
+            continue
+        summary["groups"] += 1
+        summary["unanimous"] += bool(record.get("unanimous"))
+        summary["agreement"] += record["agreement"]
+        summary["evaluations"] += record.get("evaluations") or 0
+        summary["calls"] += record.get("calls") or 0
+    return summary
+
+
+def preclassify(preclassifier: PreClassifier, keys: pd.Series, groups: dict, report: RunReport) -> tuple:
+    """로컬 분류기가 확신하는 그룹은 바로 라벨링. (LLM으로 보낼 나머지 groups, 체크포인트 레코드)를 반환."""
+    remaining, records = {}, []
+    for content, positions in groups.items():
+        result, info = preclassifier.predict(content)
+        if result is None:
+            remaining[content] = positions
+        else:
+            group_records = broadcast(keys, positions, result, dict(info, attempts=0), 0.0)
+            report.add(group_records)
+            records.extend(group_records)
+    return remaining, records
+
+
+def match_neighbors(index: MinHashIndex, threshold: float, mode: str, keys: pd.Series, groups: dict, report: RunReport) -> tuple:
+    """
+    유사 row의 승인된 라벨 찾기: reuse면 바로 라벨링, evaluate면 분류 호출 없이 평가자에 넘길 seed로 사용.
+    (LLM으로 보낼 나머지 groups, 체크포인트 레코드, {content: seed 라벨})을 반환.
+    """
+    remaining, records, seeds = {}, [], {}
+    for content, positions in groups.items():
+        result, info = index.match(content, threshold)
+        if result is None or mode == "evaluate":
+            remaining[content] = positions
+            if result is not None:
+                seeds[content] = result
+        else:
+            group_records = broadcast(keys, positions, result, dict(info, attempts=0), 0.0)
+            report.add(group_records)
+            records.extend(group_records)
+    return remaining, records, seeds
+
+
+def load_neighbors(logger, **kwargs) -> MinHashIndex | None:
+    """--neighbors <유사도 threshold>로 활성화. --neighbors_index 디렉터리(기본 NEIGHBOR_INDEX)의 인덱스를 불러오고,
+    --neighbors_train에 neo_사고분류가 있는 파일을 주면 그 결과를 인덱스에 추가. 실행 중 PASS한 결과도 chunk마다 추가됨."""
+    if "neighbors" not in kwargs:
+        return None
+    index = MinHashIndex(kwargs.get("neighbors_index", NEIGHBOR_INDEX))
+    if "neighbors_train" in kwargs:
+        added = 0
+        for df in iter_chunks(kwargs["neighbors_train"], kwargs.get("chunk", 5000)):
+            df = df[df['neo_사고분류'].notna() & (df['neo_사고분류'] != '')]
+            added += index.add(list(format_input_contents(df)), list(df['neo_사고분류']))
+        index.flush()
+        logger.info(f"유사 라벨 인덱스 추가: {added} rows (전체 {len(index)} rows)")
+    return index
+
+
+def load_preclassifier(logger, **kwargs) -> PreClassifier | None:
+    """--preclassify <threshold>로 활성화. --preclassify_model 경로가 있으면 TF-IDF 모델을 불러오고,
+    --preclassify_train에 neo_사고분류가 있는 파일을 주면 학습 후 --preclassify_model 경로에 저장."""
+    if "preclassify" not in kwargs:
+        return None
+    preclassifier = PreClassifier(threshold=float(kwargs["preclassify"]))
+    model_path = kwargs.get("preclassify_model")
+    if "preclassify_train" in kwargs:
+        contents, targets = [], []
+        for df in iter_chunks(kwargs["preclassify_train"], kwargs.get("chunk", 5000)):
+            df = df[df['neo_사고분류'].notna() & (df['neo_사고분류'] != '')]
+            contents.extend(format_input_contents(df))
+            targets.extend(df['neo_사고분류'])
+        preclassifier.model = TfidfClassifier().fit(contents, targets)
+        logger.info(f"사전 분류 모델 학습 완료: {len(contents)} rows")
+        if model_path:
+            preclassifier.save(model_path)
+    elif model_path and os.path.exists(model_path):
+        preclassifier.load(model_path)
+    return preclassifier
+
+
+def configure_resilience(roles: dict, **kwargs) -> None:
+    """
+    역할별 deadline(--classifier_timeout/--evaluator_timeout, 기본 .env의 LLM_TIMEOUT초, 재시도 포함), --llm_retries,
+    --hedge <quantile>(예: 0.95, 관측 latency가 이 quantile을 넘으면 같은 요청을 하나 더 보냄),
+    --failover <model spec>(circuit이 열리거나 재시도를 모두 실패하면 보낼 보조 backend). 두 역할이 같은 모델이면 긴 deadline을 사용.
+    evaluate처럼 역할마다 모델이 여러 개면 roles의 값으로 model spec 리스트를 넘김.
+    """
+    deadlines, default = {}, llm_timeout()
+    for role, specs in roles.items():
+        timeout = float(kwargs.get(f"{role}_timeout", default))
+        for spec in [specs] if isinstance(specs, str) else specs:
+            deadlines[spec] = max(timeout, deadlines.get(spec, 0.0))
+    failover = kwargs.get("failover")
+    resilience.configure(
+        deadlines=deadlines,
+        retries=int(kwargs.get("llm_retries", 3)),
+        hedge=float(kwargs["hedge"]) if "hedge" in kwargs else None,
+        failover={spec: failover for spec in deadlines if spec != failover} if failover else {},
+    )
+    resilience.reset()
+
+
+def run_sync(keys: pd.Series, groups: dict, max_retries: int, buffer_size: int, writer, logger, roles: dict, report: RunReport, options: dict = None, seeds: dict = None, accepted: dict = None, progress: bool = True) -> dict:
+    """고유 content를 하나씩 처리하고 체크포인트에 flush. {row key: label}을 반환. accepted가 주어지면 PASS한 {content: label}을 모음."""
+    from tqdm import tqdm
+
+    labels, buffer = {}, []
+    for content, positions in tqdm(groups.items(), total=len(groups), desc="Processing with buffer", disable=not progress):
+        started = time.perf_counter()
+        result, info = invoke_chain(content, max_retries=max_retries, logger=logger, return_obj=True, **roles, **(options or {}), seed=(seeds or {}).get(content))
+        records = broadcast(keys, positions, result, info, time.perf_counter() - started)
+        report.add(records)
+        if accepted is not None and info.get("passed"):
+            accepted[content] = result
+        labels.update((record["key"], record["label"]) for record in records)
+        buffer.extend(records)
+        if len(buffer) >= buffer_size:
+            writer.append(buffer)
+            buffer = []
+    writer.append(buffer)
+    return labels
+
+
+async def run_async(keys: pd.Series, groups: dict, max_retries: int, buffer_size: int, concurrency: int, writer, logger, roles: dict, report: RunReport, options: dict = None, seeds: dict = None, accepted: dict = None, progress: bool = True) -> dict:
+    """고유 content를 최대 concurrency개씩 동시에 처리하고, 결과는 원래 row 순서대로 체크포인트에 flush. {row key: label}을 반환."""
+    from tqdm import tqdm
 
+    semaphore = asyncio.BoundedSemaphore(concurrency)
+    contents = list(groups)
 
-def format_input_content(row: pd.DataFrame) -> str:
-    return "\n".join([
-        f"- 공정: {row['공정']}",
-        f"- 세부공정: {row['세부공정'] if pd.notna(row['세부공정']) else '누락됨'}",
-        f"- 설비: {row['설비'] if pd.notna(row['설비']) else '없음'}",
-        f"- 물질: {row['물질'] if pd.notna(row['물질']) else '없음'}",
-        f"- 유해위험요인: {row['유해위험요인']}",
-        f"- 감소대책: {row['감소대책']}"
-    ])
+    async def worker(j: int) -> tuple:
+        async with semaphore:
+            started = time.perf_counter()
+            result, info = await ainvoke_chain(contents[j], max_retries=max_retries, logger=logger, return_obj=True, **roles, **(options or {}), seed=(seeds or {}).get(contents[j]))
+        return j, (result, info, time.perf_counter() - started)
 
+    tasks = [asyncio.create_task(worker(j)) for j in range(len(contents))]
+    results, cursor, labels, buffer = {}, 0, {}, []
+    with tqdm(total=len(contents), desc=f"Processing async (x{concurrency})", disable=not progress) as pbar:
+        for future in asyncio.as_completed(tasks):
+            j, result = await future
+            results[j] = result
+            pbar.update(1)
+            # 완료 순서와 무관하게, 앞선 그룹이 모두 끝난 구간까지만 순서대로 buffer에 적재
+            while cursor < len(contents) and cursor in results:
+                result, info, elapsed = results.pop(cursor)
+                records = broadcast(keys, groups[contents[cursor]], result, info, elapsed)
+                report.add(records)
+                if accepted is not None and info.get("passed"):
+                    accepted[contents[cursor]] = result
+                labels.update((record["key"], record["label"]) for record in records)
+                buffer.extend(records)
+                cursor += 1
+                if len(buffer) >= buffer_size:
+                    writer.append(buffer)
+                    buffer = []
+    writer.append(buffer)
+    return labels
 
-def listpkls() -> list:
-    return [f for f in os.listdir(TEMP_DIR) if f.endswith('.pkl')]
+
+def run_packed(keys: pd.Series, groups: dict, max_retries: int, buffer_size: int, pack_size: int, concurrency: int, writer, logger, roles: dict, stats: dict, report: RunReport, accepted: dict = None, progress: bool = True) -> dict:
+    """고유 content를 pack_size개씩 하나의 프롬프트로 묶어 처리 (묶음은 최대 concurrency개 동시 실행). {row key: label}을 반환."""
+    from tqdm import tqdm
+
+    contents = list(groups)
+    packs = [contents[j:j + pack_size] for j in range(0, len(contents), pack_size)]
+    pack_stats = [{} for _ in packs]
+
+    def worker(j: int) -> tuple:
+        started = time.perf_counter()
+        results = packed_workflow_v3(packs[j], max_retries=max_retries, logger=logger, stats=pack_stats[j], **roles)
+        return results, (time.perf_counter() - started) / len(packs[j])
+
+    results, cursor, labels, buffer = {}, 0, {}, []
+    with ThreadPoolExecutor(max_workers=concurrency) as executor, tqdm(total=len(contents), desc=f"Processing packed (K={pack_size})", disable=not progress) as pbar:
+        futures = {executor.submit(worker, j): j for j in range(len(packs))}
+        for future in as_completed(futures):
+            j = futures[future]
+            results[j] = future.result()
+            pbar.update(len(packs[j]))
+            # 완료 순서와 무관하게, 앞선 묶음이 모두 끝난 구간까지만 순서대로 buffer에 적재
+            while cursor < len(packs) and cursor in results:
+                pack_results, elapsed = results.pop(cursor)
+                for content, (result, info) in zip(packs[cursor], pack_results):
+                    records = broadcast(keys, groups[content], result, info, elapsed)
+                    report.add(records)
+                    if accepted is not None and info.get("passed"):
+                        accepted[content] = result
+                    labels.update((record["key"], record["label"]) for record in records)
+                    buffer.extend(records)
+                cursor += 1
+                if len(buffer) >= buffer_size:
+                    writer.append(buffer)
+                    buffer = []
+    writer.append(buffer)
+    for item in pack_stats:
+        for name, value in item.items():
+            stats[name] = stats.get(name, 0) + value
+    return labels
+
+
+def configure_run(logger, **kwargs) -> dict:
+    """main과 serve가 공유하는 실행 설정: 역할별 모델, 재시도/투표 옵션, 사전 분류기, 유사 라벨 인덱스, 동시성. classify_groups에 그대로 넘김."""
+    pack_size = kwargs.get("pack", 1)
+    # 역할별 모델: "gpt-4.1-mini", "openai:gpt-4.1", "ollama:exaone3.5:latest" 형식
+    preclassifier = load_preclassifier(logger, **kwargs)
+    roles = {"classifier": kwargs.get("classifier", CLASSIFIER_MODEL), "evaluator": kwargs.get("evaluator", EVALUATOR_MODEL)}
+    configure_resilience(roles, **kwargs)
+    if "transcript_sample" in kwargs:
+        transcripts.sample = float(kwargs["transcript_sample"])
+    # 조기 종료/재시도 정책: --early_exit agreement,cache,repeat --history N [--history_summary] --retry_budget <tokens>
+    policy = RetryPolicy.from_options(**kwargs)
+    # --workflow vote: self-consistency 투표 (--votes 샘플 수, --vote_threshold 라벨 채택 득표율)
+    workflow = kwargs.get("workflow", "loop")
+    if workflow not in ("loop", "vote"):
+        raise ValueError(f"unknown workflow: {workflow} (choose from loop, vote)")
+    # 정책 옵션은 loop workflow에만 적용되므로 vote와 같이 주면 무시하지 않고 오류
+    policy_options = [f"--{name}" for name in POLICY_OPTIONS if name in kwargs]
+    if policy_options and workflow == "vote":
+        raise ValueError(f"{', '.join(policy_options)} only apply to --workflow loop (vote does not use the retry policy)")
+    # --pack은 묶음 프롬프트 전용 loop만 지원 (투표와 단일 row 정책은 묶음 경로에 없음)
+    if pack_size > 1 and workflow == "vote":
+        raise ValueError("--pack does not support --workflow vote (use --pack 1)")
+    if pack_size > 1 and policy_options:
+        raise ValueError(f"--pack does not support {', '.join(policy_options)} (use --pack 1)")
+    chain_options = {"policy": policy}
+    if workflow == "vote":
+        chain_options.update(votes=int(kwargs.get("votes", VOTES)), vote_threshold=float(kwargs.get("vote_threshold", VOTE_THRESHOLD)))
+    # 유사 라벨 재사용: --neighbors <threshold> --neighbors_mode reuse|evaluate (evaluate는 loop workflow의 단일 호출만 지원)
+    neighbors = load_neighbors(logger, **kwargs)
+    neighbor_mode = kwargs.get("neighbors_mode", "evaluate")
+    if neighbors is not None:
+        if neighbor_mode not in NEIGHBOR_MODES:
+            raise ValueError(f"unknown neighbors_mode: {neighbor_mode} (choose from {', '.join(NEIGHBOR_MODES)})")
+        if neighbor_mode == "evaluate" and (workflow == "vote" or pack_size > 1):
+            raise ValueError("neighbors_mode evaluate requires --workflow loop and --pack 1 (use --neighbors_mode reuse)")
+    return {
+        "max_retries": kwargs.get("trial", 5),
+        "buffer_size": kwargs.get("buffer", 50),
+        "concurrency": kwargs.get("concurrency", 1),
+        "pack_size": pack_size,
+        "roles": roles,
+        "policy": policy,
+        "workflow": workflow,
+        "chain_options": chain_options,
+        "preclassifier": preclassifier,
+        "neighbors": neighbors,
+        "neighbor_mode": neighbor_mode,
+        "neighbor_threshold": float(kwargs["neighbors"]) if neighbors is not None else None,
+        "pack_stats": {},
+        # serve는 상주 event loop에서 실행하고, 동시에 실행되는 묶음끼리 사전 분류기/유사 라벨 인덱스를 lock으로 공유
+        "run_coroutine": asyncio.run,
+        "lock": nullcontext(),
+        "progress": True,
+    }
+
+
+def classify_groups(setup: dict, keys: pd.Series, groups: dict, writer, logger, report: RunReport) -> dict:
+    """
+    고유 content 묶음(main은 chunk, serve는 micro-batch)을 사전 분류 → 유사 라벨 → LLM(pack/async/sync) 순서로 처리해서 체크포인트에 기록.
+    PASS한 결과는 유사 라벨 인덱스에 추가. {row key: label}을 반환.
+    """
+    labels = {}
+    preclassifier, neighbors, roles = setup["preclassifier"], setup["neighbors"], setup["roles"]
+    max_retries, buffer_size, concurrency, pack_size = setup["max_retries"], setup["buffer_size"], setup["concurrency"], setup["pack_size"]
+    chain_options, progress = setup["chain_options"], setup["progress"]
+
+    # 로컬 사전 분류기가 확신하는 row는 LLM 없이 라벨링
+    seeds, accepted = {}, None
+    with setup["lock"]:
+        if preclassifier is not None:
+            groups, records = preclassify(preclassifier, keys, groups, report)
+            writer.append(records)
+            labels.update((record["key"], record["label"]) for record in records)
+
+        # 유사 row의 승인된 라벨을 재사용하거나 평가자에 바로 넘김. 이번 묶음에서 PASS한 결과는 인덱스에 추가
+        if neighbors is not None:
+            groups, records, seeds = match_neighbors(neighbors, setup["neighbor_threshold"], setup["neighbor_mode"], keys, groups, report)
+            writer.append(records)
+            labels.update((record["key"], record["label"]) for record in records)
+            accepted = {}
+
+    if pack_size > 1:
+        labels.update(run_packed(keys, groups, max_retries, buffer_size, pack_size, concurrency, writer, logger, roles, setup["pack_stats"], report, accepted, progress))
+    elif concurrency > 1:
+        labels.update(setup["run_coroutine"](run_async(keys, groups, max_retries, buffer_size, concurrency, writer, logger, roles, report, chain_options, seeds, accepted, progress)))
+    else:
+        labels.update(run_sync(keys, groups, max_retries, buffer_size, writer, logger, roles, report, chain_options, seeds, accepted, progress))
+    if accepted:
+        with setup["lock"]:
+            neighbors.add(list(accepted), list(accepted.values()))
+            neighbors.flush()
+    return labels
 
 
 def main(logger=None, **kwargs):
     if logger is None:
         logger = logging.getLogger(__name__)
         logger.setLevel(logging.INFO)
-    # Init time
-    initial_time = datetime.now()
+    input_path = kwargs.get("input", DEFAULT_INPUT)
+    start, end = kwargs.get("start", 0), kwargs.get("end", None)
+    chunk_size = kwargs.get("chunk", 5000)
+    # 실행 설정(사전 분류기 학습, 유사 라벨 인덱스 로드, 모델 client)은 추론할 row가 처음 나올 때 만듦. 체크포인트만으로 끝나는 재실행은 생략
+    setup = None
 
-    # Load the DataFrame
-    df = pd.read_excel(r"data\합본_전체_사고분류결과_v5.xlsx")
-
-    # Range filtering
-    df = df[kwargs.get("start", 0):kwargs.get("end", len(df))]
-    
-    # 데이터프레임에서 'input_content' 열이 있는지 확인
+    # Load the DataFrame: xlsx/csv/parquet을 chunk 단위로 stream
     if "sample" in kwargs:
-        df = df.sample(kwargs.get("sample"), random_state=42)
-    
-    max_retries = kwargs.get("trial", 5)
-    buffer_size = kwargs.get("buffer", 50)
-
-    # 1. .tmp 폴더 생성
-    if not os.path.exists(TEMP_DIR):
-        os.makedirs(TEMP_DIR)
-
-    # 2. .tmp 폴더에 있는 pkl 파일 중 수정 시간이 initial_time 이전인 파일을 찾아서 df에 neo_사고분류 업데이트
-    pre_plks = [f for f in listpkls() 
-                if os.path.getmtime(os.path.join(TEMP_DIR, f)) < initial_time.timestamp()]
-    if pre_plks:
-        tmp_df = pd.DataFrame()
-        for plk in pre_plks:
-            with open(os.path.join(TEMP_DIR, plk), 'rb') as f:
-                df_part = pickle.load(f)
-                tmp_df = pd.concat([tmp_df, df_part], ignore_index=True)
-        # neo_사고분류가 있는 row는 df에 업데이트
-        if 'neo_사고분류' in tmp_df.columns:
-            for _, row in tmp_df.iterrows():
-                cond = (
-                    (df['공정'] == row['공정']) &
-                    (df['세부공정'] == row['세부공정']) &
-                    (df['설비'] == row['설비']) &
-                    (df['물질'] == row['물질']) &
-                    (df['유해위험요인'] == row['유해위험요인']) &
-                    (df['감소대책'] == row['감소대책'])
-                )
-                df.loc[cond, 'neo_사고분류'] = row['neo_사고분류']
-
-    # 3. mask 재설정: neo_사고분류가 없는 row만 inference
-    if 'neo_사고분류' in df.columns:
-        mask = df['neo_사고분류'].isna() | (df['neo_사고분류'] == '')
+        import pandas as pd
+
+        # sample은 전체 구간이 필요하므로 한 번에 읽어서 하나의 chunk로 처리
+        df = pd.concat(iter_chunks(input_path, chunk_size, start, end))
+        chunks = [df.sample(kwargs.get("sample"), random_state=42)]
     else:
-        mask = pd.Series([True] * len(df))
+        chunks = iter_chunks(input_path, chunk_size, start, end)
+
+    # 1. 체크포인트 저장소 (.tmp/default/ 아래 append-only JSONL segment + manifest). shard worker는 shard별 namespace 사용
+    store = CheckpointStore(TEMP_DIR, kwargs.get("namespace", "default"))
+    # shard worker(--shard i --shards N)는 자기 shard의 row만 처리하고 출력 파일 없이 체크포인트만 남김 (병합은 coordinator가 함)
+    sharded = "shard" in kwargs
+    store.compact()
+
+    # 2. 이전 실행에서 기록된 row key별 neo_사고분류
+    labels = store.labels()
+    if labels:
+        logger.info(f"체크포인트 복구: {len(labels)}개 row key")
 
-    buffer = []
-    for i, (_, row) in enumerate(tqdm(df.iterrows(), total=len(df), desc="Processing with buffer")):
-        if not mask.iloc[i]:
-            continue
-        result = invoke_chain(format_input_content(row), max_retries=max_retries, logger=logger)
-        # row_result = row.copy()
-        row_result = row.to_dict()
-        row_result['neo_사고분류'] = result
-        buffer.append(row_result)
-        if len(buffer) >= buffer_size:
-            buffer_df = pd.DataFrame(buffer)
-            with open(os.path.join(TEMP_DIR, '{}.pkl'.format(datetime.now().strftime("%Y%m%d_%H%M%S"))), 'wb') as f:
-                pickle.dump(buffer_df, f)
-            buffer = []
-    if buffer:
-        buffer_df = pd.DataFrame(buffer)
-        with open(os.path.join(TEMP_DIR, '{}.pkl'.format(datetime.now().strftime("%Y%m%d_%H%M%S"))), 'wb') as f:
-            pickle.dump(buffer_df, f)
-
-    # 4. .tmp의 모든 pkl 합쳐서 df에 neo_사고분류 업데이트 (중복 방지)
-    neo_df = pd.DataFrame()
-    for plk in listpkls():
-        with open(os.path.join(TEMP_DIR, plk), 'rb') as f:
-            plk_data = pickle.load(f)
-            neo_df = pd.concat([neo_df, plk_data], ignore_index=True)
-
-    # 5. 엑셀로 저장
     output_name = kwargs["output"] + "_" if "output" in kwargs else ""
     output_file = output_name + datetime.now().strftime("%Y%m%d_%H%M%S")
-    output_path = os.path.join("output", f"{output_file}.xlsx")
-    neo_df.to_excel(output_path, index=False)
-    logger.info(f"엑셀 파일 저장 완료: {output_path}")
+    output_path = os.path.join(OUTPUT_DIR, f"{output_file}.{kwargs.get('format', 'xlsx')}")
+    # 고유 content 단위 지표 JSONL (--metrics로 경로 지정)
+    metrics_name = f"{output_file}.shard-{kwargs['shard']}" if sharded else output_file
+    metrics_path = kwargs.get("metrics", os.path.join(OUTPUT_DIR, f"{metrics_name}.metrics.jsonl"))
+
+    n_unique = n_total = 0
+    with store.writer() as writer, (nullcontext() if sharded else ChunkWriter(output_path)) as output, RunReport(metrics_path) as report:
+        for df in chunks:
+            keys = row_keys(df)
+            if sharded:
+                in_shard = (shard_index(keys, kwargs["shards"]) == kwargs["shard"]).to_numpy()
+                df, keys = df[in_shard], keys[in_shard]
+            df = apply_labels(df, labels)
+
+            # 3. mask 재설정: neo_사고분류가 없는 row만 inference
+            mask = df['neo_사고분류'].isna() | (df['neo_사고분류'] == '')
+
+            # 동일한 입력 row는 한 번만 inference하고 결과를 그룹 전체에 적용
+            groups = group_rows(df, mask)
+            n_unique += len(groups)
+            n_total += sum(len(positions) for positions in groups.values())
+
+            # 사전 분류 → 유사 라벨 → LLM. batch 서브커맨드에서 호출한 경우(offline)는 inference 없이 체크포인트 결과만 출력
+            if groups and not kwargs.get("offline"):
+                if setup is None:
+                    setup = configure_run(logger, **kwargs)
+                labels.update(classify_groups(setup, keys, groups, writer, logger, report))
+
+            # 4. 체크포인트에 기록된 row만 neo_사고분류를 반영해서 출력 파일에 바로 추가
+            if output is not None:
+                done = keys.isin(list(labels)).to_numpy()
+                output.write(apply_labels(df[done].copy(), labels))
+
+    if n_total:
+        logger.info(f"중복 제거: 고유 {n_unique} / 전체 {n_total} rows ({n_unique / n_total:.1%})")
+
+    if setup is None:
+        logger.info("추론할 row 없음: 모델/사전 분류기 설정 생략")
+        setup = {"preclassifier": None, "neighbors": None, "pack_stats": {}, "policy": None, "workflow": None}
+    preclassifier, neighbors, pack_stats, policy = setup["preclassifier"], setup["neighbors"], setup["pack_stats"], setup["policy"]
+
+    if preclassifier is not None:
+        skipped = preclassifier.stats["keyword"] + preclassifier.stats["model"]
+        logger.info(f"로컬 사전 분류: 고유 {skipped} / {preclassifier.stats['checked']}건 라벨링 {preclassifier.stats}, LLM 호출 최소 {2 * skipped}회 절감")
 
-    # 6. 엑셀 저장 성공 시 .tmp 폴더 비우기
-    for plk in listpkls():
+    if neighbors is not None:
+        matched = neighbors.stats["matched"]
+        saved = matched if setup["neighbor_mode"] == "evaluate" else 2 * matched
+        logger.info(
+            f"유사 라벨 ({setup['neighbor_mode']}, threshold {kwargs['neighbors']}): 고유 {matched} / {neighbors.stats['checked']}건 일치 "
+            f"(라벨이 갈린 이웃 {neighbors.stats['conflicts']}건), LLM 호출 최소 {saved}회 절감, 인덱스 {len(neighbors)} rows (+{neighbors.stats['added']})"
+        )
+
+    if pack_stats.get("rows"):
+        saved = (pack_stats["single_tokens"] - pack_stats["packed_tokens"]) / pack_stats["rows"]
+        logger.info(f"묶음 프롬프트(K={setup['pack_size']}): row당 prompt token {saved:.0f}개 절감 (추정), 단일 호출 fallback {pack_stats['fallback_rows']} rows")
+
+    # 5. 출력 파일 저장 완료
+    if output is not None:
+        logger.info(f"출력 파일 저장 완료: {output_path} ({output.rows} rows)")
+    logger.info(f"LLM 응답 캐시 통계: {response_cache.stats()}")
+    if transcripts.stats()["rows"]:
+        logger.info(f"Transcript 로그 (샘플 {transcripts.sample:.1%}): {transcripts.stats()}")
+    usage = usage_summary(store.iter_records())
+    if usage["prompt_tokens"]:
+        logger.info(
+            f"Token usage: 고유 {usage['groups']}건, prompt {usage['prompt_tokens']} (provider cache 적중 {usage['cached_tokens']}, "
+            f"{usage['cached_tokens'] / usage['prompt_tokens']:.1%}), completion {usage['completion_tokens']}, "
+            f"건당 prompt {usage['prompt_tokens'] / usage['groups']:.0f} / cached {usage['cached_tokens'] / usage['groups']:.0f}"
+        )
+    if usage["groups"]:
+        logger.info(
+            f"응답 형식 복구: 라벨 {usage['label_repairs']}회 (허용되지 않은 라벨 {usage['dropped_labels']}개 제거), "
+            f"판정 {usage['verdict_repairs']}회, 재시도 {usage['retries_avoided']}회 절감"
+        )
+    savings = policy_summary(store.iter_records())
+    if savings["early_exit"] or savings["history_saved_tokens"]:
+        logger.info(
+            f"조기 종료 정책: {savings['early_exit']}, 호출 {savings['saved_calls']}회 / token {savings['saved_tokens']}개 절감 (추정), "
+            f"history window로 prompt token {savings['history_saved_tokens']}개 절감, agreement 샘플 {savings['extra_calls']}회 / token {savings['extra_tokens']}개 추가"
+        )
+    votes = vote_summary(store.iter_records())
+    if setup["workflow"] == "vote" and votes["groups"]:
+        logger.info(
+            f"Self-consistency 투표 (n={setup['chain_options']['votes']}): 만장일치 {votes['unanimous']} / {votes['groups']}건, "
+            f"평균 합의율 {votes['agreement'] / votes['groups']:.1%}, 평가 호출 {votes['evaluations']}회, "
+            f"row당 평균 LLM 호출 {votes['calls'] / votes['groups']:.2f}회"
+        )
+    if policy is not None and policy.budget is not None:
+        logger.info(f"재시도 token 예산: {policy.budget.stats()}")
+    for model, stats in scheduler.stats().items():
+        logger.info(f"Rate limit 대기 통계 [{model}]: {stats}")
+    calls = resilience.stats()
+    if calls["retries"] or calls["hedges"] or calls["deadlines"] or calls["failovers"]:
+        logger.info(
+            f"LLM 호출 복원력: 호출 {calls['calls']}회, 재시도 {calls['retries']}회, hedge {calls['hedges']}회 (먼저 응답 {calls['hedge_wins']}회), "
+            f"deadline 초과 {calls['deadlines']}회, failover {calls['failovers']}회, circuit {calls['breakers']}"
+        )
+
+    # 실행 요약: latency p50/p95/p99, 시도 횟수별 PASS 비율, 모델별 비용
+    summary = report.summary()
+    with open(os.path.splitext(metrics_path)[0] + ".summary.json", "w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+    logger.info(f"Row latency (초): {summary['latency']}, 시도 횟수별 누적 PASS 비율: {summary['pass_rate']}")
+    for model, stats in summary["models"].items():
+        logger.info(f"LLM 호출 통계 [{model}]: {stats}")
+    logger.info(f"총 비용 (추정): ${summary['cost']:.4f} — 지표 파일: {metrics_path}")
+
+    # 6. 출력 파일 저장 성공 시 체크포인트 비우기 (shard 체크포인트는 coordinator가 병합 후 삭제)
+    if not sharded:
+        store.clear()
+        logger.debug(f"체크포인트 삭제 완료: {store.path}")
+
+
+def batch(logger=None, **kwargs):
+    """미처리 row 전체를 OpenAI Batch API로 분류해서 체크포인트에 기록한 뒤, main과 같은 방식으로 출력 파일 생성."""
+    if logger is None:
+        logger = logging.getLogger(__name__)
+        logger.setLevel(logging.INFO)
+    input_path = kwargs.get("input", DEFAULT_INPUT)
+    start, end = kwargs.get("start", 0), kwargs.get("end", None)
+    chunk_size = kwargs.get("chunk", 5000)
+
+    store = CheckpointStore(TEMP_DIR)
+    labels = store.labels()
+
+    # 미처리 row를 content 기준으로 묶어서 batch 요청 id 부여 (row key만 보관)
+    group_ids, contents, members = {}, {}, {}
+    for df in iter_chunks(input_path, chunk_size, start, end):
+        keys = row_keys(df)
+        df = apply_labels(df, labels)
+        mask = df['neo_사고분류'].isna() | (df['neo_사고분류'] == '')
+        for content, positions in group_rows(df, mask).items():
+            group_id = group_ids.setdefault(normalize_content(content), f"row-{len(group_ids)}")
+            contents.setdefault(group_id, content)
+            members.setdefault(group_id, []).extend(keys.iloc[pos] for pos in positions)
+    logger.info(f"Batch 대상: 고유 {len(contents)}건 / 전체 {sum(len(m) for m in members.values())} rows")
+
+    if contents:
+        roles = {"classifier": kwargs.get("classifier", CLASSIFIER_MODEL), "evaluator": kwargs.get("evaluator", EVALUATOR_MODEL)}
+        results = batch_workflow_v3(contents, max_retries=kwargs.get("trial", 5), logger=logger, poll_interval=kwargs.get("poll", 60), **roles)
+        ts = time.time()
+        with store.writer() as writer:
+            writer.append([
+                {"key": key, "label": label, "attempts": info.get("attempts"), "elapsed": None, "ts": ts}
+                for group_id, (label, info) in results.items()
+                for key in members[group_id]
+            ])
+        logger.info(f"Batch 완료: {len(results)} / {len(contents)}건 분류")
+
+    main(logger=logger, offline=True, **kwargs)
+
+
+def worker(logger=None, **kwargs):
+    """
+    shard 모드의 worker: lease를 얻은 shard를 main으로 처리하고 완료 표시를 남김. 모든 shard가 끝날 때까지 반복하고,
+    다른 worker가 처리 중인 shard만 남으면 lease 만료(crash)에 대비해 대기.
+    TEMP_DIR을 공유하는 다른 머신에서도 python main.py worker --run_id <id> --shards N --input ... 으로 참여할 수 있음.
+    """
+    if logger is None:
+        logger = logging.getLogger(__name__)
+        logger.setLevel(logging.INFO)
+    run_id, shards = kwargs.pop("run_id"), int(kwargs.pop("shards"))
+    table = LeaseTable(TEMP_DIR, run_id, shards, ttl=float(kwargs.pop("lease_ttl", LEASE_TTL)))
+    owner = lease_owner()
+    while True:
+        shard_id = table.acquire(owner)
+        if shard_id is None:
+            if table.done():
+                return
+            time.sleep(table.ttl / 4)
+            continue
+        logger.info(f"Shard {shard_id + 1}/{shards} 처리 시작 ({owner})")
+        # 모델별 호출 통계는 프로세스 전역이므로 shard마다 비워서 shard 요약에 이전 shard 호출이 섞이지 않게 함
+        metrics.reset()
+        try:
+            with Heartbeat(table, shard_id, owner) as heartbeat:
+                main(logger=logger, shard=shard_id, shards=shards, namespace=shard_namespace(run_id, shard_id), **kwargs)
+        except BaseException:
+            table.release(shard_id, owner=owner)
+            raise
+        if heartbeat.lost:
+            # 처리 도중 heartbeat가 늦어 다른 worker가 가져간 경우: 기록한 체크포인트는 그 worker가 이어서 사용
+            logger.warning(f"Shard {shard_id + 1}/{shards}의 lease를 다른 worker가 가져갔습니다.")
+            continue
+        table.complete(shard_id, owner)
+
+
+def shard(logger=None, **kwargs):
+    """
+    row key 기준으로 나눈 shard(--shards, 기본 --workers)를 --workers개 worker 프로세스로 처리하고, 모두 끝나면
+    shard 체크포인트를 하나로 병합해서 main과 같은 방식으로 출력 파일 하나를 생성.
+    비정상 종료한 worker의 lease는 바로 반납하고 새 worker를 띄움 (최대 --max_restarts회).
+    같은 입력/구간/shard 수로 다시 실행하면 같은 run id로 끝난 shard는 건너뛰고 이어서 처리.
+    """
+    if logger is None:
+        logger = logging.getLogger(__name__)
+        logger.setLevel(logging.INFO)
+    workers = int(kwargs.pop("workers", os.cpu_count() or 1))
+    shards = int(kwargs.pop("shards", workers))
+    max_restarts = int(kwargs.pop("max_restarts", 3))
+    lease_ttl = float(kwargs.pop("lease_ttl", LEASE_TTL))
+    run_id = kwargs.pop("run_id", None) or shard_run_id(kwargs.get("input", DEFAULT_INPUT), shards, kwargs.get("start", 0), kwargs.get("end"))
+    table = LeaseTable(TEMP_DIR, run_id, shards, ttl=lease_ttl)
+    command = [sys.executable, os.path.abspath(__file__), "worker", "--run_id", run_id, "--shards", str(shards), "--lease_ttl", str(lease_ttl)]
+    for name, value in kwargs.items():
+        command += [f"--{name}", str(value)]
+    logger.info(f"Shard 실행 {run_id}: shard {shards}개, worker {workers}개")
+
+    running, restarts = [], 0
+    while True:
+        for process in [process for process in running if process.poll() is not None]:
+            running.remove(process)
+            if process.returncode == 0:
+                continue
+            released = table.release(pid=process.pid)
+            restarts += 1
+            logger.warning(f"Worker {process.pid} 비정상 종료 (exit {process.returncode}): shard {released} 반납 ({restarts}/{max_restarts})")
+            if restarts > max_restarts:
+                for other in running:
+                    other.terminate()
+                raise RuntimeError(f"worker가 {restarts}회 비정상 종료했습니다. 같은 명령으로 다시 실행하면 끝난 shard부터 이어서 처리합니다.")
+        if table.done():
+            break
+        while len(running) < workers:
+            running.append(subprocess.Popen(command))
+        time.sleep(1)
+    # 남은 worker는 다른 shard의 lease 만료를 기다리는 중이므로 종료
+    for process in running:
+        process.terminate()
+        process.wait()
+
+    # shard 체크포인트를 run id namespace 하나로 병합한 뒤 offline main으로 출력 파일 생성
+    merged = CheckpointStore(TEMP_DIR, run_id)
+    merged.clear()
+    with merged.writer() as writer:
+        for shard_id in range(shards):
+            writer.append(list(CheckpointStore(TEMP_DIR, shard_namespace(run_id, shard_id)).iter_records()))
+    logger.info(f"Shard 병합 완료: {writer.records}개 row 기록")
+    main(logger=logger, offline=True, namespace=run_id, **kwargs)
+    for shard_id in range(shards):
+        shutil.rmtree(os.path.join(TEMP_DIR, shard_namespace(run_id, shard_id)), ignore_errors=True)
+    shutil.rmtree(merged.path, ignore_errors=True)
+    table.clear()
+
+
+def parse_items(payload) -> tuple:
+    """POST /classify 본문: 작업 항목 1건 또는 {"items": [...]}. (항목 리스트, 단건 여부)를 반환. 필드가 빠지면 ValueError (400)."""
+    single = isinstance(payload, dict) and "items" not in payload
+    items = [payload] if single else payload.get("items") if isinstance(payload, dict) else payload
+    if not isinstance(items, list) or not items:
+        raise ValueError('body must be a work item or {"items": [...]}')
+    for item in items:
+        missing = [column for column in ("공정", "유해위험요인", "감소대책") if not isinstance(item, dict) or column not in item]
+        if missing:
+            raise ValueError(f"missing fields: {', '.join(missing)}")
+    return [{column: item.get(column) for column in KEY_COLUMNS} for item in items], single
+
+
+def serve(logger=None, **kwargs):
+    """
+    상주 HTTP 분류 서비스 (--host 127.0.0.1 --port 8000). 프로세스를 한 번만 띄워서 import/client 생성 비용 없이 항목 단위로 분류.
+    - POST /classify: 작업 항목(공정, 세부공정, 설비, 물질, 유해위험요인, 감소대책) 1건 또는 {"items": [...]} → row key와 neo_사고분류
+    - GET /health, GET /metrics: 대기열/묶음 통계, row latency, 응답 캐시/복원력/rate limit 통계
+    동시에 들어온 요청은 --batch_wait초 동안 최대 --batch개까지 묶어 main의 chunk와 같은 경로(사전 분류, 유사 라벨, --pack/--concurrency)로 처리.
+    결과는 --namespace(기본 service) 체크포인트에 기록되어 같은 항목은 LLM 없이 바로 응답하고, 재시작해도 유지됨.
+    대기열(--queue)이 가득 차면 503 + Retry-After, --request_timeout초 안에 끝나지 않으면 504.
+    """
+    if logger is None:
+        logger = logging.getLogger(__name__)
+        logger.setLevel(logging.INFO)
+    request_timeout = float(kwargs.get("request_timeout", 300))
+    setup = configure_run(logger, **{"concurrency": 8, **kwargs})
+    setup["progress"] = False
+    setup["lock"] = threading.Lock()
+    # 묶음마다 asyncio.run을 새로 하지 않고 상주 event loop 하나에서 실행 (keep-alive 연결 재사용)
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="service-loop", daemon=True).start()
+    setup["run_coroutine"] = lambda coroutine: asyncio.run_coroutine_threadsafe(coroutine, loop).result()
+
+    store = CheckpointStore(TEMP_DIR, kwargs.get("namespace", "service"))
+    store.compact()
+    labels = store.labels()
+    if labels:
+        logger.info(f"체크포인트 복구: {len(labels)}개 row key")
+    metrics_path = kwargs.get("metrics", os.path.join(OUTPUT_DIR, f"service_{datetime.now().strftime('%Y%m%d_%H%M%S')}.metrics.jsonl"))
+
+    with store.writer() as writer, RunReport(metrics_path) as report:
+        import pandas as pd
+
+        def dispatch(items: list) -> list:
+            df = pd.DataFrame(items, columns=KEY_COLUMNS)
+            keys = row_keys(df)
+            # 체크포인트에 있는 항목은 바로 응답 (main의 재실행과 같은 의미)
+            known = [labels.get(key) for key in keys]
+            mask = pd.Series([not label for label in known], index=df.index)
+            labels.update(classify_groups(setup, keys, group_rows(df, mask), writer, logger, report))
+            return [{"key": key, "label": labels.get(key), "checkpoint": bool(label)} for key, label in zip(keys, known)]
+
+        batcher = MicroBatcher(
+            dispatch,
+            max_batch=int(kwargs.get("batch", 32)),
+            max_wait=float(kwargs.get("batch_wait", 0.05)),
+            max_queue=int(kwargs.get("queue", 1024)),
+            inflight=int(kwargs.get("inflight", 2)),
+        )
+
+        def classify(payload) -> tuple:
+            items, single = parse_items(payload)
+            # row key 계산과 체크포인트 확인도 묶음 단위로 (요청마다 pandas 객체를 만들면 요청 스레드끼리 GIL을 두고 경쟁)
+            futures = [batcher.submit(item) for item in items]
+            try:
+                results = [future.result(timeout=request_timeout) for future in futures]
+            except TimeoutError:
+                raise TimeoutError(f"not classified within {request_timeout:.0f}s") from None
+            return 200, results[0] if single else {"results": results}
+
+        def health(_) -> tuple:
+            stats = batcher.snapshot()
+            return 200, {"status": "ok", "queued": stats["queued"], "running": stats["running"], "checkpoint": len(labels)}
+
+        def service_metrics(_) -> tuple:
+            return 200, {
+                "batcher": batcher.snapshot(),
+                "rows": report.summary(),
+                "cache": response_cache.stats(),
+                "resilience": resilience.stats(),
+                "rate_limits": scheduler.stats(),
+            }
+
+        server = ServiceServer(
+            {("POST", "/classify"): classify, ("GET", "/health"): health, ("GET", "/metrics"): service_metrics},
+            logger, host=kwargs.get("host", "127.0.0.1"), port=int(kwargs.get("port", 8000)),
+        )
+        # SIGTERM(컨테이너 종료)도 Ctrl+C와 같이 대기 중인 요청을 처리하고 종료
+        signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown).start())
+        logger.info(f"분류 서비스 시작: {server.url} (묶음 최대 {batcher.max_batch}건 / {batcher.max_wait}초, 대기열 {batcher.queue.maxsize})")
         try:
-            os.remove(os.path.join('.tmp', plk))
-            logger.debug(f".tmp 파일 삭제 성공: {plk}")
-        except Exception as e:
-            logger.warning(f".tmp 파일 삭제 실패: {plk}, {e}")
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            # 새 요청을 막고 대기 중인 요청까지 처리한 뒤 체크포인트/지표 파일을 닫음
+            server.shutdown()
+            batcher.close()
+            loop.call_soon_threadsafe(loop.stop)
+            logger.info(f"분류 서비스 종료: {batcher.snapshot()}")
+
+
+def option_list(value, default: str) -> list:
+    """콤마로 구분한 옵션 값 (Fire는 "a,b"를 tuple로 넘김). 없으면 [default]."""
+    if value is None:
+        return [default]
+    if isinstance(value, (tuple, list)):
+        return [str(item) for item in value]
+    return [item.strip() for item in str(value).split(",") if item.strip()]
+
+
+def evaluate(logger=None, **kwargs):
+    """
+    정답 라벨(--label_column, 기본 사고분류)이 있는 표본으로 (프롬프트 버전 × workflow × 분류 모델 × 평가 모델) 설정을 비교.
+    --prompts structured,v3 --workflows loop,vote --classifiers gpt-4.1-mini,gpt-4.1-nano --evaluators gpt-4.1 (기본은 run의 기본 설정 하나)
+    모든 설정을 하나의 event loop에서 최대 --concurrency개(기본 8)씩 동시에 실행하고 응답 캐시를 공유 (캐시 적중분은 설정별 단독 비용에 추정치로 포함).
+    --sample N(기본 200) row의 유형별 precision/recall/F1, exact match, Hamming loss와 설정별 비용/latency를 output/evaluation_<시각>.json에,
+    row별 정답/예측은 .predictions.<--format>에 저장. --target 0.8이면 --metric(기본 micro_f1)이 target 이상인 설정 중 가장 싼 설정을 고름.
+    체크포인트는 읽거나 쓰지 않음.
+    """
+    import numpy as np
+    import pandas as pd
+
+    if logger is None:
+        logger = logging.getLogger(__name__)
+        logger.setLevel(logging.INFO)
+    input_path = kwargs.get("input", DEFAULT_INPUT)
+    label_column = kwargs.get("label_column", "사고분류")
+    df = pd.concat(iter_chunks(input_path, kwargs.get("chunk", 5000), kwargs.get("start", 0), kwargs.get("end", None)), ignore_index=True)
+    if label_column not in df.columns:
+        raise ValueError(f"label column not found: {label_column}")
+
+    # 정답이 허용된 유형으로 파싱되는 row에서 표본 추출
+    truth = label_matrix(df[label_column].tolist())
+    labeled = np.flatnonzero(truth.any(axis=1))
+    if not len(labeled):
+        raise ValueError(f"no labeled rows in {input_path} ({label_column})")
+    sample = int(kwargs.get("sample", 200))
+    if len(labeled) > sample:
+        labeled = np.sort(np.random.default_rng(int(kwargs.get("seed", 42))).choice(labeled, sample, replace=False))
+    df, truth = df.iloc[labeled].reset_index(drop=True), truth[labeled]
+
+    # 동일한 입력 row는 설정마다 한 번만 분류하고 결과를 row로 펼쳐서 채점
+    groups = group_rows(df, np.ones(len(df), dtype=bool))
+    contents = list(groups)
+    content_index = np.empty(len(df), dtype=int)
+    for j, positions in enumerate(groups.values()):
+        content_index[positions] = j
+
+    configs = evaluation_configs(
+        option_list(kwargs.get("prompts"), "structured"),
+        option_list(kwargs.get("workflows"), "loop"),
+        option_list(kwargs.get("classifiers"), CLASSIFIER_MODEL),
+        option_list(kwargs.get("evaluators"), EVALUATOR_MODEL),
+        votes=int(kwargs.get("votes", VOTES)),
+        vote_threshold=float(kwargs.get("vote_threshold", VOTE_THRESHOLD)),
+        policy_options=kwargs,
+    )
+    configure_resilience({
+        "classifier": sorted({config["classifier"] for config in configs}),
+        "evaluator": sorted({config["evaluator"] for config in configs}),
+    }, **kwargs)
+    if "transcript_sample" in kwargs:
+        transcripts.sample = float(kwargs["transcript_sample"])
+    concurrency = int(kwargs.get("concurrency", 8))
+    logger.info(f"평가 실행: 설정 {len(configs)}개 × 고유 {len(contents)}건 (표본 {len(df)} rows, 정답 컬럼 {label_column}, 동시 {concurrency})")
+
+    started = time.perf_counter()
+    results = asyncio.run(evaluate_configs(contents, configs, kwargs.get("trial", 5), logger, concurrency=concurrency))
+    elapsed = time.perf_counter() - started
+    reports = [config_report(config, config_results, truth, content_index) for config, config_results in zip(configs, results)]
+    metric, target = kwargs.get("metric", "micro_f1"), float(kwargs.get("target", 0.0))
+    selected = cheapest_config(reports, metric, target)
+
+    for report in sorted(reports, key=lambda report: -report["metrics"][metric]):
+        scores, latency = report["metrics"], report["latency"]
+        logger.info(
+            f"[{report['name']}] micro-F1 {scores['micro_f1']:.3f}, macro-F1 {scores['macro_f1']:.3f}, exact match {scores['exact_match']:.1%}, "
+            f"Hamming loss {scores['hamming_loss']:.4f} | 단독 비용 ${report['standalone_cost']:.4f} (1k건당 ${report['cost_per_1k']:.2f}), "
+            f"호출 {report['calls']}회 (캐시 적중 {report['cache_hits']}), latency p50 {latency['p50']}s / p95 {latency['p95']}s, "
+            f"PASS {report['pass_rate']:.1%}, 오류 {report['errors']}"
+        )
+    if selected is not None:
+        logger.info(f"{metric} ≥ {target} 중 가장 싼 설정: {selected['name']} ({metric} {selected['metrics'][metric]:.3f}, 1k건당 ${selected['cost_per_1k']:.2f})")
+    else:
+        logger.info(f"{metric} ≥ {target}을 만족하는 설정이 없습니다.")
+
+    output_name = kwargs["output"] + "_" if "output" in kwargs else ""
+    output_path = os.path.join(OUTPUT_DIR, f"{output_name}evaluation_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    with open(f"{output_path}.json", "w", encoding="utf-8") as f:
+        json.dump({
+            "input": input_path, "label_column": label_column, "rows": len(df), "contents": len(contents), "elapsed": round(elapsed, 3),
+            "metric": metric, "target": target, "selected": selected["name"] if selected is not None else None,
+            "cache": response_cache.stats(), "configs": reports,
+        }, f, ensure_ascii=False, indent=2)
+    predictions = df[[*KEY_COLUMNS, label_column]].copy()
+    for config, config_results in zip(configs, results):
+        predictions[config["name"]] = [config_results[j][0] for j in content_index]
+    with ChunkWriter(f"{output_path}.predictions.{kwargs.get('format', 'xlsx')}") as writer:
+        writer.write(predictions)
+    logger.info(f"평가 결과 저장 완료: {output_path}.json ({elapsed:.1f}초, LLM 응답 캐시 {response_cache.stats()})")
 
 
 if __name__ == "__main__":
     logger = logging.getLogger(__name__)
     logger.setLevel(logging.DEBUG)
-    # 파일 핸들러 (DEBUG 이상 기록)
-    file_handler = logging.FileHandler(os.path.join('logs', '{}.log'.format(datetime.now().strftime('%Y%m%d'))), encoding="utf-8")
+    os.makedirs(LOG_DIR, exist_ok=True)
+    # shard worker는 프로세스마다 다른 파일에 기록 (여러 프로세스가 같은 파일을 rotate하지 않도록)
+    log_name = datetime.now().strftime('%Y%m%d') + (f".worker-{os.getpid()}" if sys.argv[1:2] == ["worker"] else "")
+    # 파일 핸들러 (DEBUG 이상, 한 줄에 JSON 하나, 크기 단위 rotate + 압축)
+    file_handler = CompressedRotatingFileHandler(os.path.join(LOG_DIR, f"{log_name}.jsonl"), max_bytes=LOG_MAX_BYTES, backup_count=int(os.getenv("LOG_BACKUPS", 20)), compress=LOG_COMPRESS)
     file_handler.setLevel(logging.DEBUG)
-    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-    file_handler.setFormatter(formatter)
-    logger.addHandler(file_handler)
+    file_handler.setFormatter(JsonFormatter())
     # 콘솔 핸들러 (INFO 이상만 출력)
     console_handler = logging.StreamHandler()
     console_handler.setLevel(logging.INFO)
-    console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
+    console_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+    # 포맷팅과 파일 I/O는 background 스레드에서 (호출 스레드는 record를 queue에 넣기만 함)
+    logs = LogPipeline(logger, [file_handler, console_handler])
     # 루트 로거 핸들러 제거 (중복 방지)
     logging.getLogger().handlers.clear()
+    # 샘플링한 row의 프롬프트/응답 전문 (TRANSCRIPT_SAMPLE 비율, --transcript_sample로 덮어씀)
+    transcripts.open(os.path.join(LOG_DIR, f"{log_name}.transcripts.jsonl"), sample=float(os.getenv("TRANSCRIPT_SAMPLE", 0.05)), max_bytes=LOG_MAX_BYTES, compress=LOG_COMPRESS)
     
-    # Main Entry Point
-    Fire(lambda **kwargs: main(logger=logger, **kwargs))
\ No newline at end of file
+    # Main Entry Point: 서브커맨드 없이 호출하면 기존과 같이 run (--help는 서브커맨드 목록)
+    commands = {
+        "run": lambda **kwargs: main(logger=logger, **kwargs),
+        "batch": lambda **kwargs: batch(logger=logger, **kwargs),
+        "shard": lambda **kwargs: shard(logger=logger, **kwargs),
+        "worker": lambda **kwargs: worker(logger=logger, **kwargs),
+        "serve": lambda **kwargs: serve(logger=logger, **kwargs),
+        "evaluate": lambda **kwargs: evaluate(logger=logger, **kwargs),
+    }
+    if len(sys.argv) < 2 or sys.argv[1] not in (*commands, "-h", "--help"):
+        sys.argv.insert(1, "run")
+    try:
+        Fire(commands)
+    finally:
+        transcripts.close()
+        logs.close()
+        if logs.dropped:
+            print(f"로그 queue가 가득 차서 {logs.dropped}건을 기록하지 못했습니다", file=sys.stderr)
\ No newline at end of file
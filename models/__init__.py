@@ -1,5 +1,24 @@
+# Response cache
+from .cache import *
+
+# Rate limiting
+from .scheduler import *
+
+# Latency/token/cost metrics
+from .metrics import *
+
+# Provider clients (created on first use)
+from .clients import *
+
 # OpenAI
 from .gpt_model import *
+from .gpt_batch import *
 
 # Ollama
-from .ollama_model import *
\ No newline at end of file
+from .ollama_model import *
+
+# Deadlines, hedged requests, retry, circuit breaker
+from .resilience import *
+
+# Provider backends
+from .providers import *
\ No newline at end of file
@@ -0,0 +1,141 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+# LLM_CACHE(경로, off면 캐시 끔)와 LLM_CACHE_MAX_MB는 캐시를 처음 사용할 때 읽음 (.env를 읽은 뒤)
+DEFAULT_CACHE_PATH = os.path.join(".cache", "llm_cache.sqlite")
+DEFAULT_CACHE_MAX_MB = 512
+
+
+def cache_key(model: str, prompt, version: str = "") -> str:
+    """(model, prompt, prompt version)의 content hash. prompt는 문자열 또는 메시지 리스트."""
+    payload = json.dumps([model, version, prompt], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """SQLite에 저장되는 LLM 응답 캐시. 용량(max_bytes)을 넘으면 가장 오래 안 쓰인 항목부터 삭제(LRU)."""
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_bytes: int = DEFAULT_CACHE_MAX_MB * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, model TEXT, response TEXT, size INTEGER, created REAL, accessed REAL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        self.total_bytes = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def get(self, key: str) -> str | None:
+        with self.lock:
+            row = self.conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (time.time(), key))
+            return row[0]
+
+    def put(self, key: str, model: str, response: str) -> None:
+        size = len(response.encode("utf-8")) + len(key)
+        now = time.time()
+        with self.lock:
+            previous = self.conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, size, created, accessed) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, response, size, now, now),
+            )
+            self.total_bytes += size - (previous[0] if previous else 0)
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        # 한 번에 용량의 10% 여유를 만들 때까지 오래된 항목부터 삭제
+        target = self.max_bytes * 0.9
+        while self.total_bytes > target:
+            rows = self.conn.execute("SELECT key, size FROM responses ORDER BY accessed LIMIT 256").fetchall()
+            if not rows:
+                self.total_bytes = 0
+                break
+            # 256개씩 읽되 target에 닿는 만큼만 삭제 (작은 캐시에서 방금 넣은 항목까지 지우지 않도록)
+            victims = []
+            for key, size in rows:
+                if self.total_bytes <= target:
+                    break
+                victims.append(key)
+                self.total_bytes -= size
+            self.conn.executemany("DELETE FROM responses WHERE key = ?", [(key,) for key in victims])
+            self.evictions += len(victims)
+
+    def stats(self) -> dict:
+        with self.lock:
+            entries = self.conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": entries,
+                "bytes": self.total_bytes,
+            }
+
+
+class NullCache:
+    """LLM_CACHE=off 일 때 사용하는 빈 캐시."""
+
+    hits = misses = evictions = 0
+
+    def get(self, key: str) -> None:
+        return None
+
+    def put(self, key: str, model: str, response: str) -> None:
+        pass
+
+    def stats(self) -> dict:
+        return {"hits": 0, "misses": 0, "evictions": 0, "entries": 0, "bytes": 0}
+
+
+class LazyCache:
+    """
+    처음 get/put/stats를 호출할 때 LLM_CACHE 설정에 따라 ResponseCache 또는 NullCache를 만들어서 위임.
+    import 시점에는 .env가 아직 로드되지 않았을 수 있고, import만으로 sqlite 파일을 만들지 않도록 함.
+    """
+
+    def __init__(self):
+        self.cache = None
+        self.lock = threading.Lock()
+
+    def resolve(self):
+        with self.lock:
+            if self.cache is None:
+                path = os.getenv("LLM_CACHE", DEFAULT_CACHE_PATH)
+                max_mb = float(os.getenv("LLM_CACHE_MAX_MB", DEFAULT_CACHE_MAX_MB))
+                self.cache = NullCache() if path.lower() in ("", "0", "off", "false") else ResponseCache(path, int(max_mb * 1024 * 1024))
+            return self.cache
+
+    def get(self, key: str) -> str | None:
+        return self.resolve().get(key)
+
+    def put(self, key: str, model: str, response: str) -> None:
+        self.resolve().put(key, model, response)
+
+    def stats(self) -> dict:
+        return self.resolve().stats()
+
+
+response_cache = LazyCache()
+
+
+__all__ = ["LazyCache", "NullCache", "ResponseCache", "cache_key", "response_cache"]
@@ -0,0 +1,81 @@
+import asyncio
+import os
+import threading
+import weakref
+
+
+class ClientRegistry:
+    """
+    provider client를 처음 사용할 때 만들어서 프로세스 안에서 공유. SDK(openai, httpx) import도 이때 함.
+    그래서 --help나 체크포인트만으로 끝나는 실행은 client 생성/SDK import 비용이 없고, API key가 없어도 import는 실패하지 않음.
+    비동기 client는 연결 pool이 처음 사용한 event loop에 묶이므로 loop마다 하나.
+    """
+
+    def __init__(self):
+        self.factories, self.async_factories = {}, {}
+        self.clients = {}
+        self.async_clients = weakref.WeakKeyDictionary()
+        self.lock = threading.Lock()
+
+    def register(self, name: str, factory, async_factory=None) -> None:
+        self.factories[name] = factory
+        if async_factory is not None:
+            self.async_factories[name] = async_factory
+
+    def get(self, name: str):
+        with self.lock:
+            if name not in self.clients:
+                self.clients[name] = self.factories[name]()
+            return self.clients[name]
+
+    def get_async(self, name: str):
+        loop = asyncio.get_running_loop()
+        with self.lock:
+            clients = self.async_clients.setdefault(loop, {})
+            if name not in clients:
+                clients[name] = self.async_factories[name]()
+            return clients[name]
+
+    def created(self) -> list:
+        """지금까지 만든 client 이름 (동기 client 기준)."""
+        with self.lock:
+            return sorted(self.clients)
+
+
+def _openai():
+    from openai import OpenAI
+    return OpenAI()
+
+
+def _async_openai():
+    from openai import AsyncOpenAI
+    return AsyncOpenAI()
+
+
+def _ollama_options() -> dict:
+    # 환경 변수는 .env를 읽은 뒤인 첫 사용 시점에 읽음. keep-alive 연결을 재사용하도록 프로세스(및 event loop)마다 client 하나를 공유
+    import httpx
+    connections = int(os.getenv('OLLAMA_MAX_CONNECTIONS', 32))
+    return {
+        "base_url": os.getenv('OLLAMA_ENDPOINT') or 'http://localhost:11434',
+        "limits": httpx.Limits(max_connections=connections, max_keepalive_connections=connections),
+        "timeout": None,
+    }
+
+
+def _ollama():
+    import httpx
+    return httpx.Client(**_ollama_options())
+
+
+def _async_ollama():
+    import httpx
+    return httpx.AsyncClient(**_ollama_options())
+
+
+clients = ClientRegistry()
+clients.register("openai", _openai, _async_openai)
+clients.register("ollama", _ollama, _async_ollama)
+
+
+__all__ = ["ClientRegistry", "clients"]
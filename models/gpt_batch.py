@@ -0,0 +1,68 @@
+import io
+import json
+import time
+
+from .clients import clients
+from .gpt_model import to_messages
+
+
+BATCH_DONE = ("completed", "failed", "expired", "cancelled")
+
+
+def batch_request(custom_id: str, prompt: str | list, model: str = "gpt-4.1-mini", response_format: dict = None) -> dict:
+    """Batch 입력 JSONL의 한 줄. gpt_call과 같은 메시지 구성을 사용."""
+    body = {"model": model, "messages": to_messages(prompt)}
+    if response_format is not None:
+        body["response_format"] = response_format
+    return {
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": "/v1/chat/completions",
+        "body": body,
+    }
+
+
+def submit_batch(requests: list, metadata: dict = None) -> str:
+    """요청 목록을 JSONL 파일로 업로드하고 batch job을 생성. batch id를 반환."""
+    payload = "".join(json.dumps(request, ensure_ascii=False) + "\n" for request in requests)
+    batch_file = clients.get("openai").files.create(
+        file=("batch.jsonl", io.BytesIO(payload.encode("utf-8"))),
+        purpose="batch",
+    )
+    batch = clients.get("openai").batches.create(
+        input_file_id=batch_file.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h",
+        metadata=metadata,
+    )
+    return batch.id
+
+
+def wait_batch(batch_id: str, poll_interval: float = 60, logger=None, sleep=time.sleep):
+    """batch job이 끝날 때까지 poll_interval초 간격으로 상태 확인."""
+    while True:
+        batch = clients.get("openai").batches.retrieve(batch_id)
+        if logger is not None:
+            logger.info(f"Batch {batch_id}: {batch.status} {batch.request_counts}")
+        if batch.status in BATCH_DONE:
+            return batch
+        sleep(poll_interval)
+
+
+def fetch_batch_results(batch) -> dict:
+    """완료된 batch의 출력 파일을 읽어 {custom_id: 응답 텍스트}로 변환. 실패한 요청은 빠짐."""
+    results = {}
+    if not batch.output_file_id:
+        return results
+    for line in clients.get("openai").files.content(batch.output_file_id).text.splitlines():
+        if not line.strip():
+            continue
+        item = json.loads(line)
+        response = item.get("response") or {}
+        if item.get("error") or response.get("status_code") != 200:
+            continue
+        results[item["custom_id"]] = response["body"]["choices"][0]["message"]["content"]
+    return results
+
+
+__all__ = ["batch_request", "fetch_batch_results", "submit_batch", "wait_batch"]
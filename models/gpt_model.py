@@ -1,36 +1,143 @@
+import json
+
 from dotenv import load_dotenv
-from openai import AsyncOpenAI, OpenAI
+
+from .cache import cache_key, response_cache
+from .clients import clients
+from .resilience import check_attempt
+from .scheduler import estimate_tokens, scheduler
 
 
 load_dotenv()
 
-client = AsyncOpenAI()
-sync_client = OpenAI()
+# 로컬 응답 캐시에서 꺼낸 경우의 usage
+EMPTY_USAGE = {"prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0}
+
+
+def cached_usage(prompt: str | list, response: str, model: str) -> dict:
+    """
+    로컬 응답 캐시 적중의 usage. 과금 token은 0이고, 캐시가 없었다면 보냈을 token 추정치를 saved_*_tokens로 남김
+    (평가 실행에서 여러 설정이 캐시를 공유해도 설정별 단독 비용을 계산할 수 있도록).
+    """
+    return dict(EMPTY_USAGE, cache_hit=1, saved_prompt_tokens=estimate_tokens(prompt, model), saved_completion_tokens=estimate_tokens(response, model))
+
+
+def given(value):
+    """값이 없으면 openai.NOT_GIVEN (요청 필드 생략). openai는 client를 처음 만들 때 import되므로 여기서는 이미 로드된 모듈을 참조."""
+    from openai import NOT_GIVEN
+    return value or NOT_GIVEN
+
+
+def with_timeout(client, timeout: float = None):
+    """timeout이 주어지면 이 요청에만 timeout을 걸고 SDK 자체 재시도는 끔 (재시도/hedge는 resilience 계층에서)."""
+    return client if timeout is None else client.with_options(timeout=timeout, max_retries=0)
+
+
+def to_messages(prompt: str | list) -> list:
+    """문자열 프롬프트는 단일 user 메시지로, 메시지 리스트(system/user/assistant 턴)는 그대로 사용."""
+    if isinstance(prompt, list):
+        return prompt
+    return [{"role": "user", "content": prompt}]
 
 
-def gpt_call(prompt: str,  model: str = "gpt-4.1-mini") -> str:
-    messages = []
-    messages.append({"role": "user", "content": prompt})
-    chat_completion = sync_client.chat.completions.create(
+def parse_usage(usage) -> dict:
+    """응답의 usage에서 prompt/completion token과 provider prompt cache에 적중한 cached token 수를 추출."""
+    if usage is None:
+        return dict(EMPTY_USAGE)
+    details = getattr(usage, "prompt_tokens_details", None)
+    return {
+        "prompt_tokens": usage.prompt_tokens or 0,
+        "completion_tokens": usage.completion_tokens or 0,
+        "cached_tokens": (getattr(details, "cached_tokens", None) or 0) if details is not None else 0,
+    }
+
+
+def gpt_call(prompt: str | list,  model: str = "gpt-4.1-mini", version: str = "", return_obj: bool = False, response_format: dict = None, timeout: float = None) -> tuple | str:
+    key = cache_key(model, prompt, version)
+    cached = response_cache.get(key)
+    if cached is not None:
+        return (cached, cached_usage(prompt, cached, model)) if return_obj else cached
+    messages = to_messages(prompt)
+    scheduler.acquire(model, estimate_tokens(prompt, model), check=check_attempt)
+    response = with_timeout(clients.get("openai"), check_attempt(timeout)).chat.completions.with_raw_response.create(
         model=model,
         messages=messages,
+        response_format=given(response_format),
     )
-    return chat_completion.choices[0].message.content
+    scheduler.update(model, response.headers)
+    chat_completion = response.parse()
+    content = chat_completion.choices[0].message.content
+    response_cache.put(key, model, content)
+    if return_obj:
+        return content, parse_usage(chat_completion.usage)
+    return content
 
 
-async def gpt_call_async(prompt: str,  model: str = "gpt-4.1-mini") -> str:
-    messages = []
-    messages.append({"role": "user", "content": prompt})
-    chat_completion = await client.chat.completions.create(
+async def gpt_call_async(prompt: str | list,  model: str = "gpt-4.1-mini", version: str = "", return_obj: bool = False, response_format: dict = None, timeout: float = None) -> tuple | str:
+    key = cache_key(model, prompt, version)
+    cached = response_cache.get(key)
+    if cached is not None:
+        return (cached, cached_usage(prompt, cached, model)) if return_obj else cached
+    messages = to_messages(prompt)
+    await scheduler.acquire_async(model, estimate_tokens(prompt, model))
+    response = await with_timeout(clients.get_async("openai"), timeout).chat.completions.with_raw_response.create(
         model=model,
         messages=messages,
+        response_format=given(response_format),
     )
+    scheduler.update(model, response.headers)
+    chat_completion = response.parse()
     # print(model,"완료")
-    return chat_completion.choices[0].message.content
+    content = chat_completion.choices[0].message.content
+    response_cache.put(key, model, content)
+    if return_obj:
+        return content, parse_usage(chat_completion.usage)
+    return content
+
+
+def gpt_samples(prompt: str | list, n: int = 5, model: str = "gpt-4.1-mini", version: str = "", response_format: dict = None, timeout: float = None) -> tuple:
+    """같은 프롬프트의 응답 n개를 한 번의 요청(n=)으로 샘플링. (응답 텍스트 리스트, usage)를 반환. prompt token은 한 번만 과금."""
+    key = cache_key(model, prompt, f"{version}#n={n}")
+    cached = response_cache.get(key)
+    if cached is not None:
+        contents = json.loads(cached)
+        return contents, cached_usage(prompt, "".join(contents), model)
+    scheduler.acquire(model, estimate_tokens(prompt, model), check=check_attempt)
+    response = with_timeout(clients.get("openai"), check_attempt(timeout)).chat.completions.with_raw_response.create(
+        model=model,
+        messages=to_messages(prompt),
+        n=n,
+        response_format=given(response_format),
+    )
+    scheduler.update(model, response.headers)
+    chat_completion = response.parse()
+    contents = [choice.message.content for choice in chat_completion.choices]
+    response_cache.put(key, model, json.dumps(contents, ensure_ascii=False))
+    return contents, parse_usage(chat_completion.usage)
+
+
+async def gpt_samples_async(prompt: str | list, n: int = 5, model: str = "gpt-4.1-mini", version: str = "", response_format: dict = None, timeout: float = None) -> tuple:
+    key = cache_key(model, prompt, f"{version}#n={n}")
+    cached = response_cache.get(key)
+    if cached is not None:
+        contents = json.loads(cached)
+        return contents, cached_usage(prompt, "".join(contents), model)
+    await scheduler.acquire_async(model, estimate_tokens(prompt, model))
+    response = await with_timeout(clients.get_async("openai"), timeout).chat.completions.with_raw_response.create(
+        model=model,
+        messages=to_messages(prompt),
+        n=n,
+        response_format=given(response_format),
+    )
+    scheduler.update(model, response.headers)
+    chat_completion = response.parse()
+    contents = [choice.message.content for choice in chat_completion.choices]
+    response_cache.put(key, model, json.dumps(contents, ensure_ascii=False))
+    return contents, parse_usage(chat_completion.usage)
 
 
 if __name__ == "__main__":
-    test, _ = gpt_call(prompt="안녕")
+    test, _ = gpt_call(prompt="안녕", return_obj=True)
     print(test)
 
-__all__ = ["gpt_call", "gpt_call_async"]
\ No newline at end of file
+__all__ = ["gpt_call", "gpt_call_async", "gpt_samples", "gpt_samples_async"]
\ No newline at end of file
@@ -0,0 +1,208 @@
+import contextlib
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+
+try:
+    from opentelemetry import trace
+except ImportError:  # opentelemetry가 없으면 span 기록 없이 동작
+    trace = None
+
+
+# 모델별 1M token당 USD (input, cached input, output). LLM_PRICES='{"gpt-4.1": [2.0, 0.5, 8.0]}' 로 덮어쓸 수 있음
+# Batch API는 이 가격의 50%. provider 접두어가 붙은 로컬 모델(ollama:...)은 0으로 계산
+DEFAULT_PRICES = {
+    "gpt-4.1": (2.00, 0.50, 8.00),
+    "gpt-4.1-mini": (0.40, 0.10, 1.60),
+    "gpt-4.1-nano": (0.10, 0.025, 0.40),
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+}
+PERCENTILES = (50, 95, 99)
+
+# 현재 처리 중인 row의 호출 목록. asyncio task마다 context가 복사되므로 동시 실행되는 row끼리 섞이지 않음
+_current_row = contextvars.ContextVar("current_row", default=None)
+_tracer = trace.get_tracer("acc-cls-evaluator") if trace is not None else None
+
+
+@functools.lru_cache(maxsize=None)
+def prices() -> dict:
+    """DEFAULT_PRICES에 LLM_PRICES를 덮어쓴 가격표. 처음 비용을 계산할 때 읽음 (import 시점에는 .env가 아직 로드되지 않았을 수 있음)."""
+    return {**DEFAULT_PRICES, **{model: tuple(price) for model, price in json.loads(os.getenv("LLM_PRICES") or "{}").items()}}
+
+
+def call_cost(model: str, usage: dict) -> float:
+    """usage(prompt/cached/completion token)의 USD 비용. cached token은 prompt token에 포함된 것으로 계산."""
+    input_price, cached_price, output_price = prices().get(model, (0.0, 0.0, 0.0))
+    cached = usage.get("cached_tokens", 0)
+    return (
+        (usage.get("prompt_tokens", 0) - cached) * input_price
+        + cached * cached_price
+        + usage.get("completion_tokens", 0) * output_price
+    ) / 1_000_000
+
+
+def percentiles(values: list, points=PERCENTILES) -> dict:
+    """nearest-rank 방식의 백분위수. {"p50": ..., "p95": ..., "p99": ...}"""
+    if not values:
+        return {f"p{point}": None for point in points}
+    ordered = sorted(values)
+    return {f"p{point}": ordered[min(len(ordered) - 1, max(0, -(-point * len(ordered) // 100) - 1))] for point in points}
+
+
+@contextlib.contextmanager
+def span(name: str, **attributes):
+    """OpenTelemetry가 설치되어 있으면 span을 열고, 아니면 아무것도 하지 않음."""
+    if _tracer is None:
+        yield None
+        return
+    with _tracer.start_as_current_span(name, attributes={key: value for key, value in attributes.items() if value is not None}) as current:
+        yield current
+
+
+class Metrics:
+    """LLM 호출 단위 latency/token/비용을 모델별로 집계하고, row_scope 안의 호출은 row 단위로도 모음."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self.lock:
+            self.latencies = {}
+            self.totals = {}
+
+    def record(self, model: str, latency: float, usage: dict) -> dict:
+        call = {
+            "model": model,
+            "latency": latency,
+            "prompt_tokens": usage.get("prompt_tokens", 0),
+            "cached_tokens": usage.get("cached_tokens", 0),
+            "completion_tokens": usage.get("completion_tokens", 0),
+            "cost": call_cost(model, usage),
+            # 로컬 응답 캐시 적중이면 과금은 0이고, 캐시가 없었다면 들었을 비용(추정)을 saved_cost로
+            "cache_hit": bool(usage.get("cache_hit")),
+            "saved_cost": call_cost(model, {"prompt_tokens": usage.get("saved_prompt_tokens", 0), "completion_tokens": usage.get("saved_completion_tokens", 0)}),
+        }
+        with self.lock:
+            self.latencies.setdefault(model, []).append(latency)
+            totals = self.totals.setdefault(model, {"calls": 0, "cache_hits": 0, "prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0, "cost": 0.0})
+            totals["calls"] += 1
+            totals["cache_hits"] += call["cache_hit"]
+            for name in ("prompt_tokens", "cached_tokens", "completion_tokens", "cost"):
+                totals[name] += call[name]
+        row = _current_row.get()
+        if row is not None:
+            row.append(call)
+        return call
+
+    @contextlib.contextmanager
+    def timed(self, model: str, **attributes):
+        """with 블록의 latency를 재고, 블록 안에서 채운 usage dict로 호출 1건을 기록."""
+        usage = {}
+        started = time.perf_counter()
+        with span("llm.call", model=model, **attributes) as current:
+            yield usage
+            call = self.record(model, time.perf_counter() - started, usage)
+            if current is not None:
+                current.set_attributes({f"llm.{name}": value for name, value in call.items() if name != "model"})
+
+    @contextlib.contextmanager
+    def row_scope(self, calls: list = None):
+        """블록 안에서 일어난 호출 목록을 모아서 yield (calls를 주면 그 리스트에 이어서 추가). summarize_calls로 요약할 수 있음."""
+        calls = [] if calls is None else calls
+        token = _current_row.set(calls)
+        try:
+            yield calls
+        finally:
+            _current_row.reset(token)
+
+    def summary(self) -> dict:
+        """모델별 호출 수, token, 비용과 latency 백분위수."""
+        with self.lock:
+            latencies = {model: list(values) for model, values in self.latencies.items()}
+            totals = {model: dict(values) for model, values in self.totals.items()}
+        return {
+            model: dict(totals[model], cost=round(totals[model]["cost"], 6), **{name: round(value, 3) for name, value in percentiles(latencies[model]).items()})
+            for model in totals
+        }
+
+
+def summarize_calls(calls: list) -> dict:
+    """row 하나의 호출 목록을 호출 수, LLM latency 합계, 비용 합계로 요약. cache_hits/saved_cost는 로컬 응답 캐시로 대신한 호출 수와 그 추정 비용."""
+    return {
+        "calls": len(calls),
+        "llm_latency": round(sum(call["latency"] for call in calls), 3),
+        "cost": round(sum(call["cost"] for call in calls), 6),
+        "cache_hits": sum(call["cache_hit"] for call in calls),
+        "saved_cost": round(sum(call["saved_cost"] for call in calls), 6),
+    }
+
+
+class RunReport:
+    """고유 content(그룹) 단위 지표를 JSONL로 한 줄씩 기록하고, 실행 종료 시 latency 백분위수/재시도/비용 요약을 계산."""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.file = open(path, "a", encoding="utf-8")
+        self.lock = threading.Lock()
+        self.elapsed, self.attempts, self.passed = [], {}, {}
+        self.groups = self.rows = 0
+        self.cost = 0.0
+
+    def add(self, records: list) -> None:
+        """broadcast가 만든 그룹의 체크포인트 레코드. 지표는 첫 레코드에 있으므로 그룹당 한 줄만 기록."""
+        if not records:
+            return
+        line = dict(records[0], rows=len(records))
+        with self.lock:
+            self.file.write(json.dumps(line, ensure_ascii=False, default=str) + "\n")
+            self.file.flush()
+            self.groups += 1
+            self.rows += len(records)
+            self.cost += line.get("cost") or 0.0
+            if line.get("elapsed") is not None:
+                self.elapsed.append(line["elapsed"])
+            attempts = line.get("attempts") or 0
+            self.attempts[attempts] = self.attempts.get(attempts, 0) + 1
+            if line.get("passed"):
+                self.passed[attempts] = self.passed.get(attempts, 0) + 1
+
+    def summary(self) -> dict:
+        with self.lock:
+            # 시도 k회 이내에 PASS한 그룹 비율 (누적)
+            cumulative, pass_rate = 0, {}
+            for attempts in sorted(self.attempts):
+                cumulative += self.passed.get(attempts, 0)
+                pass_rate[attempts] = round(cumulative / self.groups, 4)
+            return {
+                "groups": self.groups,
+                "rows": self.rows,
+                "latency": {name: value if value is None else round(value, 3) for name, value in percentiles(self.elapsed).items()},
+                "attempts": dict(sorted(self.attempts.items())),
+                "passed_by_attempt": dict(sorted(self.passed.items())),
+                "pass_rate": pass_rate,
+                "cost": round(self.cost, 6),
+                "models": metrics.summary(),
+            }
+
+    def close(self) -> None:
+        with self.lock:
+            if not self.file.closed:
+                self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+metrics = Metrics()
+
+
+__all__ = ["DEFAULT_PRICES", "RunReport", "call_cost", "metrics", "percentiles", "prices", "span", "summarize_calls"]
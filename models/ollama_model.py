@@ -1,42 +1,93 @@
 import json
-import os
-import requests
+
 from dotenv import load_dotenv
 
+from .cache import cache_key, response_cache
+from .clients import clients
+
 
 load_dotenv()
 
 
-def ollama_call(prompt: str, model: str = "exaone3.5:latest", return_obj: bool = False) -> tuple | str:
-    url = f"{os.getenv('OLLAMA_ENDPOINT', 'localhost')}/api/chat"
-    headers = {
-        "Content-Type": "application/json",
-    }
-    data = {
+def _request(prompt: str | list, model: str, response_format: dict = None) -> dict:
+    request = {
         "model": model,
-        "messages": [{"role": "user", "content": prompt}],
+        "messages": prompt if isinstance(prompt, list) else [{"role": "user", "content": prompt}],
     }
-    response = requests.post(url, headers=headers, data=json.dumps(data))
-    response.raise_for_status()
+    if response_format is not None:
+        # Ollama는 OpenAI의 response_format 대신 format에 JSON schema를 직접 받음
+        request["format"] = response_format.get("json_schema", {}).get("schema", "json")
+    return request
+
+
+def ollama_usage(final_socket: dict) -> dict:
+    """Ollama done 프레임의 token 수를 OpenAI usage와 같은 형태로 변환 (Ollama는 cached token을 보고하지 않음). 로컬 응답 캐시 적중이면 cache_hit=1."""
+    return {
+        "prompt_tokens": final_socket.get("prompt_eval_count", 0),
+        "completion_tokens": final_socket.get("eval_count", 0),
+        "cached_tokens": 0,
+        "cache_hit": final_socket.get("cache_hit", 0),
+    }
+
 
-    json_objs = response.content.decode().strip().split("\n")
-    data = [json.loads(obj) for obj in json_objs]
-    res_text, final_socket = "", {}
-    for socket in data:
+class _StreamState:
+    """NDJSON 스트림을 줄 단위로 바로 디코딩하면서 assistant 응답을 누적."""
+
+    def __init__(self):
+        self.text = ""
+        self.final_socket = {}
+
+    def feed(self, line: str) -> bool:
+        """한 줄을 처리하고, done이면 True (이후 스트림은 읽지 않음)."""
+        if not line.strip():
+            return False
+        socket = json.loads(line)
         message = socket.get("message", {})
-        done = socket.get("done", False)
         if message.get("role") == "assistant":
-            res_text += message.get("content", "")
-        if done:
-            final_socket = socket.copy()
-            del final_socket["message"]
+            self.text += message.get("content", "")
+        if socket.get("done", False):
+            self.final_socket = {key: value for key, value in socket.items() if key != "message"}
+            return True
+        return False
+
+
+def ollama_call(prompt: str | list, model: str = "exaone3.5:latest", return_obj: bool = False, version: str = "", response_format: dict = None, timeout: float = None) -> tuple | str:
+    key = cache_key(model, prompt, version)
+    cached = response_cache.get(key)
+    if cached is not None:
+        return (cached, {"cache_hit": 1}) if return_obj else cached
+    state = _StreamState()
+    # timeout은 연결/읽기 단위. 호출 전체의 deadline은 resilience 계층에서 지킴
+    with clients.get("ollama").stream("POST", "/api/chat", json=_request(prompt, model, response_format), timeout=timeout) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if state.feed(line):
+                break
+    response_cache.put(key, model, state.text.strip())
+    if return_obj:
+        return state.text.strip(), state.final_socket
+    return state.text.strip()
+
+
+async def ollama_call_async(prompt: str | list, model: str = "exaone3.5:latest", return_obj: bool = False, version: str = "", response_format: dict = None, timeout: float = None) -> tuple | str:
+    key = cache_key(model, prompt, version)
+    cached = response_cache.get(key)
+    if cached is not None:
+        return (cached, {"cache_hit": 1}) if return_obj else cached
+    state = _StreamState()
+    async with clients.get_async("ollama").stream("POST", "/api/chat", json=_request(prompt, model, response_format), timeout=timeout) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if state.feed(line):
+                break
+    response_cache.put(key, model, state.text.strip())
     if return_obj:
-        return res_text.strip(), final_socket
-    return res_text.strip()
+        return state.text.strip(), state.final_socket
+    return state.text.strip()
 
 
 if __name__ == "__main__":
-    test, _ = ollama_call(prompt="안녕")
+    test, _ = ollama_call(prompt="안녕", return_obj=True)
     print(test)
 
-__all__ = ["ollama_call"]
\ No newline at end of file
+__all__ = ["ollama_call", "ollama_call_async", "ollama_usage"]
@@ -0,0 +1,137 @@
+import asyncio
+
+from utils import transcripts
+
+from .gpt_model import gpt_call, gpt_call_async, gpt_samples, gpt_samples_async
+from .ollama_model import ollama_call, ollama_call_async, ollama_usage
+from .metrics import metrics
+from .resilience import resilience
+
+
+class Provider:
+    """LLM backend 공통 인터페이스. 동기 call과 비동기 acall 모두 (응답 텍스트, usage)를 반환. timeout은 HTTP 요청 1회의 제한(초)."""
+
+    name = ""
+
+    def call(self, prompt: str | list, model: str, version: str = "", response_format: dict = None, timeout: float = None) -> tuple:
+        raise NotImplementedError
+
+    async def acall(self, prompt: str | list, model: str, version: str = "", response_format: dict = None, timeout: float = None) -> tuple:
+        raise NotImplementedError
+
+    def samples(self, prompt: str | list, model: str, n: int, version: str = "", response_format: dict = None, timeout: float = None) -> tuple:
+        """응답 n개를 (텍스트 리스트, usage 합계)로. 기본 구현은 샘플마다 응답 캐시 키가 다르도록 version을 바꿔서 n번 호출."""
+        results = [self.call(prompt, model, version=f"{version}#sample{i}", response_format=response_format, timeout=timeout) for i in range(n)]
+        return [text for text, _ in results], _sum_usage(usage for _, usage in results)
+
+    async def asamples(self, prompt: str | list, model: str, n: int, version: str = "", response_format: dict = None, timeout: float = None) -> tuple:
+        results = await asyncio.gather(*(self.acall(prompt, model, version=f"{version}#sample{i}", response_format=response_format, timeout=timeout) for i in range(n)))
+        return [text for text, _ in results], _sum_usage(usage for _, usage in results)
+
+
+def _sum_usage(usages) -> dict:
+    # cache_hit, saved_*_tokens 같은 부가 필드도 함께 합산
+    total = {"prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0}
+    for usage in usages:
+        for name, value in usage.items():
+            total[name] = total.get(name, 0) + value
+    return total
+
+
+class OpenAIProvider(Provider):
+    name = "openai"
+
+    def call(self, prompt: str | list, model: str, version: str = "", response_format: dict = None, timeout: float = None) -> tuple:
+        return gpt_call(prompt, model=model, version=version, return_obj=True, response_format=response_format, timeout=timeout)
+
+    async def acall(self, prompt: str | list, model: str, version: str = "", response_format: dict = None, timeout: float = None) -> tuple:
+        return await gpt_call_async(prompt, model=model, version=version, return_obj=True, response_format=response_format, timeout=timeout)
+
+    def samples(self, prompt: str | list, model: str, n: int, version: str = "", response_format: dict = None, timeout: float = None) -> tuple:
+        return gpt_samples(prompt, n=n, model=model, version=version, response_format=response_format, timeout=timeout)
+
+    async def asamples(self, prompt: str | list, model: str, n: int, version: str = "", response_format: dict = None, timeout: float = None) -> tuple:
+        return await gpt_samples_async(prompt, n=n, model=model, version=version, response_format=response_format, timeout=timeout)
+
+
+class OllamaProvider(Provider):
+    name = "ollama"
+
+    def call(self, prompt: str | list, model: str, version: str = "", response_format: dict = None, timeout: float = None) -> tuple:
+        text, final_socket = ollama_call(prompt, model=model, version=version, return_obj=True, response_format=response_format, timeout=timeout)
+        return text, ollama_usage(final_socket)
+
+    async def acall(self, prompt: str | list, model: str, version: str = "", response_format: dict = None, timeout: float = None) -> tuple:
+        text, final_socket = await ollama_call_async(prompt, model=model, version=version, return_obj=True, response_format=response_format, timeout=timeout)
+        return text, ollama_usage(final_socket)
+
+
+PROVIDERS = {provider.name: provider for provider in (OpenAIProvider(), OllamaProvider())}
+
+
+def resolve_model(spec: str) -> tuple:
+    """"ollama:exaone3.5:latest" → (OllamaProvider, "exaone3.5:latest"). provider 접두어가 없으면 OpenAI."""
+    prefix, _, model = spec.partition(":")
+    if prefix in PROVIDERS and model:
+        return PROVIDERS[prefix], model
+    return PROVIDERS["openai"], spec
+
+
+def llm_call(prompt: str | list, model: str = "gpt-4.1-mini", version: str = "", return_obj: bool = False, response_format: dict = None) -> tuple | str:
+    """
+    모든 호출은 resilience(deadline, hedge, retry, failover)를 거침. 지표는 실제로 응답한 backend 기준으로 기록.
+    샘플링된 row(transcripts.row_scope)의 호출은 프롬프트/응답을 transcript 로그에 남김.
+    """
+    def request(spec: str, timeout: float) -> tuple:
+        provider, name = resolve_model(spec)
+        with metrics.timed(name, provider=provider.name) as usage:
+            text, call_usage = provider.call(prompt, name, version=version, response_format=response_format, timeout=timeout)
+            usage.update(call_usage)
+        return text, call_usage
+
+    text, call_usage = resilience.call(model, request)
+    transcripts.record(model, prompt, text, version, call_usage)
+    return (text, call_usage) if return_obj else text
+
+
+async def llm_call_async(prompt: str | list, model: str = "gpt-4.1-mini", version: str = "", return_obj: bool = False, response_format: dict = None) -> tuple | str:
+    async def request(spec: str, timeout: float) -> tuple:
+        provider, name = resolve_model(spec)
+        with metrics.timed(name, provider=provider.name) as usage:
+            text, call_usage = await provider.acall(prompt, name, version=version, response_format=response_format, timeout=timeout)
+            usage.update(call_usage)
+        return text, call_usage
+
+    text, call_usage = await resilience.acall(model, request)
+    transcripts.record(model, prompt, text, version, call_usage)
+    return (text, call_usage) if return_obj else text
+
+
+def llm_samples(prompt: str | list, n: int = 5, model: str = "gpt-4.1-mini", version: str = "", response_format: dict = None) -> tuple:
+    """self-consistency용: 같은 프롬프트의 응답 n개와 usage 합계. OpenAI는 n= 한 번의 요청, 그 외 provider는 n번 호출."""
+    def request(spec: str, timeout: float) -> tuple:
+        provider, name = resolve_model(spec)
+        with metrics.timed(name, provider=provider.name, n=n) as usage:
+            texts, call_usage = provider.samples(prompt, name, n, version=version, response_format=response_format, timeout=timeout)
+            usage.update(call_usage)
+        return texts, call_usage
+
+    texts, call_usage = resilience.call(model, request)
+    transcripts.record(model, prompt, texts, version, call_usage)
+    return texts, call_usage
+
+
+async def llm_samples_async(prompt: str | list, n: int = 5, model: str = "gpt-4.1-mini", version: str = "", response_format: dict = None) -> tuple:
+    async def request(spec: str, timeout: float) -> tuple:
+        provider, name = resolve_model(spec)
+        with metrics.timed(name, provider=provider.name, n=n) as usage:
+            texts, call_usage = await provider.asamples(prompt, name, n, version=version, response_format=response_format, timeout=timeout)
+            usage.update(call_usage)
+        return texts, call_usage
+
+    texts, call_usage = await resilience.acall(model, request)
+    transcripts.record(model, prompt, texts, version, call_usage)
+    return texts, call_usage
+
+
+__all__ = ["PROVIDERS", "Provider", "llm_call", "llm_call_async", "llm_samples", "llm_samples_async", "resolve_model"]
@@ -0,0 +1,351 @@
+import asyncio
+import contextvars
+import functools
+import os
+import random
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+# 호출 1건(재시도/hedge 포함)의 기본 deadline(초). LLM_TIMEOUT으로 덮어쓰고, 역할별로는 main.py의 --classifier_timeout/--evaluator_timeout
+DEFAULT_LLM_TIMEOUT = 120.0
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+@functools.lru_cache(maxsize=None)
+def llm_timeout() -> float:
+    """LLM_TIMEOUT(초), 없으면 DEFAULT_LLM_TIMEOUT. 처음 deadline을 정할 때 읽음 (import 시점에는 .env가 아직 로드되지 않았을 수 있음)."""
+    return float(os.getenv("LLM_TIMEOUT") or DEFAULT_LLM_TIMEOUT)
+
+
+class DeadlineExceeded(TimeoutError):
+    """호출의 deadline 안에 어떤 시도도 끝나지 않음."""
+
+
+# worker thread에서 실행 중인 동기 시도의 (until, 취소 Event, clock). thread는 멈출 수 없으므로 요청을 보내기 직전에 확인
+_current_attempt = contextvars.ContextVar("resilience_attempt", default=None)
+
+
+def check_attempt(timeout: float = None) -> float | None:
+    """
+    현재 동기 시도가 hedge에 졌거나 deadline을 넘겨서 버려졌으면 DeadlineExceeded (요청을 보내거나 rate limit을 쓰지 않도록).
+    아니면 timeout을 이 시도의 남은 시간으로 줄여서 반환. 동기 시도 밖(비동기 호출은 task cancel로 멈춤)에서는 timeout 그대로.
+    """
+    current = _current_attempt.get()
+    if current is None:
+        return timeout
+    until, cancelled, clock = current
+    remaining = until - clock()
+    if cancelled.is_set() or remaining <= 0:
+        raise DeadlineExceeded("attempt abandoned before sending (lost the hedge or passed its deadline)")
+    return remaining if timeout is None else min(timeout, remaining)
+
+
+def _sdk_errors(module: str, *names: str) -> tuple:
+    """이미 import된 SDK의 예외 클래스. SDK를 쓰지 않은 실행에서는 그 SDK의 오류가 날 수 없으므로 import하지 않음."""
+    loaded = sys.modules.get(module)
+    return tuple(getattr(loaded, name) for name in names) if loaded is not None else ()
+
+
+def status_code(error: BaseException) -> int | None:
+    """openai.APIStatusError / httpx.HTTPStatusError의 HTTP status."""
+    if isinstance(error, _sdk_errors("openai", "APIStatusError")):
+        return error.status_code
+    if isinstance(error, _sdk_errors("httpx", "HTTPStatusError")):
+        return error.response.status_code
+    return None
+
+
+def retryable(error: BaseException) -> bool:
+    """429/5xx, timeout, 연결 오류만 재시도. 4xx(잘못된 요청, 인증)는 바로 실패."""
+    status = status_code(error)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    return isinstance(error, (TimeoutError,) + _sdk_errors("openai", "APIConnectionError") + _sdk_errors("httpx", "TransportError"))
+
+
+def backoff(attempt: int, base: float = 0.5, cap: float = 20.0, rng: random.Random = random) -> float:
+    """full jitter: 0 ~ min(cap, base * 2^attempt) 사이 균등 분포. 동시에 실패한 요청들이 같은 순간에 재시도하지 않도록."""
+    return rng.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """
+    최근 window개 호출의 오류율이 threshold 이상이면 open: cooldown 동안 보조 backend로 보냄.
+    cooldown이 지나면 half-open으로 시험 호출 1건만 원래 backend로 보내고, 성공하면 close, 실패하면 다시 open.
+    """
+
+    def __init__(self, window: int = 20, threshold: float = 0.5, min_calls: int = 10, cooldown: float = 30.0, clock=time.monotonic):
+        self.outcomes = deque(maxlen=window)
+        self.threshold = threshold
+        self.min_calls = min_calls
+        self.cooldown = cooldown
+        self.clock = clock
+        self.state = "closed"
+        self.opened = 0.0
+        self.trial = False
+        self.opens = 0
+        self.lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """원래 backend로 보내도 되는지. half-open에서는 시험 호출 1건만 허용."""
+        with self.lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and self.clock() - self.opened >= self.cooldown:
+                self.state, self.trial = "half_open", False
+            if self.state == "half_open" and not self.trial:
+                self.trial = True
+                return True
+            return False
+
+    def record(self, success: bool) -> None:
+        with self.lock:
+            if self.state == "half_open" and self.trial:
+                self.trial = False
+                if success:
+                    self.state = "closed"
+                    self.outcomes.clear()
+                else:
+                    self.state, self.opened = "open", self.clock()
+                    self.opens += 1
+                return
+            self.outcomes.append(success)
+            failures = self.outcomes.count(False)
+            if self.state == "closed" and len(self.outcomes) >= self.min_calls and failures / len(self.outcomes) >= self.threshold:
+                self.state, self.opened = "open", self.clock()
+                self.opens += 1
+
+
+class Resilience:
+    """
+    llm_call/llm_samples의 모든 요청이 거치는 계층. model spec("gpt-4.1", "ollama:exaone3.5:latest")별로:
+    - deadline: 재시도와 hedge를 포함한 호출 1건의 시간 제한 (DeadlineExceeded). 마지막이 아닌 시도는 deadline * attempt_share까지만 기다려서
+      멈춘 요청 하나가 deadline을 다 쓰지 않고 재시도할 시간이 남도록 함
+    - hedge: 관측된 latency의 quantile(p95)이 지나도 응답이 없으면 같은 요청을 하나 더 보내고 먼저 끝난 쪽을 사용 (hedge_budget 비율 이내)
+    - retry: 429/5xx/timeout/연결 오류는 full jitter backoff로 최대 retries회 재시도
+    - failover: CircuitBreaker가 open이거나 재시도를 모두 실패하면 failover[spec] backend로 보냄
+    동기 호출은 thread pool에서 실행해서 deadline을 지킴. 진 쪽 hedge나 deadline을 넘긴 시도는 취소 표시만 할 수 있으므로,
+    아직 보내지 않은 요청(pool 대기, rate limit 대기)은 check_attempt에서 멈추고 이미 보낸 요청은 남은 시간으로 건 SDK/httpx timeout에서 끝남.
+    비동기 호출은 진 쪽 task를 cancel.
+    """
+
+    def __init__(self, deadlines: dict = None, timeout: float = None, retries: int = 3, attempt_share: float = 0.5, hedge: float = None, hedge_min: float = 0.5,
+                 hedge_budget: float = 0.1, min_samples: int = 20, failover: dict = None, sleep=time.sleep, async_sleep=asyncio.sleep, clock=time.monotonic):
+        self.lock = threading.Lock()
+        self.sleep, self.async_sleep, self.clock = sleep, async_sleep, clock
+        self.latencies, self.breakers = {}, {}
+        self.executor = None
+        self.configure(deadlines=deadlines or {}, timeout=timeout, retries=retries, attempt_share=attempt_share, hedge=hedge, hedge_min=hedge_min,
+                       hedge_budget=hedge_budget, min_samples=min_samples, failover=failover or {})
+        self.reset()
+
+    def configure(self, **options) -> "Resilience":
+        """main.py 옵션으로 덮어씀: deadlines={spec: 초}, hedge=quantile(0.95) 또는 None, failover={spec: 보조 spec}."""
+        for name, value in options.items():
+            setattr(self, name, value)
+        return self
+
+    def reset(self) -> None:
+        with self.lock:
+            self.counts = {"calls": 0, "retries": 0, "hedges": 0, "hedge_wins": 0, "deadlines": 0, "failovers": 0}
+
+    def count(self, name: str) -> None:
+        with self.lock:
+            self.counts[name] += 1
+
+    def deadline(self, spec: str) -> float:
+        """spec의 deadline. 역할별 설정이 없으면 timeout, timeout도 없으면 llm_timeout()."""
+        return float(self.deadlines.get(spec, self.timeout if self.timeout is not None else llm_timeout()))
+
+    def breaker(self, spec: str) -> CircuitBreaker:
+        with self.lock:
+            if spec not in self.breakers:
+                self.breakers[spec] = CircuitBreaker(clock=self.clock)
+            return self.breakers[spec]
+
+    def observe(self, spec: str, latency: float) -> None:
+        with self.lock:
+            self.latencies.setdefault(spec, deque(maxlen=200)).append(latency)
+
+    def hedge_delay(self, spec: str) -> float | None:
+        """hedge 요청을 보낼 시점(초). hedge가 꺼져 있거나, 관측이 부족하거나, hedge 비율이 예산을 넘으면 None."""
+        if self.hedge is None:
+            return None
+        with self.lock:
+            observed = sorted(self.latencies.get(spec, ()))
+            if len(observed) < self.min_samples or self.counts["hedges"] >= self.hedge_budget * max(1, self.counts["calls"]):
+                return None
+        return max(self.hedge_min, observed[min(len(observed) - 1, int(len(observed) * self.hedge))])
+
+    def route(self, spec: str) -> str:
+        """circuit이 open이면 보조 backend spec. 보조 backend가 없으면 원래 spec (막지 않고 계속 시도)."""
+        if spec in self.failover and not self.breaker(spec).allow():
+            self.count("failovers")
+            return self.failover[spec]
+        return spec
+
+    def _pool(self) -> ThreadPoolExecutor:
+        with self.lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=int(os.getenv("LLM_MAX_WORKERS", 64)), thread_name_prefix="llm")
+            return self.executor
+
+    def _run(self, request, spec: str, until: float, cancelled: threading.Event) -> tuple:
+        # worker thread 안. pool이 밀려서 늦게 시작한 시도는 보내기 전에 멈추고, timeout은 시작 시점의 남은 시간
+        _current_attempt.set((until, cancelled, self.clock))
+        return request(spec, check_attempt())
+
+    def _submit(self, request, spec: str, until: float, cancelled: threading.Event):
+        # row 단위 호출 목록(metrics.row_scope)이 worker thread에서도 보이도록 context를 복사
+        return self._pool().submit(contextvars.copy_context().run, self._run, request, spec, until, cancelled)
+
+    def _attempt(self, spec: str, request, until: float) -> tuple:
+        """요청 1회 (+ hedge 1회). 먼저 성공한 결과를 반환하고, 둘 다 실패하면 마지막 오류, until까지 응답이 없으면 DeadlineExceeded."""
+        started = self.clock()
+        cancelled = threading.Event()
+        pending = {self._submit(request, spec, until, cancelled)}
+        hedge, delay, error = None, self.hedge_delay(spec), None
+        try:
+            while pending:
+                remaining = until - self.clock()
+                if remaining <= 0:
+                    break
+                done, pending = wait(pending, timeout=min(remaining, delay) if delay and hedge is None else remaining, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None:
+                        if future is hedge:
+                            self.count("hedge_wins")
+                        self.observe(spec, self.clock() - started)
+                        return future.result()
+                    error = future.exception()
+                if not done and hedge is None and delay:
+                    hedge = self._submit(request, spec, until, cancelled)
+                    pending.add(hedge)
+                    self.count("hedges")
+        finally:
+            # 진 쪽(또는 deadline을 넘긴) 시도: 아직 시작하지 않았으면 취소, 실행 중이면 보내기 전에 check_attempt에서 멈춤
+            cancelled.set()
+            for future in pending:
+                future.cancel()
+        if error is not None and pending == set():
+            raise error
+        raise DeadlineExceeded(f"{spec}: no response within {until - started:.1f}s")
+
+    async def _aattempt(self, spec: str, request, until: float) -> tuple:
+        started = self.clock()
+        pending = {asyncio.ensure_future(request(spec, until - started))}
+        hedge, delay, error = None, self.hedge_delay(spec), None
+        try:
+            while pending:
+                remaining = until - self.clock()
+                if remaining <= 0:
+                    break
+                done, pending = await asyncio.wait(pending, timeout=min(remaining, delay) if delay and hedge is None else remaining, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.count("hedge_wins")
+                        self.observe(spec, self.clock() - started)
+                        return task.result()
+                    error = task.exception()
+                if not done and hedge is None and delay:
+                    hedge = asyncio.ensure_future(request(spec, until - self.clock()))
+                    pending.add(hedge)
+                    self.count("hedges")
+        finally:
+            # 진 쪽(또는 deadline을 넘긴) 요청은 cancel해서 연결을 바로 돌려받음
+            for task in pending:
+                task.cancel()
+                # cancel 직전에 오류로 끝난 task는 결과를 읽어서 "exception was never retrieved" 경고를 막음
+                task.add_done_callback(lambda task: task.cancelled() or task.exception())
+        if error is not None and not pending:
+            raise error
+        raise DeadlineExceeded(f"{spec}: no response within {until - started:.1f}s")
+
+    def _until(self, attempt: int, spec: str, deadline: float) -> float:
+        """이번 시도를 기다릴 시각. 마지막 시도는 남은 deadline 전부."""
+        if attempt == self.retries:
+            return deadline
+        return min(deadline, self.clock() + self.deadline(spec) * self.attempt_share)
+
+    def _attempts(self, spec: str, request) -> tuple:
+        deadline = self.clock() + self.deadline(spec)
+        breaker = self.breaker(spec)
+        for attempt in range(self.retries + 1):
+            try:
+                result = self._attempt(spec, request, self._until(attempt, spec, deadline))
+            except Exception as error:
+                # 잘못된 요청(4xx) 같은 오류는 backend 상태와 무관하므로 circuit 판단에서 제외
+                if retryable(error):
+                    breaker.record(False)
+                wait_time = backoff(attempt)
+                if not retryable(error) or attempt == self.retries or self.clock() + wait_time >= deadline:
+                    if isinstance(error, DeadlineExceeded):
+                        self.count("deadlines")
+                    raise
+                self.count("retries")
+                self.sleep(wait_time)
+                continue
+            breaker.record(True)
+            return result
+
+    async def _aattempts(self, spec: str, request) -> tuple:
+        deadline = self.clock() + self.deadline(spec)
+        breaker = self.breaker(spec)
+        for attempt in range(self.retries + 1):
+            try:
+                result = await self._aattempt(spec, request, self._until(attempt, spec, deadline))
+            except Exception as error:
+                # 잘못된 요청(4xx) 같은 오류는 backend 상태와 무관하므로 circuit 판단에서 제외
+                if retryable(error):
+                    breaker.record(False)
+                wait_time = backoff(attempt)
+                if not retryable(error) or attempt == self.retries or self.clock() + wait_time >= deadline:
+                    if isinstance(error, DeadlineExceeded):
+                        self.count("deadlines")
+                    raise
+                self.count("retries")
+                await self.async_sleep(wait_time)
+                continue
+            breaker.record(True)
+            return result
+
+    def call(self, spec: str, request) -> tuple:
+        """request(spec, timeout) -> (text, usage)를 deadline/hedge/retry/failover로 감싸서 실행."""
+        self.count("calls")
+        target = self.route(spec)
+        try:
+            return self._attempts(target, request)
+        except Exception as error:
+            if target != spec or spec not in self.failover or not retryable(error):
+                raise
+            self.count("failovers")
+            return self._attempts(self.failover[spec], request)
+
+    async def acall(self, spec: str, request) -> tuple:
+        self.count("calls")
+        target = self.route(spec)
+        try:
+            return await self._aattempts(target, request)
+        except Exception as error:
+            if target != spec or spec not in self.failover or not retryable(error):
+                raise
+            self.count("failovers")
+            return await self._aattempts(self.failover[spec], request)
+
+    def stats(self) -> dict:
+        with self.lock:
+            counts = dict(self.counts)
+            breakers = dict(self.breakers)
+        counts["breakers"] = {spec: {"state": breaker.state, "opens": breaker.opens} for spec, breaker in breakers.items() if breaker.opens}
+        return counts
+
+
+resilience = Resilience()
+
+
+__all__ = ["DEFAULT_LLM_TIMEOUT", "CircuitBreaker", "DeadlineExceeded", "Resilience", "backoff", "check_attempt", "llm_timeout", "resilience", "retryable"]
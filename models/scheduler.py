@@ -0,0 +1,211 @@
+import asyncio
+import os
+import threading
+import time
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken이 없으면 문자 수 기반으로 추정
+    tiktoken = None
+
+
+# 모델별 (RPM, TPM) 기본값. OPENAI_RATE_LIMITS="gpt-4.1-mini=500:200000,gpt-4.1=500:30000" 로 덮어쓸 수 있음
+DEFAULT_RATE_LIMITS = {
+    "gpt-4.1-mini": (500, 200_000),
+    "gpt-4.1": (500, 30_000),
+}
+
+
+def parse_rate_limits(spec: str) -> dict:
+    limits = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        model, _, values = item.partition("=")
+        rpm, _, tpm = values.partition(":")
+        limits[model.strip()] = (int(rpm), int(tpm))
+    return limits
+
+
+def estimate_tokens(prompt, model: str = "gpt-4.1-mini") -> int:
+    """요청에 과금될 prompt token 수 추정. 메시지 리스트도 허용."""
+    if isinstance(prompt, list):
+        return sum(estimate_tokens(message.get("content") or "", model) + 4 for message in prompt)
+    if tiktoken is not None:
+        try:
+            encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            encoding = tiktoken.get_encoding("o200k_base")
+        return len(encoding.encode(prompt))
+    # ASCII는 약 4자당 1토큰, 한글 등 비ASCII는 약 1자당 1토큰
+    ascii_chars = sum(1 for ch in prompt if ord(ch) < 128)
+    return ascii_chars // 4 + (len(prompt) - ascii_chars) + 1
+
+
+class TokenBucket:
+    """분당 rate만큼 채워지는 토큰 버킷. 예약(reserve) 방식이라 잔량이 음수가 될 수 있고, 그만큼 대기."""
+
+    def __init__(self, per_minute: float, clock=time.monotonic):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.clock = clock
+        self.updated = clock()
+
+    def refill(self) -> None:
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount: float) -> float:
+        """amount만큼 차감하고, 잔량이 0 이상이 될 때까지 기다려야 하는 시간(초)을 반환."""
+        self.refill()
+        self.tokens -= min(amount, self.capacity)
+        return max(0.0, -self.tokens / self.rate)
+
+    def refund(self, amount: float) -> None:
+        """쓰지 않은 예약을 되돌림."""
+        self.refill()
+        self.tokens = min(self.capacity, self.tokens + min(amount, self.capacity))
+
+    def sync_remaining(self, remaining: float) -> None:
+        """서버가 알려준 잔량이 더 적으면 그 값에 맞춘다."""
+        self.refill()
+        self.tokens = min(self.tokens, float(remaining))
+
+
+class ModelLimiter:
+    """한 모델의 RPM/TPM 버킷과 대기열 통계."""
+
+    def __init__(self, model: str, rpm: int, tpm: int, clock=time.monotonic):
+        self.model = model
+        self.requests = TokenBucket(rpm, clock=clock)
+        self.tokens = TokenBucket(tpm, clock=clock)
+        self.lock = threading.Lock()
+        self.queue_depth = 0
+        self.stats = {"requests": 0, "tokens": 0, "waited": 0, "total_wait": 0.0, "max_wait": 0.0, "max_queue_depth": 0}
+
+    def reserve(self, tokens: int) -> float:
+        with self.lock:
+            wait = max(self.requests.reserve(1), self.tokens.reserve(tokens))
+            self.stats["requests"] += 1
+            self.stats["tokens"] += tokens
+            if wait > 0:
+                self.queue_depth += 1
+                self.stats["waited"] += 1
+                self.stats["total_wait"] += wait
+                self.stats["max_wait"] = max(self.stats["max_wait"], wait)
+                self.stats["max_queue_depth"] = max(self.stats["max_queue_depth"], self.queue_depth)
+            return wait
+
+    def refund(self, tokens: int) -> None:
+        """대기 중에 취소되어 요청을 보내지 않은 예약을 버킷에 돌려줌."""
+        with self.lock:
+            self.requests.refund(1)
+            self.tokens.refund(tokens)
+            self.stats["requests"] -= 1
+            self.stats["tokens"] -= tokens
+
+    def release(self, wait: float) -> None:
+        if wait > 0:
+            with self.lock:
+                self.queue_depth -= 1
+
+    def update_from_headers(self, headers) -> None:
+        """x-ratelimit-remaining-* 헤더로 버킷 잔량을 보정."""
+        with self.lock:
+            remaining_requests = headers.get("x-ratelimit-remaining-requests")
+            remaining_tokens = headers.get("x-ratelimit-remaining-tokens")
+            if remaining_requests is not None:
+                self.requests.sync_remaining(remaining_requests)
+            if remaining_tokens is not None:
+                self.tokens.sync_remaining(remaining_tokens)
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            stats = dict(self.stats, queue_depth=self.queue_depth)
+        stats["avg_wait"] = stats["total_wait"] / stats["requests"] if stats["requests"] else 0.0
+        return stats
+
+
+class Scheduler:
+    """
+    모델별 ModelLimiter를 관리. 테스트에서는 clock/sleep/async_sleep을 가짜로 주입할 수 있음.
+    limits를 주지 않으면 처음 사용할 때 DEFAULT_RATE_LIMITS에 OPENAI_RATE_LIMITS를 덮어써서 정함 (import 시점에는 .env가 아직 로드되지 않았을 수 있음).
+    """
+
+    def __init__(self, limits: dict = None, clock=time.monotonic, sleep=time.sleep, async_sleep=asyncio.sleep):
+        self.limits = None if limits is None else dict(limits)
+        self.clock = clock
+        self.sleep = sleep
+        self.async_sleep = async_sleep
+        self.limiters = {}
+        self.lock = threading.Lock()
+
+    def rate_limits(self) -> dict:
+        with self.lock:
+            if self.limits is None:
+                self.limits = {**DEFAULT_RATE_LIMITS, **parse_rate_limits(os.getenv("OPENAI_RATE_LIMITS", ""))}
+            return self.limits
+
+    def limiter(self, model: str) -> ModelLimiter | None:
+        if model not in self.rate_limits():
+            return None
+        with self.lock:
+            if model not in self.limiters:
+                rpm, tpm = self.limits[model]
+                self.limiters[model] = ModelLimiter(model, rpm, tpm, clock=self.clock)
+            return self.limiters[model]
+
+    def acquire(self, model: str, tokens: int, check=None) -> float:
+        """
+        요청 1건과 tokens만큼 예약하고 필요한 만큼 대기. check는 예약 전과 대기 후에 부르는 함수 (resilience.check_attempt):
+        예외를 내면 예약을 되돌리고 그대로 올림 (버려진 시도가 한도를 쓰거나 요청을 보내지 않도록).
+        """
+        if check is not None:
+            check()
+        limiter = self.limiter(model)
+        if limiter is None:
+            return 0.0
+        wait = limiter.reserve(tokens)
+        try:
+            if wait > 0:
+                self.sleep(wait)
+                if check is not None:
+                    check()
+        except BaseException:
+            limiter.refund(tokens)
+            raise
+        finally:
+            limiter.release(wait)
+        return wait
+
+    async def acquire_async(self, model: str, tokens: int) -> float:
+        limiter = self.limiter(model)
+        if limiter is None:
+            return 0.0
+        wait = limiter.reserve(tokens)
+        try:
+            if wait > 0:
+                await self.async_sleep(wait)
+        except asyncio.CancelledError:
+            # hedge에 졌거나 deadline을 넘겨 cancel된 task는 요청을 보내지 않으므로 예약을 되돌림
+            limiter.refund(tokens)
+            raise
+        finally:
+            limiter.release(wait)
+        return wait
+
+    def update(self, model: str, headers) -> None:
+        limiter = self.limiter(model)
+        if limiter is not None and headers is not None:
+            limiter.update_from_headers(headers)
+
+    def stats(self) -> dict:
+        with self.lock:
+            limiters = dict(self.limiters)
+        return {model: limiter.snapshot() for model, limiter in limiters.items()}
+
+
+scheduler = Scheduler()
+
+
+__all__ = ["Scheduler", "TokenBucket", "estimate_tokens", "scheduler"]
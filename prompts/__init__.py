@@ -1,6 +1,10 @@
 from .v1 import *
 from .v2 import *
 from .v3 import *
+from .packed import *
+from .messages import *
+from .structured import *
+from .versions import *
 
 final_prompt = """
 최대 시도 횟수에 도달하였습니다.
@@ -0,0 +1,71 @@
+from .v3 import user_query_v3, evaluator_prompt_v3
+
+
+# 정적인 지침을 system 메시지로 분리해서, 모든 row/재시도에서 byte 단위로 동일한 prefix가 되도록 함 (provider prompt caching)
+classifier_system_v3 = user_query_v3.split("건설 현장 작업내용:")[0].strip()
+evaluator_system_v3 = evaluator_prompt_v3.split("사고 유형 분류 결과:")[0].strip()
+
+
+def classifier_messages_v3(input_content: str) -> list:
+    return [
+        {"role": "system", "content": classifier_system_v3},
+        {"role": "user", "content": f"건설 현장 작업내용:\n{input_content}"},
+    ]
+
+
+def evaluator_messages_v3(input_content: str) -> list:
+    # 평가자도 원문을 보고 판단하도록 작업내용을 같이 보냄 (라벨만 보내면 같은 라벨 문자열의 캐시된 판정이 다른 row에 재사용됨)
+    return [
+        {"role": "system", "content": evaluator_system_v3},
+        {"role": "user", "content": f"건설 현장 작업내용:\n{input_content}"},
+    ]
+
+
+def evaluator_text(evaluator_prompt: str, input_content: str) -> str:
+    """문자열 평가 프롬프트(v1/v2/v3) 앞에 평가 대상 작업내용을 붙임. with_labels로 분류 결과를 이어붙이는 형식은 그대로."""
+    return f"건설 현장 작업내용:\n{input_content}\n{evaluator_prompt}"
+
+
+def with_labels(evaluator_prompt, labels: str):
+    """평가 프롬프트에 분류 결과를 붙임. 메시지 리스트면 user 턴으로 추가, 문자열이면 기존처럼 이어붙임."""
+    if isinstance(evaluator_prompt, list):
+        return evaluator_prompt + [{"role": "user", "content": f"사고 유형 분류 결과:\n{labels}"}]
+    return evaluator_prompt + labels
+
+
+def with_feedback(user_query, retries: int, labels: str, evaluation_result: str):
+    """다음 시도를 위해 이전 분류 결과와 피드백을 추가. 메시지 리스트면 assistant/user 턴으로 이어붙여 앞부분 prefix를 유지."""
+    if isinstance(user_query, list):
+        return user_query + [
+            {"role": "assistant", "content": labels},
+            {"role": "user", "content": f"{retries}차 사고 유형 분류 피드백:\n\n{evaluation_result}\n\n피드백을 참고하여 개선된 사고 유형 목록을 다시 출력하세요."},
+        ]
+    user_query += f"\n{retries}차 사고 유형 분류 결과: {labels}\n"
+    user_query += f"\n{retries}차 사고 유형 분류 피드백:\n\n{evaluation_result}\n\n"
+    return user_query
+
+
+def as_text(prompt) -> str:
+    """로그용: 메시지 리스트를 사람이 읽을 수 있는 문자열로."""
+    if isinstance(prompt, list):
+        return "\n".join(f"[{message['role']}]\n{message['content']}" for message in prompt)
+    return prompt
+
+
+def window_history(user_query, base: int, rounds: int = None, summarize: bool = False):
+    """
+    재시도 history 중 마지막 rounds회(assistant 분류 결과 + user 피드백)만 남김. 앞의 base개 메시지(system/작업내용)는 그대로 유지.
+    summarize면 잘라낸 round의 분류 결과를 한 줄씩 요약한 user 메시지로 대신 넣음. 문자열 프롬프트나 rounds=None이면 그대로 반환.
+    """
+    if not isinstance(user_query, list) or rounds is None:
+        return user_query
+    history = user_query[base:]
+    cut = max(0, len(history) - 2 * rounds)
+    if cut == 0:
+        return user_query
+    window = user_query[:base]
+    if summarize:
+        attempts = [message["content"] for message in history[:cut] if message["role"] == "assistant"]
+        summary = "\n".join(f"- {n}차: {labels}" for n, labels in enumerate(attempts, start=1))
+        window.append({"role": "user", "content": f"이전 시도에서 통과하지 못한 사고 유형 분류 결과:\n{summary}"})
+    return window + history[cut:]
@@ -0,0 +1,40 @@
+import hashlib
+
+from .v3 import user_query_v3, evaluator_prompt_v3
+
+
+# v3의 지침 부분은 그대로 두고, 출력 형식만 여러 항목을 번호별 JSON으로 받도록 변경.
+# 정적인 지침은 system 메시지, 번호 매긴 항목은 user 메시지로 분리 (provider prompt caching)
+_classifier_instructions_v3 = user_query_v3.split("해당될 수 있는 모든 사고 유형을")[0]
+_evaluator_instructions_v3 = evaluator_prompt_v3.split("## 평가결과 응답예시")[0]
+
+packed_classifier_system_v3 = _classifier_instructions_v3 + """아래에 번호가 매겨진 여러 건의 건설 현장 작업내용이 주어집니다. 각 항목을 서로 독립적으로 분류하세요.
+항목에 이전 분류 결과와 피드백이 함께 주어진 경우, 그 내용을 참고하여 해당 항목만 개선하세요.
+
+반드시 아래 JSON 형식으로만 출력하고, 모든 번호를 빠짐없이 포함하세요:
+{"results": [{"id": 1, "labels": ["사고 유형", ...]}, ...]}"""
+
+packed_evaluator_system_v3 = _evaluator_instructions_v3 + """## 평가결과 응답예시
+- 번호가 매겨진 여러 건의 건설 현장 작업내용과 그 사고 유형 분류 결과가 주어집니다. 각 항목을 서로 독립적으로 평가하세요.
+- 모든 기준이 충족된 항목은 "PASS", 주요 기준을 충족하지 못한 항목은 "FAIL"로 판정하세요.
+- FAIL인 항목은 어떤 사고 유형이 잘못 포함되었거나 누락되었는지 feedback에 구체적으로 적고, 개선 방향을 제시하세요.
+
+반드시 아래 JSON 형식으로만 출력하고, 모든 번호를 빠짐없이 포함하세요:
+{"results": [{"id": 1, "result": "PASS" 또는 "FAIL", "feedback": "..."}, ...]}"""
+
+
+def packed_messages_v3(items: str) -> list:
+    return [
+        {"role": "system", "content": packed_classifier_system_v3},
+        {"role": "user", "content": f"건설 현장 작업내용 목록:\n{items}"},
+    ]
+
+
+def packed_evaluator_messages_v3(items: str) -> list:
+    return [
+        {"role": "system", "content": packed_evaluator_system_v3},
+        {"role": "user", "content": f"작업내용별 사고 유형 분류 결과 목록:\n{items}"},
+    ]
+
+
+prompt_version_packed_v3 = "packed-v3-" + hashlib.sha256((packed_classifier_system_v3 + packed_evaluator_system_v3).encode("utf-8")).hexdigest()[:12]
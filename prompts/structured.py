@@ -0,0 +1,71 @@
+import hashlib
+import json
+
+from .messages import classifier_system_v3, evaluator_system_v3
+
+
+ACCIDENT_TYPES = ["감전", "기타", "깔림", "끼임", "넘어짐", "떨어짐", "충돌 및 접촉", "절상(절단,찔림,베임)", "질병", "질식", "화상"]
+VERDICTS = ["PASS", "FAIL"]
+
+# JSON schema structured outputs: 분류는 허용된 11개 유형의 enum 배열, 평가는 verdict + reasons
+classifier_schema_v3 = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "accident_types",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "labels": {"type": "array", "items": {"type": "string", "enum": ACCIDENT_TYPES}},
+            },
+            "required": ["labels"],
+            "additionalProperties": False,
+        },
+    },
+}
+
+evaluator_schema_v3 = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "evaluation",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "verdict": {"type": "string", "enum": VERDICTS},
+                "reasons": {"type": "array", "items": {"type": "string"}},
+            },
+            "required": ["verdict", "reasons"],
+            "additionalProperties": False,
+        },
+    },
+}
+
+# 출력 형식 지시만 JSON에 맞게 바꾸고 분류/평가 지침은 v3 그대로 사용
+structured_classifier_system_v3 = classifier_system_v3.replace(
+    "해당될 수 있는 모든 사고 유형을 한글로, 세미콜론으로 구분하여 출력하세요.",
+    "해당될 수 있는 모든 사고 유형을 labels 배열에 담아 JSON으로 출력하세요.",
+)
+structured_evaluator_system_v3 = evaluator_system_v3.split("## 평가결과 응답예시")[0] + """## 평가결과 응답 형식
+- 모든 기준이 충족되었으면 verdict를 "PASS"로 출력하세요.
+- 주요 기준을 충족하지 못한 경우 verdict를 "FAIL"로 출력하고, reasons에 어떤 사고 유형이 잘못 포함되었거나 누락되었는지와 개선 방향을 항목별로 적으세요."""
+
+
+def structured_classifier_messages_v3(input_content: str) -> list:
+    return [
+        {"role": "system", "content": structured_classifier_system_v3},
+        {"role": "user", "content": f"건설 현장 작업내용:\n{input_content}"},
+    ]
+
+
+def structured_evaluator_messages_v3(input_content: str) -> list:
+    return [
+        {"role": "system", "content": structured_evaluator_system_v3},
+        {"role": "user", "content": f"건설 현장 작업내용:\n{input_content}"},
+    ]
+
+
+prompt_version_structured_v3 = "structured-v3-" + hashlib.sha256(
+    (structured_classifier_system_v3 + structured_evaluator_system_v3 + json.dumps([classifier_schema_v3, evaluator_schema_v3])).encode("utf-8")
+).hexdigest()[:12]
+
@@ -1,3 +1,6 @@
+import hashlib
+
+
 user_query_v3 = """
 당신의 목표는 주어진 건설현장 내용을 검토하여, 관련된 인적 사고 유형을 분류하는 것이야.
 아래 제공된 내용을 확인하고 발생 가능성 있거나 직접·간접적으로 연관된 사고 유형을 모두 골라줘.
@@ -70,4 +73,7 @@ evaluator_prompt_v3 = """
 - 주요 기준을 충족하지 못한 경우 "평가결과 = FAIL"을 출력하고, 반드시 핵심적인 문제점을 설명하세요.
 
 사고 유형 분류 결과:
-"""
\ No newline at end of file
+"""
+
+# 프롬프트 문구가 바뀌면 응답 캐시가 자동으로 무효화되도록 템플릿 내용의 해시를 버전으로 사용
+prompt_version_v3 = "v3-" + hashlib.sha256((user_query_v3 + evaluator_prompt_v3).encode("utf-8")).hexdigest()[:12]
\ No newline at end of file
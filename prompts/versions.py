@@ -0,0 +1,57 @@
+import functools
+import hashlib
+
+from .v1 import user_query_v1, evaluator_prompt_v1
+from .v2 import user_query_v2, evaluator_prompt_v2
+from .v3 import user_query_v3, evaluator_prompt_v3, prompt_version_v3
+from .messages import classifier_messages_v3, evaluator_messages_v3, evaluator_text, classifier_system_v3, evaluator_system_v3
+from .structured import (
+    classifier_schema_v3,
+    evaluator_schema_v3,
+    prompt_version_structured_v3,
+    structured_classifier_messages_v3,
+    structured_evaluator_messages_v3,
+)
+
+
+def _version(name: str, *templates: str) -> str:
+    return f"{name}-" + hashlib.sha256("".join(templates).encode("utf-8")).hexdigest()[:12]
+
+
+# 프롬프트 버전별 (분류/평가 프롬프트 builder(input_content), 응답 캐시 버전, structured outputs schema).
+# v1/v2/v3는 "평가결과 = PASS/FAIL" 자유 형식 문자열, messages는 v3를 system/user 메시지로 나눈 것, structured는 JSON schema 응답 (기본값)
+PROMPT_VERSIONS = {
+    "v1": {
+        "classifier": user_query_v1.format,
+        "evaluator": functools.partial(evaluator_text, evaluator_prompt_v1),
+        "version": _version("v1", user_query_v1, evaluator_prompt_v1),
+    },
+    "v2": {
+        "classifier": user_query_v2.format,
+        "evaluator": functools.partial(evaluator_text, evaluator_prompt_v2),
+        "version": _version("v2", user_query_v2, evaluator_prompt_v2),
+    },
+    "v3": {
+        "classifier": user_query_v3.format,
+        "evaluator": functools.partial(evaluator_text, evaluator_prompt_v3),
+        "version": prompt_version_v3,
+    },
+    "messages": {
+        "classifier": classifier_messages_v3,
+        "evaluator": evaluator_messages_v3,
+        "version": _version("messages-v3", classifier_system_v3, evaluator_system_v3),
+    },
+    "structured": {
+        "classifier": structured_classifier_messages_v3,
+        "evaluator": structured_evaluator_messages_v3,
+        "version": prompt_version_structured_v3,
+        "classifier_format": classifier_schema_v3,
+        "evaluator_format": evaluator_schema_v3,
+    },
+}
+
+
+def prompt_version(name: str) -> dict:
+    if name not in PROMPT_VERSIONS:
+        raise ValueError(f"unknown prompt version: {name} (choose from {', '.join(PROMPT_VERSIONS)})")
+    return PROMPT_VERSIONS[name]
@@ -0,0 +1,76 @@
+import glob
+import json
+import os
+
+import pandas as pd
+import pytest
+
+from bench.mock_server import MockServer
+from bench.run import Workspace, run_process
+from utils import group_rows
+
+
+@pytest.fixture
+def workspace():
+    workspace = Workspace(30)
+    yield workspace
+    workspace.cleanup()
+
+
+def read_output(workspace: Workspace) -> pd.DataFrame:
+    paths = glob.glob(os.path.join(workspace.path, "output", "*.csv"))
+    assert len(paths) == 1
+    return pd.read_csv(paths[0], encoding="utf-8-sig")
+
+
+def test_run_against_mock_server(workspace):
+    trial = 3
+    df = pd.read_csv(workspace.input, encoding="utf-8-sig")
+    groups = len(group_rows(df, df["사고분류"].isna()))
+    with MockServer(latency="const:0.01") as server:
+        measured = run_process(workspace.command(concurrency=4, trial=trial), workspace.env(server), workspace.path)
+        stats = server.stats
+
+    assert not measured["killed"]
+    output = read_output(workspace)
+    assert len(output) == 30
+    assert output["neo_사고분류"].notna().all()
+    # loop workflow: 중복 row는 한 번만 분류하고, 분류 1회마다 평가 1회. 시도 횟수는 trial을 넘지 않음
+    assert groups <= stats["classifier"] <= groups * trial
+    assert stats["evaluator"] == stats["classifier"]
+    assert stats["requests"] == stats["classifier"] + stats["evaluator"]
+    assert stats["rate_limited"] == stats["errors"] == 0
+
+
+def batch_lines(llm, batch: dict, file_key: str) -> list:
+    return [json.loads(line) for line in llm.files[batch[file_key]].decode("utf-8").splitlines() if line.strip()]
+
+
+def test_batch_against_mock_server(workspace):
+    df = pd.read_csv(workspace.input, encoding="utf-8-sig")
+    groups = len(group_rows(df, df["사고분류"].isna()))
+    # 첫 round는 절반 정도 FAIL, 두 번째 round는 모두 PASS
+    with MockServer(latency="const:0.01", pass_rates="0.5,1.0") as server:
+        command = workspace.command("batch", poll=0.05, classifier="gpt-4.1-nano", evaluator="gpt-4.1-mini")
+        run_process(command, workspace.env(server), workspace.path)
+        llm = server.httpd.llm
+        batches = [llm.batches[f"batch-{i}"] for i in range(len(llm.batches))]
+
+    output = read_output(workspace)
+    assert len(output) == 30
+    assert output["neo_사고분류"].notna().all()
+
+    # round마다 분류 batch → 평가 batch
+    assert len(batches) == 4
+    classified, evaluated, reclassified, _ = [batch_lines(llm, batch, "input_file_id") for batch in batches]
+    assert len(classified) == groups
+    assert {line["body"]["model"] for line in classified + reclassified} == {"gpt-4.1-nano"}
+    assert {line["body"]["model"] for line in evaluated} == {"gpt-4.1-mini"}
+
+    verdicts = {
+        line["custom_id"]: json.loads(line["response"]["body"]["choices"][0]["message"]["content"])["verdict"]
+        for line in batch_lines(llm, batches[1], "output_file_id")
+    }
+    failed = {custom_id for custom_id, verdict in verdicts.items() if verdict == "FAIL"}
+    assert failed and len(failed) < groups
+    assert {line["custom_id"] for line in reclassified} == failed
@@ -0,0 +1,76 @@
+import os
+
+import pytest
+
+from models.cache import LazyCache, NullCache, ResponseCache, cache_key
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResponseCache(str(tmp_path / "cache.sqlite"))
+
+
+def test_cache_key_depends_on_model_prompt_and_version():
+    messages = [{"role": "user", "content": "작업내용"}]
+    key = cache_key("gpt-4.1-mini", messages, "v3")
+    assert key == cache_key("gpt-4.1-mini", [{"content": "작업내용", "role": "user"}], "v3")
+    assert len({key, cache_key("gpt-4.1", messages, "v3"), cache_key("gpt-4.1-mini", messages, "v2"), cache_key("gpt-4.1-mini", "작업내용", "v3")}) == 4
+
+
+def test_get_put_counts_hits_and_misses(cache):
+    assert cache.get("k") is None
+    cache.put("k", "m", "떨어짐")
+    assert cache.get("k") == "떨어짐"
+    assert cache.stats() == {"hits": 1, "misses": 1, "evictions": 0, "entries": 1, "bytes": len("떨어짐".encode("utf-8")) + 1}
+
+
+def test_put_replaces_and_keeps_size(cache):
+    cache.put("k", "m", "a" * 10)
+    cache.put("k", "m", "b" * 4)
+    assert cache.get("k") == "bbbb"
+    assert cache.stats()["bytes"] == 5
+
+
+def test_entries_survive_reopen(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    ResponseCache(path).put("k", "m", "감전")
+    reopened = ResponseCache(path)
+    assert reopened.get("k") == "감전"
+    assert reopened.stats()["bytes"] == len("감전".encode("utf-8")) + 1
+
+
+def test_eviction_drops_least_recently_used(tmp_path, monkeypatch):
+    ticks = iter(range(1, 1000))
+    monkeypatch.setattr("models.cache.time.time", lambda: next(ticks))
+    # 항목 하나가 key 2 + 응답 8 = 10 bytes. 40 bytes를 넘으면 36 bytes 이하가 될 때까지 삭제
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"), max_bytes=40)
+    for key in ("k1", "k2", "k3", "k4"):
+        cache.put(key, "m", "x" * 8)
+    assert cache.get("k1") is not None
+    cache.put("k5", "m", "x" * 8)
+    assert cache.get("k2") is None
+    assert cache.get("k1") is not None
+    assert cache.get("k5") is not None
+    assert cache.stats()["evictions"] >= 1
+    assert cache.stats()["bytes"] <= 40
+
+
+def test_lazy_cache_reads_env_on_first_use(tmp_path, monkeypatch):
+    lazy = LazyCache()
+    path = tmp_path / "lazy" / "cache.sqlite"
+    monkeypatch.setenv("LLM_CACHE", str(path))
+    assert not path.exists()
+    lazy.put("k", "m", "끼임")
+    assert isinstance(lazy.resolve(), ResponseCache)
+    assert lazy.get("k") == "끼임"
+    assert os.path.exists(path)
+
+
+@pytest.mark.parametrize("value", ["off", "0", "false", ""])
+def test_lazy_cache_off(monkeypatch, value):
+    monkeypatch.setenv("LLM_CACHE", value)
+    lazy = LazyCache()
+    lazy.put("k", "m", "끼임")
+    assert isinstance(lazy.resolve(), NullCache)
+    assert lazy.get("k") is None
+    assert lazy.stats()["entries"] == 0
@@ -0,0 +1,81 @@
+import json
+import os
+
+import pandas as pd
+
+from utils import CheckpointStore, apply_labels, row_keys
+
+
+def frame(n: int) -> pd.DataFrame:
+    return pd.DataFrame({
+        "공정": [f"공정{i}" for i in range(n)],
+        "세부공정": ["세부"] * n,
+        "설비": ["비계"] * n,
+        "물질": [None] * n,
+        "유해위험요인": [f"위험{i}" for i in range(n)],
+        "감소대책": ["안전대 착용"] * n,
+    })
+
+
+def records(keys, label: str) -> list:
+    return [{"key": key, "label": label, "attempts": 1, "elapsed": 0.1, "ts": 0.0} for key in keys]
+
+
+def test_resume_restores_labels_from_previous_process(tmp_path):
+    df = frame(4)
+    keys = row_keys(df)
+    with CheckpointStore(str(tmp_path)).writer() as writer:
+        writer.append(records(keys[:2], "떨어짐"))
+
+    # 재시작: 새 store가 같은 디렉터리에서 기록을 읽고, 처리된 row만 채움
+    resumed = apply_labels(frame(4), CheckpointStore(str(tmp_path)).labels())
+    assert resumed["neo_사고분류"].tolist()[:2] == ["떨어짐", "떨어짐"]
+    assert resumed["neo_사고분류"].isna().tolist()[2:] == [True, True]
+
+
+def test_unclosed_segment_and_torn_line_are_recovered(tmp_path):
+    store = CheckpointStore(str(tmp_path))
+    writer = store.writer()
+    writer.append(records(["a", "b"], "감전"))
+    # 기록 도중 프로세스가 죽어서 마지막 줄이 잘린 경우
+    with open(os.path.join(store.path, writer.segment), "a", encoding="utf-8") as f:
+        f.write('{"key": "c", "lab')
+    assert CheckpointStore(str(tmp_path)).labels() == {"a": "감전", "b": "감전"}
+
+
+def test_latest_record_wins_and_compact_keeps_it(tmp_path):
+    store = CheckpointStore(str(tmp_path))
+    with store.writer() as writer:
+        writer.append(records(["a", "b"], "끼임"))
+    with store.writer() as writer:
+        writer.append(records(["a"], "깔림"))
+    assert store.labels() == {"a": "깔림", "b": "끼임"}
+
+    assert store.compact() == 2
+    assert store.labels() == {"a": "깔림", "b": "끼임"}
+    manifest = store.read_manifest()
+    assert len(manifest["segments"]) == 1
+    assert sorted(name for name in os.listdir(store.path) if name.endswith(".jsonl")) == list(manifest["segments"])
+
+
+def test_records_after_compact_take_precedence(tmp_path):
+    store = CheckpointStore(str(tmp_path))
+    with store.writer() as writer:
+        writer.append(records(["a"], "끼임"))
+    open_writer = store.writer()
+    open_writer.append(records(["a"], "질식"))
+    with store.writer() as writer:
+        writer.append(records(["b"], "화상"))
+    store.compact()
+    assert store.labels() == {"a": "질식", "b": "화상"}
+    open_writer.close()
+
+
+def test_clear_removes_segments(tmp_path):
+    store = CheckpointStore(str(tmp_path))
+    with store.writer() as writer:
+        writer.append(records(["a"], "끼임"))
+    store.clear()
+    assert store.labels() == {}
+    with open(os.path.join(store.path, "manifest.json"), encoding="utf-8") as f:
+        assert json.load(f) == {"segments": {}}
@@ -0,0 +1,66 @@
+import json
+
+import pytest
+
+from chains.parsing import format_feedback, normalize_label, parse_labels, parse_verdict
+
+
+@pytest.mark.parametrize("raw, expected", [
+    ("떨어짐", "떨어짐"),
+    (" 충돌및접촉 ", "충돌 및 접촉"),
+    ("추락", "떨어짐"),
+    ("절단", "절상(절단,찔림,베임)"),
+    ("사고 유형: 감전", "감전"),
+    ("1. 끼임", "끼임"),
+    ("**깔림**", "깔림"),
+    ("낙상", None),
+])
+def test_normalize_label(raw, expected):
+    assert normalize_label(raw) == expected
+
+
+def test_parse_labels_structured_output_is_not_repaired():
+    labels, info = parse_labels(json.dumps({"labels": ["떨어짐", "감전"]}, ensure_ascii=False))
+    # ACCIDENT_TYPES 순서로 정렬
+    assert labels == ["감전", "떨어짐"]
+    assert info == {"repaired": False, "dropped": []}
+
+
+def test_parse_labels_json_inside_text_is_repaired():
+    labels, info = parse_labels('결과는 다음과 같습니다. {"labels": ["끼임"]}')
+    assert labels == ["끼임"]
+    assert info["repaired"] is True
+
+
+def test_parse_labels_free_text_keeps_parenthesised_commas():
+    labels, info = parse_labels("절상(절단,찔림,베임); 추락, 낙상")
+    assert labels == ["떨어짐", "절상(절단,찔림,베임)"]
+    assert info == {"repaired": True, "dropped": ["낙상"]}
+
+
+def test_parse_labels_empty():
+    assert parse_labels("") == ([], {"repaired": True, "dropped": []})
+    assert parse_labels(None)[0] == []
+
+
+def test_parse_verdict_structured():
+    verdict, feedback, repaired = parse_verdict(json.dumps({"verdict": "fail", "reasons": ["근거 부족", "유형 누락"]}, ensure_ascii=False))
+    assert (verdict, feedback, repaired) == ("FAIL", "- 근거 부족\n- 유형 누락", False)
+
+
+@pytest.mark.parametrize("text, verdict, repaired", [
+    ("평가결과 = PASS", "PASS", False),
+    ("분석...\n평가결과: **fail**", "FAIL", True),
+    ("최종 판정은 PASS 입니다", "PASS", True),
+    ("PASS 또는 FAIL 중 하나", None, False),
+    ("판정 없음", None, False),
+])
+def test_parse_verdict_free_text(text, verdict, repaired):
+    parsed, feedback, was_repaired = parse_verdict(text)
+    assert (parsed, was_repaired) == (verdict, repaired)
+    assert feedback == text
+
+
+def test_format_feedback():
+    assert format_feedback("FAIL", "- 근거 부족") == "평가결과 = FAIL\n- 근거 부족"
+    assert format_feedback("PASS", "") == "평가결과 = PASS"
@@ -0,0 +1,72 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from models.resilience import DeadlineExceeded, Resilience, check_attempt, llm_timeout
+
+
+def test_check_attempt_outside_attempt_keeps_timeout():
+    assert check_attempt(5.0) == 5.0
+    assert check_attempt() is None
+
+
+def test_timeout_is_capped_to_remaining_deadline():
+    resilience = Resilience(retries=0, timeout=2.0)
+    timeouts = []
+
+    def request(spec, timeout):
+        timeouts.append((timeout, check_attempt(60.0)))
+        return "ok", {}
+
+    assert resilience.call("m", request) == ("ok", {})
+    assert all(0 < timeout <= 2.0 and 0 < capped <= 2.0 for timeout, capped in timeouts)
+
+
+def test_abandoned_attempt_does_not_send():
+    resilience = Resilience(retries=0, timeout=0.2)
+    resilience.executor = ThreadPoolExecutor(max_workers=1)
+    sent, release = [], threading.Event()
+
+    def request(spec, timeout):
+        # rate limit 대기 중에 deadline이 지난 경우: 요청을 보내기 직전에 check_attempt가 멈춤
+        release.wait(5)
+        check_attempt()
+        sent.append(spec)
+        return "late", {}
+
+    with pytest.raises(DeadlineExceeded):
+        resilience.call("m", request)
+    release.set()
+    resilience.executor.shutdown(wait=True)
+    assert sent == []
+    assert resilience.stats()["deadlines"] == 1
+
+
+def test_queued_attempt_past_deadline_is_skipped():
+    resilience = Resilience(retries=0, timeout=0.1)
+    resilience.executor = ThreadPoolExecutor(max_workers=1)
+    started = []
+    blocker = resilience.executor.submit(time.sleep, 0.3)
+
+    def request(spec, timeout):
+        started.append(timeout)
+        return "late", {}
+
+    with pytest.raises(DeadlineExceeded):
+        resilience.call("m", request)
+    blocker.result()
+    resilience.executor.shutdown(wait=True)
+    assert started == []
+
+
+def test_default_deadline_reads_llm_timeout_on_first_use(monkeypatch):
+    monkeypatch.setenv("LLM_TIMEOUT", "7")
+    llm_timeout.cache_clear()
+    try:
+        assert Resilience().deadline("m") == 7.0
+        assert Resilience(timeout=3.0).deadline("m") == 3.0
+        assert Resilience(deadlines={"m": 9.0}).deadline("m") == 9.0
+    finally:
+        llm_timeout.cache_clear()
@@ -0,0 +1,34 @@
+import pandas as pd
+
+from utils import apply_labels, row_keys
+
+
+def frame(n: int) -> pd.DataFrame:
+    return pd.DataFrame({
+        "공정": [f"공정{i}" for i in range(n)],
+        "세부공정": ["세부"] * n,
+        "설비": ["비계"] * n,
+        "물질": [None] * n,
+        "유해위험요인": [f"위험{i}" for i in range(n)],
+        "감소대책": ["안전대 착용"] * n,
+    })
+
+
+def test_row_keys_are_stable_and_ignore_nan():
+    df = frame(3)
+    assert row_keys(df).tolist() == row_keys(frame(3)).tolist()
+    assert row_keys(df.fillna("")).tolist() == row_keys(df).tolist()
+    assert row_keys(df).nunique() == 3
+
+
+def test_row_keys_ignore_extra_columns_and_index():
+    df = frame(2)
+    shuffled = df.assign(사고분류=["x", "y"]).iloc[::-1]
+    assert row_keys(shuffled).tolist() == row_keys(df).tolist()[::-1]
+
+
+def test_apply_labels_prefers_recovered_labels():
+    df = frame(3).assign(neo_사고분류=["기존", None, "기존"])
+    keys = row_keys(df)
+    merged = apply_labels(df, {keys[0]: "감전", keys[1]: "끼임"})
+    assert merged["neo_사고분류"].tolist() == ["감전", "끼임", "기존"]
@@ -0,0 +1,144 @@
+import asyncio
+
+import pytest
+
+from models.scheduler import DEFAULT_RATE_LIMITS, Scheduler, TokenBucket, parse_rate_limits
+
+
+class FakeClock:
+    """sleep하면 그만큼 시간이 흐르는 가짜 시계."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+    async def async_sleep(self, seconds: float) -> None:
+        self.sleep(seconds)
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def make_scheduler(clock, rpm=60, tpm=6000):
+    return Scheduler(limits={"m": (rpm, tpm)}, clock=clock, sleep=clock.sleep, async_sleep=clock.async_sleep)
+
+
+def test_parse_rate_limits():
+    assert parse_rate_limits("gpt-4.1-mini=500:200000, gpt-4.1=10:3000,") == {"gpt-4.1-mini": (500, 200000), "gpt-4.1": (10, 3000)}
+    assert parse_rate_limits("") == {}
+
+
+def test_bucket_waits_for_refill(clock):
+    bucket = TokenBucket(60, clock=clock)
+    assert bucket.reserve(60) == 0.0
+    # 분당 60 = 초당 1. 잔량 0에서 3개를 예약하면 3초 대기
+    assert bucket.reserve(3) == pytest.approx(3.0)
+    clock.now += 10
+    bucket.refill()
+    assert bucket.tokens == pytest.approx(7.0)
+
+
+def test_bucket_sync_remaining_only_lowers(clock):
+    bucket = TokenBucket(100, clock=clock)
+    bucket.sync_remaining(40)
+    assert bucket.tokens == 40
+    bucket.sync_remaining(90)
+    assert bucket.tokens == 40
+
+
+def test_acquire_within_limits_does_not_sleep(clock):
+    scheduler = make_scheduler(clock)
+    for _ in range(60):
+        assert scheduler.acquire("m", 100) == 0.0
+    assert clock.sleeps == []
+
+
+def test_acquire_over_rpm_sleeps_and_counts(clock):
+    scheduler = make_scheduler(clock, rpm=2, tpm=10_000)
+    scheduler.acquire("m", 1)
+    scheduler.acquire("m", 1)
+    wait = scheduler.acquire("m", 1)
+    assert wait == pytest.approx(30.0)
+    assert clock.sleeps == [pytest.approx(30.0)]
+    stats = scheduler.stats()["m"]
+    assert stats["requests"] == 3
+    assert stats["waited"] == 1
+    assert stats["queue_depth"] == 0
+
+
+def test_acquire_over_tpm_waits_for_tokens(clock):
+    scheduler = make_scheduler(clock, rpm=1000, tpm=600)
+    assert scheduler.acquire("m", 600) == 0.0
+    # 초당 10 token
+    assert scheduler.acquire("m", 50) == pytest.approx(5.0)
+
+
+def test_unknown_model_is_not_limited(clock):
+    scheduler = make_scheduler(clock)
+    assert scheduler.acquire("other", 10**9) == 0.0
+    assert scheduler.stats() == {}
+
+
+def test_failed_check_refunds_reservation(clock):
+    scheduler = make_scheduler(clock, rpm=60, tpm=600)
+    scheduler.acquire("m", 600)
+
+    def abandoned():
+        if clock.now > 0:
+            raise TimeoutError("abandoned")
+
+    with pytest.raises(TimeoutError):
+        scheduler.acquire("m", 300, check=abandoned)
+    limiter = scheduler.limiter("m")
+    # 30초 대기로 -300에서 0까지 채워진 뒤 되돌린 300 token
+    assert limiter.tokens.tokens == pytest.approx(300.0)
+    assert limiter.snapshot()["requests"] == 1
+    assert limiter.queue_depth == 0
+
+
+def test_check_before_reserve_skips_limiter(clock):
+    scheduler = make_scheduler(clock)
+
+    def abandoned():
+        raise TimeoutError("abandoned")
+
+    with pytest.raises(TimeoutError):
+        scheduler.acquire("m", 10, check=abandoned)
+    assert scheduler.stats() == {}
+
+
+def test_acquire_async_uses_async_sleep(clock):
+    scheduler = make_scheduler(clock, rpm=1, tpm=10_000)
+    asyncio.run(scheduler.acquire_async("m", 1))
+    assert asyncio.run(scheduler.acquire_async("m", 1)) == pytest.approx(60.0)
+    assert clock.sleeps == [pytest.approx(60.0)]
+
+
+def test_cancelled_acquire_async_refunds(clock):
+    scheduler = make_scheduler(clock, rpm=1, tpm=10_000)
+    scheduler.acquire("m", 1)
+
+    async def cancelled_sleep(seconds):
+        raise asyncio.CancelledError
+
+    scheduler.async_sleep = cancelled_sleep
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(scheduler.acquire_async("m", 1))
+    assert scheduler.limiter("m").requests.tokens == pytest.approx(0.0)
+    assert scheduler.stats()["m"]["requests"] == 1
+
+
+def test_rate_limits_read_from_env_on_first_use(monkeypatch, clock):
+    scheduler = Scheduler(clock=clock, sleep=clock.sleep)
+    monkeypatch.setenv("OPENAI_RATE_LIMITS", "gpt-4.1-nano=3:300")
+    assert scheduler.rate_limits() == {**DEFAULT_RATE_LIMITS, "gpt-4.1-nano": (3, 300)}
+    assert scheduler.limiter("gpt-4.1-nano") is not None
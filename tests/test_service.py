@@ -0,0 +1,194 @@
+import json
+import logging
+import os
+import signal
+import socket
+import subprocess
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from bench.mock_server import MockServer
+from bench.run import Workspace
+from prompts import ACCIDENT_TYPES
+from utils import MicroBatcher, Overloaded, ServiceServer
+
+
+def post(url: str, body: bytes) -> tuple:
+    request = urllib.request.Request(url, data=body, method="POST", headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status, dict(response.headers), json.loads(response.read())
+    except urllib.error.HTTPError as error:
+        return error.code, dict(error.headers), json.loads(error.read())
+
+
+def item(i: int) -> dict:
+    return {
+        "공정": "철근콘크리트공사", "세부공정": "거푸집 조립", "설비": "비계", "물질": None,
+        "유해위험요인": f"비계 위 이동 중 발을 헛디뎌 떨어짐 위험 (구역 {i})", "감소대책": "안전대 착용 및 작업발판 설치",
+    }
+
+
+@pytest.fixture
+def server():
+    servers = []
+
+    def start(routes: dict) -> ServiceServer:
+        service = ServiceServer(routes, logging.getLogger("test"), port=0)
+        threading.Thread(target=service.serve_forever, daemon=True).start()
+        servers.append(service)
+        return service
+
+    yield start
+    for service in servers:
+        service.shutdown()
+
+
+def test_batcher_groups_concurrent_items():
+    batches = []
+
+    def dispatch(items):
+        batches.append(list(items))
+        return [item * 2 for item in items]
+
+    batcher = MicroBatcher(dispatch, max_batch=4, max_wait=0.2)
+    futures = [batcher.submit(i) for i in range(6)]
+    assert [future.result(timeout=5) for future in futures] == [0, 2, 4, 6, 8, 10]
+    batcher.close()
+    assert [len(batch) for batch in batches] == [4, 2]
+    assert batcher.snapshot()["max_batch"] == 4
+
+
+def test_batcher_rejects_when_queue_is_full():
+    release = threading.Event()
+    started = threading.Event()
+
+    def dispatch(items):
+        started.set()
+        release.wait(5)
+        return items
+
+    batcher = MicroBatcher(dispatch, max_batch=1, max_wait=0.0, max_queue=2)
+    first = batcher.submit("running")
+    assert started.wait(5)
+    # 실행 중 1건 + 대기열 2건이 차면 다음 요청은 바로 거절 (backpressure)
+    queued = [batcher.submit("a"), batcher.submit("b")]
+    with pytest.raises(Overloaded):
+        batcher.submit("c")
+    release.set()
+    assert [future.result(timeout=5) for future in [first] + queued] == ["running", "a", "b"]
+    batcher.close()
+    assert batcher.snapshot()["rejected"] == 1
+    with pytest.raises(Overloaded):
+        batcher.submit("after close")
+
+
+def test_batcher_propagates_dispatch_errors():
+    def dispatch(items):
+        raise ValueError("bad batch")
+
+    batcher = MicroBatcher(dispatch, max_batch=2, max_wait=0.0)
+    future = batcher.submit("x")
+    with pytest.raises(ValueError, match="bad batch"):
+        future.result(timeout=5)
+    batcher.close()
+    assert batcher.snapshot()["errors"] == 1
+
+
+def test_server_maps_overloaded_to_503(server):
+    def overloaded(payload):
+        raise Overloaded("queue is full (2 pending)")
+
+    service = server({("POST", "/classify"): overloaded})
+    status, headers, body = post(service.url + "/classify", b"{}")
+    assert status == 503
+    assert headers["Retry-After"] == "1"
+    assert body == {"error": "queue is full (2 pending)"}
+
+
+def test_server_routes_and_errors(server):
+    def echo(payload):
+        if not payload:
+            raise ValueError("rows required")
+        return 200, {"echo": payload}
+
+    service = server({("POST", "/classify"): echo})
+    assert post(service.url + "/classify", json.dumps({"rows": [1]}).encode())[::2] == (200, {"echo": {"rows": [1]}})
+    assert post(service.url + "/classify", b"null")[::2] == (400, {"error": "rows required"})
+    assert post(service.url + "/classify", b"{not json")[0] == 400
+    assert post(service.url + "/missing", b"{}")[0] == 404
+
+
+@pytest.fixture
+def serve():
+    """mock LLM 서버에 붙인 main.py serve를 subprocess로 띄우고 base url을 반환."""
+    workspace = Workspace(1)
+    mock = MockServer(latency="const:0.2", pass_rates="1.0").start()
+    processes = []
+
+    def start(**options) -> str:
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        stderr = open(os.path.join(workspace.path, "stderr.log"), "ab")
+        process = subprocess.Popen(workspace.command("serve", port=port, **options), env=workspace.env(mock), cwd=workspace.path, stdout=subprocess.DEVNULL, stderr=stderr)
+        stderr.close()
+        processes.append(process)
+        url = f"http://127.0.0.1:{port}"
+        deadline = time.monotonic() + 60
+        while time.monotonic() < deadline:
+            assert process.poll() is None, f"serve exited with {process.returncode}"
+            try:
+                with urllib.request.urlopen(url + "/health", timeout=1):
+                    return url
+            except OSError:
+                time.sleep(0.05)
+        raise TimeoutError("serve did not start")
+
+    start.mock = mock
+    yield start
+    for process in processes:
+        process.send_signal(signal.SIGTERM)
+        process.wait(timeout=30)
+    mock.stop()
+    workspace.cleanup()
+
+
+def test_serve_classifies_and_answers_repeats_from_checkpoint(serve):
+    url = serve(concurrency=2)
+    status, _, body = post(url + "/classify", json.dumps(item(0)).encode())
+    assert status == 200
+    assert body["label"] and set(body["label"].split(";")) <= set(ACCIDENT_TYPES)
+    assert body["checkpoint"] is False
+
+    requests = serve.mock.stats["requests"]
+    status, _, repeated = post(url + "/classify", json.dumps(item(0)).encode())
+    assert status == 200
+    assert (repeated["key"], repeated["label"], repeated["checkpoint"]) == (body["key"], body["label"], True)
+    assert serve.mock.stats["requests"] == requests
+
+    status, _, many = post(url + "/classify", json.dumps({"items": [item(1), item(2)]}).encode())
+    assert status == 200
+    assert [result["checkpoint"] for result in many["results"]] == [False, False]
+    assert all(result["label"] for result in many["results"])
+
+
+def test_serve_rejects_with_503_when_queue_is_full(serve):
+    # 묶음 1건씩, 실행 중 묶음 1개, 대기열 1건: 동시에 보낸 나머지 요청은 바로 503
+    url = serve(batch=1, batch_wait=0, queue=1, inflight=1, concurrency=1)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(lambda i: post(url + "/classify", json.dumps(item(i)).encode()), range(8)))
+    statuses = [status for status, _, _ in results]
+    assert set(statuses) == {200, 503}
+    assert statuses.count(200) <= 3
+    for status, headers, body in results:
+        if status == 503:
+            assert headers["Retry-After"] == "1"
+            assert body["error"].startswith("queue is full")
+        else:
+            assert body["label"]
@@ -0,0 +1,31 @@
+import os
+
+import main
+from models import metrics
+from utils import LeaseTable
+
+
+def test_clear_removes_empty_shards_dir(tmp_path):
+    first = LeaseTable(str(tmp_path), "run-a", 2)
+    second = LeaseTable(str(tmp_path), "run-b", 2)
+    first.clear()
+    # 다른 run의 lease가 남아 있으면 shards 디렉터리는 유지
+    assert os.listdir(tmp_path / "shards") == ["run-b"]
+    second.clear()
+    assert not os.path.exists(tmp_path / "shards")
+
+
+def test_worker_resets_metrics_per_shard(tmp_path, monkeypatch):
+    seen = []
+
+    def shard_main(logger=None, **kwargs):
+        seen.append((kwargs["shard"], metrics.summary()))
+        metrics.record("m", 0.1, {"prompt_tokens": 10})
+
+    monkeypatch.setattr(main, "TEMP_DIR", str(tmp_path))
+    monkeypatch.setattr(main, "main", shard_main)
+    metrics.record("m", 0.1, {"prompt_tokens": 10})
+    main.worker(run_id="run-a", shards=2)
+    assert seen == [(0, {}), (1, {})]
+    assert LeaseTable(str(tmp_path), "run-a", 2).done()
+    metrics.reset()
@@ -0,0 +1,19 @@
+# Checkpoints
+from .checkpoint import *
+
+# Row keys
+from .rowkey import *
+
+# Streaming input/output
+from .streaming import *
+# Sharded runs
+from .sharding import *
+
+# Prompt payloads
+from .content import *
+
+# Resident HTTP service (micro-batching, backpressure)
+from .service import *
+
+# Queued, rotated logs and sampled LLM transcripts
+from .logs import *
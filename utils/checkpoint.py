@@ -0,0 +1,192 @@
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+
+MANIFEST = "manifest.json"
+
+
+def _fsync_dir(path: str) -> None:
+    # 디렉터리 fsync는 POSIX에서만 가능 (Windows는 무시)
+    if os.name != "posix":
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+@contextmanager
+def file_lock(lock_path: str, timeout: float = 30.0):
+    """프로세스 간 lock (O_EXCL lock 파일). 공유 파일시스템에서도 동작. timeout이 지나면 stale lock으로 보고 제거."""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            if time.monotonic() > deadline:
+                try:
+                    os.remove(lock_path)
+                except FileNotFoundError:
+                    pass
+                deadline = time.monotonic() + timeout
+            time.sleep(0.01)
+    try:
+        yield
+    finally:
+        os.close(fd)
+        os.remove(lock_path)
+
+
+class CheckpointWriter:
+    """한 프로세스가 소유하는 append-only segment. append 한 번마다 flush + fsync."""
+
+    def __init__(self, store: "CheckpointStore", segment: str):
+        self.store = store
+        self.segment = segment
+        self.records = 0
+        self.lock = threading.Lock()
+        self.file = open(os.path.join(store.path, segment), "a", encoding="utf-8")
+
+    def append(self, records: list) -> None:
+        if not records:
+            return
+        lines = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+        with self.lock:
+            self.file.write(lines)
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.records += len(records)
+
+    def close(self) -> None:
+        with self.lock:
+            if self.file.closed:
+                return
+            self.file.close()
+        with self.store.locked():
+            manifest = self.store.read_manifest()
+            if self.segment in manifest["segments"]:
+                manifest["segments"][self.segment].update(records=self.records, closed=True)
+                self.store.write_manifest(manifest)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CheckpointStore:
+    """
+    TEMP_DIR/<namespace>/ 아래의 append-only JSONL 체크포인트.
+    row마다 {key, label, attempts, elapsed, ts}만 기록하고, 어떤 segment가 유효한지는 manifest.json이 관리.
+    writer마다 별도 segment를 쓰므로 여러 프로세스/worker가 동시에 기록해도 안전함.
+    """
+
+    def __init__(self, root: str, namespace: str = "default"):
+        self.path = os.path.join(root, namespace)
+        os.makedirs(self.path, exist_ok=True)
+        if not os.path.exists(os.path.join(self.path, MANIFEST)):
+            with self.locked():
+                if not os.path.exists(os.path.join(self.path, MANIFEST)):
+                    self.write_manifest({"segments": {}})
+
+    @contextmanager
+    def locked(self, timeout: float = 30.0):
+        """manifest 갱신용 프로세스 간 lock."""
+        with file_lock(os.path.join(self.path, MANIFEST + ".lock"), timeout):
+            yield
+
+    def read_manifest(self) -> dict:
+        with open(os.path.join(self.path, MANIFEST), encoding="utf-8") as f:
+            return json.load(f)
+
+    def write_manifest(self, manifest: dict) -> None:
+        tmp_path = os.path.join(self.path, f"{MANIFEST}.{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, os.path.join(self.path, MANIFEST))
+        _fsync_dir(self.path)
+
+    def writer(self) -> CheckpointWriter:
+        segment = f"segment-{os.getpid()}-{uuid.uuid4().hex[:8]}.jsonl"
+        with self.locked():
+            manifest = self.read_manifest()
+            manifest["segments"][segment] = {"records": 0, "closed": False, "created": time.time()}
+            self.write_manifest(manifest)
+        return CheckpointWriter(self, segment)
+
+    def iter_records(self):
+        """manifest에 등록된 segment를 순서대로 stream. 기록 도중 끊긴 마지막 줄은 건너뜀."""
+        for segment in self.read_manifest()["segments"]:
+            path = os.path.join(self.path, segment)
+            if not os.path.exists(path):
+                continue
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+
+    def labels(self) -> dict:
+        """{row key: label}. 같은 key가 여러 번 기록되었으면 마지막 값."""
+        return {record["key"]: record["label"] for record in self.iter_records() if record.get("label")}
+
+    def compact(self) -> int:
+        """닫힌 segment들을 key별 마지막 기록만 남긴 하나의 segment로 합침. 합쳐진 record 수를 반환."""
+        with self.locked():
+            manifest = self.read_manifest()
+            closed = [name for name, meta in manifest["segments"].items() if meta.get("closed")]
+            if len(closed) < 2:
+                return 0
+            latest = {}
+            for segment in closed:
+                path = os.path.join(self.path, segment)
+                if not os.path.exists(path):
+                    continue
+                with open(path, encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            record = json.loads(line)
+                        except json.JSONDecodeError:
+                            continue
+                        latest[record["key"]] = record
+            compacted = f"segment-compacted-{uuid.uuid4().hex[:8]}.jsonl"
+            with open(os.path.join(self.path, compacted), "w", encoding="utf-8") as f:
+                for record in latest.values():
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            # 합친 segment를 열려 있는 segment보다 앞에 두어 이후 기록이 우선하도록 함
+            segments = {compacted: {"records": len(latest), "closed": True, "created": time.time()}}
+            segments.update({name: meta for name, meta in manifest["segments"].items() if name not in closed})
+            manifest["segments"] = segments
+            self.write_manifest(manifest)
+        for segment in closed:
+            try:
+                os.remove(os.path.join(self.path, segment))
+            except FileNotFoundError:
+                pass
+        return len(latest)
+
+    def clear(self) -> None:
+        """모든 segment와 manifest를 비움 (출력 파일 저장 성공 후 호출)."""
+        with self.locked():
+            manifest = self.read_manifest()
+            for segment in manifest["segments"]:
+                try:
+                    os.remove(os.path.join(self.path, segment))
+                except FileNotFoundError:
+                    pass
+            self.write_manifest({"segments": {}})
+
+
+__all__ = ["CheckpointStore", "CheckpointWriter", "file_lock"]
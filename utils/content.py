@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+# numpy/pandas는 --help 같은 짧은 실행의 시작 시간을 줄이기 위해 사용하는 함수 안에서 import
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+# (컬럼, 값이 없을 때 넣을 문자열). None이면 str(값) 그대로 사용 (기존 format_input_content와 같은 "nan")
+CONTENT_FIELDS = [
+    ("공정", None),
+    ("세부공정", "누락됨"),
+    ("설비", "없음"),
+    ("물질", "없음"),
+    ("유해위험요인", None),
+    ("감소대책", None),
+]
+
+
+def format_input_content(row: pd.DataFrame) -> str:
+    import pandas as pd
+
+    return "\n".join([
+        f"- 공정: {row['공정']}",
+        f"- 세부공정: {row['세부공정'] if pd.notna(row['세부공정']) else '누락됨'}",
+        f"- 설비: {row['설비'] if pd.notna(row['설비']) else '없음'}",
+        f"- 물질: {row['물질'] if pd.notna(row['물질']) else '없음'}",
+        f"- 유해위험요인: {row['유해위험요인']}",
+        f"- 감소대책: {row['감소대책']}"
+    ])
+
+
+def format_input_contents(df: pd.DataFrame) -> pd.Series:
+    """format_input_content와 같은 문자열을 컬럼 단위 문자열 연산으로 한 번에 생성 (row마다 Series를 만들지 않음). df와 같은 index."""
+    rendered = None
+    for column, missing in CONTENT_FIELDS:
+        values = df[column]
+        text = values.map(str)
+        if missing is not None:
+            text = text.where(values.notna(), missing)
+        text = f"- {column}: " + text
+        rendered = text if rendered is None else rendered + "\n" + text
+    return rendered
+
+
+def normalize_content(content: str) -> str:
+    """중복 판정용 키. 줄마다 공백을 정규화해서 띄어쓰기 차이만 있는 row도 같은 그룹으로 묶는다."""
+    return "\n".join(" ".join(line.split()) for line in content.splitlines())
+
+
+def group_rows(df: pd.DataFrame, mask: pd.Series) -> dict:
+    """mask된 row를 format_input_content 기준으로 묶음. {content: [row 위치, ...]}, 첫 등장 순서 유지."""
+    import numpy as np
+
+    selected = np.asarray(mask, dtype=bool)
+    groups, contents = {}, {}
+    if not selected.any():
+        # 빈 DataFrame은 컬럼 dtype이 섞여(str/object) 문자열 연산이 실패할 수 있음
+        return groups
+    for i, content in zip(np.flatnonzero(selected).tolist(), format_input_contents(df[selected])):
+        key = normalize_content(content)
+        contents.setdefault(key, content)
+        groups.setdefault(contents[key], []).append(i)
+    return groups
+
+
+__all__ = ["format_input_content", "format_input_contents", "group_rows", "normalize_content"]
@@ -0,0 +1,248 @@
+import contextlib
+import contextvars
+import gzip
+import hashlib
+import json
+import logging
+import os
+import queue
+import shutil
+import threading
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+try:
+    import zstandard
+except ImportError:  # zstandard가 없으면 gzip 압축만 지원
+    zstandard = None
+
+
+# rotate된 파일 압축 방식별 확장자
+COMPRESSIONS = {"gzip": ".gz", "zstd": ".zst", "none": ""}
+
+# 현재 처리 중인 row의 transcript (샘플링되지 않은 row는 None). asyncio task마다 context가 복사되므로 동시 실행되는 row끼리 섞이지 않음
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+
+
+def check_compression(method: str) -> str:
+    if method not in COMPRESSIONS:
+        raise ValueError(f"unknown compression: {method} (choose from {', '.join(COMPRESSIONS)})")
+    if method == "zstd" and zstandard is None:
+        raise ValueError("zstd compression requires the zstandard package (pip install zstandard)")
+    return method
+
+
+def compress_file(source: str, target: str, method: str = "gzip") -> str:
+    """source를 method로 압축해서 target에 쓰고 source는 삭제. method가 none이면 이름만 바꿈."""
+    if method == "none":
+        os.replace(source, target)
+        return target
+    with open(source, "rb") as reader, open(target, "wb") as raw:
+        writer = gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6) if method == "gzip" else zstandard.ZstdCompressor(level=3).stream_writer(raw, closefd=False)
+        with writer:
+            shutil.copyfileobj(reader, writer, 1 << 20)
+    os.remove(source)
+    return target
+
+
+class CompressedRotatingFileHandler(RotatingFileHandler):
+    """max_bytes마다 rotate하고 rotate된 파일(name.1.gz, name.2.gz, ...)은 gzip/zstd로 압축. backup_count개보다 오래된 파일은 삭제."""
+
+    def __init__(self, path: str, max_bytes: int = 64 << 20, backup_count: int = 20, compress: str = "gzip"):
+        super().__init__(path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8", delay=True)
+        self.compress = check_compression(compress)
+        self.namer = lambda name: name + COMPRESSIONS[self.compress]
+        self.rotator = lambda source, target: compress_file(source, target, self.compress)
+
+
+class JsonFormatter(logging.Formatter):
+    """한 줄에 JSON 하나: ts, level, logger, msg와 extra={"event": {...}}로 넘긴 필드, 예외 traceback."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if isinstance(getattr(record, "event", None), dict):
+            entry.update(record.event)
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """기본 QueueHandler와 달리 포맷팅을 호출 스레드에서 하지 않고 listener 스레드로 넘김. queue가 가득 차면 기다리지 않고 버린 수만 셈."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _BlockingQueueListener(QueueListener):
+    def enqueue_sentinel(self) -> None:
+        # 종료 표시는 queue가 가득 차 있어도 버리지 않고 자리가 날 때까지 기다림
+        self.queue.put(self._sentinel)
+
+
+class LogPipeline:
+    """
+    logger의 handler(파일, 콘솔)를 background listener 스레드에서 실행: 호출 스레드는 record를 bounded queue에 넣기만 하고
+    포맷팅, 파일 I/O, rotate/압축은 listener가 처리. close()는 queue에 남은 record를 모두 기록한 뒤 handler를 닫음.
+    """
+
+    def __init__(self, logger: logging.Logger, handlers: list, max_queue: int = 10_000):
+        self.logger = logger
+        self.handlers = handlers
+        self.handler = _DeferredQueueHandler(queue.Queue(max_queue))
+        self.listener = _BlockingQueueListener(self.handler.queue, *handlers, respect_handler_level=True)
+        self.listener.start()
+        logger.addHandler(self.handler)
+
+    @property
+    def dropped(self) -> int:
+        return self.handler.dropped
+
+    def close(self) -> None:
+        self.logger.removeHandler(self.handler)
+        self.listener.stop()
+        for handler in self.handlers:
+            handler.close()
+
+
+class TranscriptLog:
+    """
+    샘플링한 row의 LLM 호출(프롬프트, 응답, usage)을 구조화된 JSONL로 기록.
+    - row 단위 샘플링: row_scope(trace(content)) 안의 호출만 기록. content hash로 정하므로 재실행해도 같은 row가 샘플링됨.
+    - 프롬프트 메시지는 내용 hash로 한 번만 저장({"type": "prompt"}), 호출 레코드({"type": "call"})에는 hash 목록만 남김.
+      시스템 프롬프트와 고정된 user_query_v3 본문, 재시도마다 다시 보내는 이전 history가 반복 저장되지 않음.
+    - 호출 스레드는 bounded queue에 넣기만 하고 (가득 차면 버림) 직렬화/파일 I/O/압축은 writer 스레드에서.
+      파일이 max_bytes를 넘으면 name.N.jsonl.gz로 rotate하고, 새 파일에는 필요한 프롬프트를 다시 기록해서 파일마다 독립적으로 읽을 수 있음.
+    """
+
+    def __init__(self):
+        self.path = None
+        self.sample = 0.0
+        self.lock = threading.Lock()
+        self.counts = {"rows": 0, "calls": 0, "prompts": 0, "dropped": 0, "bytes": 0, "rotations": 0}
+        self.queue = None
+        self.thread = None
+
+    def open(self, path: str, sample: float = 0.05, max_bytes: int = 64 << 20, compress: str = "gzip", max_queue: int = 10_000) -> None:
+        self.close()
+        self.path, self.sample, self.max_bytes, self.compress = path, float(sample), max_bytes, check_compression(compress)
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.queue = queue.Queue(max_queue)
+        self.thread = threading.Thread(target=self._run, name="transcripts", daemon=True)
+        self.thread.start()
+
+    def sampled(self, trace: str) -> bool:
+        return self.queue is not None and int(trace, 16) < self.sample * (1 << 64)
+
+    def trace(self, content: str) -> dict | None:
+        """content(row 또는 묶음)의 transcript. 샘플링되지 않았으면 None."""
+        trace = hashlib.sha256(content.encode("utf-8")).hexdigest()[:16]
+        if not self.sampled(trace):
+            return None
+        with self.lock:
+            self.counts["rows"] += 1
+        return {"trace": trace, "seq": 0}
+
+    @contextlib.contextmanager
+    def row_scope(self, trace: dict | None):
+        """블록 안의 record 호출을 trace(self.trace의 반환값)에 이어서 기록. None이면 record가 아무것도 하지 않음."""
+        token = _current_trace.set(trace)
+        try:
+            yield trace
+        finally:
+            _current_trace.reset(token)
+
+    def record(self, model: str, prompt: str | list, response, version: str = "", usage: dict = None) -> None:
+        """LLM 호출 1건. 샘플링된 row_scope 안이 아니면 바로 반환 (hot loop 비용 없음)."""
+        current = _current_trace.get()
+        if current is None or self.queue is None:
+            return
+        current["seq"] += 1
+        entry = {
+            "type": "call", "ts": datetime.now().isoformat(timespec="milliseconds"), "trace": current["trace"], "seq": current["seq"],
+            "model": model, "version": version, "response": response, "usage": usage or {},
+        }
+        try:
+            self.queue.put_nowait((entry, list(prompt) if isinstance(prompt, list) else prompt))
+        except queue.Full:
+            with self.lock:
+                self.counts["dropped"] += 1
+
+    def _run(self) -> None:
+        stream, seen, size = None, set(), 0
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            if stream is None:
+                stream = open(self.path, "ab")
+                size = stream.tell()
+            if size >= self.max_bytes:
+                stream.close()
+                self._rotate()
+                stream, seen, size = open(self.path, "ab"), set(), 0
+            entry, prompt = item
+            messages = prompt if isinstance(prompt, list) else [{"role": "user", "content": prompt}]
+            lines, hashes = [], []
+            for message in messages:
+                content = message.get("content", "")
+                text = content if isinstance(content, str) else json.dumps(content, ensure_ascii=False)
+                digest = hashlib.sha256(f"{message.get('role')}\0{text}".encode("utf-8")).hexdigest()[:16]
+                hashes.append(digest)
+                if digest not in seen:
+                    seen.add(digest)
+                    lines.append(json.dumps({"type": "prompt", "hash": digest, "role": message.get("role"), "content": text}, ensure_ascii=False))
+            lines.append(json.dumps(dict(entry, prompt=hashes), ensure_ascii=False, default=str))
+            data = ("\n".join(lines) + "\n").encode("utf-8")
+            stream.write(data)
+            size += len(data)
+            with self.lock:
+                self.counts["calls"] += 1
+                self.counts["prompts"] += len(lines) - 1
+                self.counts["bytes"] += len(data)
+            if self.queue.empty():
+                stream.flush()
+        if stream is not None:
+            stream.close()
+
+    def _rotate(self) -> None:
+        base, ext = os.path.splitext(self.path)
+        index = 1
+        while any(os.path.exists(f"{base}.{index}{ext}{suffix}") for suffix in COMPRESSIONS.values()):
+            index += 1
+        compress_file(self.path, f"{base}.{index}{ext}{COMPRESSIONS[self.compress]}", self.compress)
+        with self.lock:
+            self.counts["rotations"] += 1
+
+    def stats(self) -> dict:
+        with self.lock:
+            return dict(self.counts, sample=self.sample)
+
+    def close(self) -> None:
+        """queue에 남은 호출을 모두 기록하고 writer 스레드를 종료."""
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join()
+        self.queue = self.thread = None
+
+
+transcripts = TranscriptLog()
+
+
+__all__ = ["COMPRESSIONS", "CompressedRotatingFileHandler", "JsonFormatter", "LogPipeline", "TranscriptLog", "compress_file", "transcripts"]
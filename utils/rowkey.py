@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+# pandas는 --help 같은 짧은 실행의 시작 시간을 줄이기 위해 사용하는 함수 안에서 import
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+KEY_COLUMNS = ["공정", "세부공정", "설비", "물질", "유해위험요인", "감소대책"]
+
+
+def row_keys(df: pd.DataFrame) -> pd.Series:
+    """KEY_COLUMNS 6개 필드로 만든 안정적인 row key(16자리 hex). NaN은 빈 문자열로 정규화."""
+    import pandas as pd
+
+    normalized = df[KEY_COLUMNS].fillna("").astype(str)
+    hashes = pd.util.hash_pandas_object(normalized, index=False)
+    return hashes.map("{:016x}".format)
+
+
+def apply_labels(df: pd.DataFrame, labels: pd.Series | dict, column: str = "neo_사고분류") -> pd.DataFrame:
+    """{row key: label} Series/dict를 한 번의 join으로 df에 반영. 복구된 label이 기존 값보다 우선."""
+    recovered = row_keys(df).map(labels)
+    recovered.index = df.index
+    if column in df.columns:
+        df[column] = recovered.combine_first(df[column])
+    else:
+        df[column] = recovered
+    return df
+
+
+__all__ = ["KEY_COLUMNS", "apply_labels", "row_keys"]
@@ -0,0 +1,192 @@
+import json
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class Overloaded(RuntimeError):
+    """대기열이 가득 참. HTTP 503 + Retry-After로 응답해서 클라이언트가 나중에 다시 보내도록 함."""
+
+
+class MicroBatcher:
+    """
+    동시에 들어온 요청을 모아서 dispatch(items) -> results 한 번으로 처리.
+    첫 요청이 들어온 뒤 max_wait초 동안 또는 max_batch개가 찰 때까지 모으고, 묶음은 최대 inflight개까지 동시에 실행.
+    대기열은 max_queue개로 제한: 가득 차면 submit이 바로 Overloaded를 올림 (backpressure).
+    """
+
+    def __init__(self, dispatch, max_batch: int = 32, max_wait: float = 0.05, max_queue: int = 1024, inflight: int = 1):
+        self.dispatch = dispatch
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.executor = ThreadPoolExecutor(max_workers=inflight, thread_name_prefix="batch")
+        # 실행 중인 묶음 수 제한: 묶음이 모두 실행 중이면 다음 묶음은 그동안 queue에 더 쌓인 요청까지 모아서 보냄
+        self.slots = threading.BoundedSemaphore(inflight)
+        self.lock = threading.Lock()
+        self.stats = {"submitted": 0, "rejected": 0, "batches": 0, "items": 0, "errors": 0, "max_batch": 0, "busy": 0.0}
+        self.running = 0
+        self.closed = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="batcher", daemon=True)
+        self.thread.start()
+
+    def submit(self, item) -> Future:
+        if self.closed.is_set():
+            raise Overloaded("service is shutting down")
+        future = Future()
+        try:
+            self.queue.put_nowait((item, future))
+        except queue.Full:
+            with self.lock:
+                self.stats["rejected"] += 1
+            raise Overloaded(f"queue is full ({self.queue.maxsize} pending)") from None
+        with self.lock:
+            self.stats["submitted"] += 1
+        return future
+
+    def _collect(self) -> list:
+        """첫 요청을 기다린 뒤 max_wait 동안 max_batch개까지 추가로 모음."""
+        while not self.closed.is_set():
+            try:
+                batch = [self.queue.get(timeout=0.1)]
+                break
+            except queue.Empty:
+                continue
+        else:
+            return []
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            self.slots.acquire()
+            batch = self._collect()
+            if not batch:
+                self.slots.release()
+                return
+            with self.lock:
+                self.running += 1
+            self.executor.submit(self._execute, batch)
+
+    def _execute(self, batch: list) -> None:
+        started = time.perf_counter()
+        try:
+            results = self.dispatch([item for item, _ in batch])
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+        except BaseException as error:
+            with self.lock:
+                self.stats["errors"] += 1
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(error)
+        finally:
+            with self.lock:
+                self.running -= 1
+                self.stats["batches"] += 1
+                self.stats["items"] += len(batch)
+                self.stats["max_batch"] = max(self.stats["max_batch"], len(batch))
+                self.stats["busy"] += time.perf_counter() - started
+            self.slots.release()
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            stats = dict(self.stats, queued=self.queue.qsize(), running=self.running)
+        stats["mean_batch"] = round(stats["items"] / stats["batches"], 2) if stats["batches"] else 0.0
+        stats["busy"] = round(stats["busy"], 3)
+        return stats
+
+    def close(self) -> None:
+        """새 요청을 막고, 이미 queue에 있는 요청까지 처리한 뒤 종료."""
+        while not self.queue.empty():
+            time.sleep(0.05)
+        self.closed.set()
+        self.thread.join()
+        self.executor.shutdown(wait=True)
+
+
+class _ServiceHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status: int, payload, headers: dict = None) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _route(self, method: str) -> None:
+        handler = self.server.routes.get((method, self.path.split("?", 1)[0]))
+        if handler is None:
+            return self._send(404, {"error": f"not found: {method} {self.path}"})
+        payload = None
+        if method == "POST":
+            try:
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"null")
+            except (ValueError, UnicodeDecodeError) as error:
+                return self._send(400, {"error": f"invalid JSON: {error}"})
+        try:
+            status, body = handler(payload)
+        except Overloaded as error:
+            return self._send(503, {"error": str(error)}, headers={"Retry-After": "1"})
+        except ValueError as error:
+            return self._send(400, {"error": str(error)})
+        except TimeoutError as error:
+            return self._send(504, {"error": str(error) or "timed out"})
+        except Exception as error:
+            self.server.logger.exception(f"{method} {self.path} 처리 실패")
+            return self._send(500, {"error": f"{type(error).__name__}: {error}"})
+        self._send(status, body)
+
+    def do_GET(self):
+        self._route("GET")
+
+    def do_POST(self):
+        self._route("POST")
+
+
+class _ServiceHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # 기본 backlog(5)로는 클라이언트 여러 개가 동시에 연결할 때 connection reset이 남
+    request_queue_size = 256
+
+
+class ServiceServer:
+    """
+    routes={("POST", "/classify"): handler, ...}를 stdlib ThreadingHTTPServer로 제공. handler(payload) -> (status, JSON body).
+    handler가 올린 Overloaded는 503, ValueError는 400, TimeoutError는 504로 응답.
+    """
+
+    def __init__(self, routes: dict, logger, host: str = "127.0.0.1", port: int = 8000):
+        self.httpd = _ServiceHTTPServer((host, port), _ServiceHandler)
+        self.httpd.routes = routes
+        self.httpd.logger = logger
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def serve_forever(self) -> None:
+        self.httpd.serve_forever()
+
+    def shutdown(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+__all__ = ["MicroBatcher", "Overloaded", "ServiceServer"]
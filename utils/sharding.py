@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import socket
+import threading
+import time
+import uuid
+from typing import TYPE_CHECKING
+
+from .checkpoint import _fsync_dir, file_lock
+
+if TYPE_CHECKING:  # 타입 힌트 전용 (실행 시에는 사용하는 함수 안에서 import)
+    import pandas as pd
+
+
+LEASE_TTL = float(os.getenv("SHARD_LEASE_TTL", 60))
+LEASES = "leases.json"
+
+
+def shard_index(keys: pd.Series, shards: int) -> pd.Series:
+    """row key(16자리 hex hash)로 정해지는 shard 번호. 입력 순서/chunk 크기와 무관하게 같은 row는 항상 같은 shard."""
+    return keys.map(lambda key: int(key, 16) % shards)
+
+
+def shard_run_id(input_path: str, shards: int, start: int = 0, end: int = None) -> str:
+    """같은 입력/구간/shard 수로 다시 실행하면 같은 run id가 되어 이전 shard 체크포인트와 lease를 이어서 사용."""
+    payload = json.dumps([os.path.abspath(input_path), shards, start, end])
+    return "run-" + hashlib.sha256(payload.encode("utf-8")).hexdigest()[:12]
+
+
+def shard_namespace(run_id: str, shard: int) -> str:
+    """shard별로 분리된 CheckpointStore namespace."""
+    return f"{run_id}-shard-{shard}"
+
+
+def lease_owner() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+class LeaseTable:
+    """
+    TEMP_DIR/shards/<run_id>/leases.json에 shard별 lease(owner, heartbeat, attempts, done)를 기록.
+    heartbeat가 ttl보다 오래된 lease는 crash로 보고 다른 worker가 가져감. 같은 파일시스템을 공유하면 다른 머신의 worker도 참여 가능
+    (머신 간 시계 차이는 ttl보다 충분히 작다고 가정).
+    """
+
+    def __init__(self, root: str, run_id: str, shards: int, ttl: float = LEASE_TTL):
+        self.path = os.path.join(root, "shards", run_id)
+        self.shards = shards
+        self.ttl = ttl
+        os.makedirs(self.path, exist_ok=True)
+        with self.locked():
+            if not os.path.exists(os.path.join(self.path, LEASES)):
+                self._write({str(shard): {"owner": None, "heartbeat": 0.0, "attempts": 0, "done": False} for shard in range(shards)})
+
+    def locked(self):
+        return file_lock(os.path.join(self.path, LEASES + ".lock"))
+
+    def _read(self) -> dict:
+        with open(os.path.join(self.path, LEASES), encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write(self, leases: dict) -> None:
+        tmp_path = os.path.join(self.path, f"{LEASES}.{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(leases, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, os.path.join(self.path, LEASES))
+        _fsync_dir(self.path)
+
+    def _stale(self, lease: dict, now: float) -> bool:
+        return lease["owner"] is None or now - lease["heartbeat"] > self.ttl
+
+    def acquire(self, owner: str) -> int | None:
+        """끝나지 않았고 lease가 없거나 만료된 shard 하나를 가져옴. 없으면 None."""
+        with self.locked():
+            leases, now = self._read(), time.time()
+            for shard, lease in leases.items():
+                if lease["done"] or not self._stale(lease, now):
+                    continue
+                lease.update(owner=owner, heartbeat=now, attempts=lease["attempts"] + 1)
+                self._write(leases)
+                return int(shard)
+        return None
+
+    def renew(self, shard: int, owner: str) -> bool:
+        """heartbeat 갱신. lease를 다른 worker가 가져갔으면 False."""
+        with self.locked():
+            leases = self._read()
+            lease = leases[str(shard)]
+            if lease["owner"] != owner:
+                return False
+            lease["heartbeat"] = time.time()
+            self._write(leases)
+            return True
+
+    def complete(self, shard: int, owner: str) -> None:
+        with self.locked():
+            leases = self._read()
+            leases[str(shard)].update(owner=owner, heartbeat=time.time(), done=True)
+            self._write(leases)
+
+    def release(self, shard: int = None, owner: str = None, pid: int = None) -> list:
+        """끝나지 않은 lease를 즉시 반납 (shard/owner 지정, 또는 이 머신의 pid가 소유한 lease). 반납한 shard 목록을 반환."""
+        host = socket.gethostname()
+        released = []
+        with self.locked():
+            leases = self._read()
+            for name, lease in leases.items():
+                if lease["done"] or lease["owner"] is None:
+                    continue
+                if shard is not None and int(name) != shard:
+                    continue
+                if owner is not None and lease["owner"] != owner:
+                    continue
+                if pid is not None and not lease["owner"].startswith(f"{host}:{pid}:"):
+                    continue
+                lease.update(owner=None, heartbeat=0.0)
+                released.append(int(name))
+            if released:
+                self._write(leases)
+        return released
+
+    def status(self) -> dict:
+        with self.locked():
+            return {int(shard): lease for shard, lease in self._read().items()}
+
+    def done(self) -> bool:
+        return all(lease["done"] for lease in self.status().values())
+
+    def clear(self) -> None:
+        shutil.rmtree(self.path, ignore_errors=True)
+        # 다른 run의 lease가 남아 있지 않으면 TEMP_DIR/shards도 삭제
+        try:
+            os.rmdir(os.path.dirname(self.path))
+        except OSError:
+            pass
+
+
+class Heartbeat:
+    """with 블록 동안 백그라운드 스레드에서 lease heartbeat를 ttl/3 간격으로 갱신. lease를 잃으면 lost가 True."""
+
+    def __init__(self, table: LeaseTable, shard: int, owner: str, interval: float = None):
+        self.table, self.shard, self.owner = table, shard, owner
+        self.interval = interval or table.ttl / 3
+        self.stopped = threading.Event()
+        self.lost = False
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self) -> None:
+        while not self.stopped.wait(self.interval):
+            if not self.table.renew(self.shard, self.owner):
+                self.lost = True
+                return
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stopped.set()
+        self.thread.join()
+
+
+__all__ = ["LEASE_TTL", "Heartbeat", "LeaseTable", "lease_owner", "shard_index", "shard_namespace", "shard_run_id"]
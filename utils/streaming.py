@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import csv
+import os
+from itertools import islice
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:  # 타입 힌트 전용 (실행 시에는 사용하는 함수 안에서 import)
+    import pandas as pd
+
+
+def _chunked_frames(rows, columns: list, chunksize: int, offset: int):
+    """row tuple iterator를 chunksize 단위 DataFrame으로 묶음. index는 파일 전체 기준 위치."""
+    import pandas as pd
+
+    while True:
+        block = list(islice(rows, chunksize))
+        if not block:
+            return
+        yield pd.DataFrame(block, columns=columns, index=pd.RangeIndex(offset, offset + len(block)))
+        offset += len(block)
+
+
+def iter_chunks(path: str, chunksize: int = 5000, start: int = 0, end: int = None):
+    """xlsx/csv/parquet 파일을 chunksize row씩 읽어 DataFrame으로 yield. [start:end) 구간만 읽음."""
+    ext = os.path.splitext(path)[1].lower()
+    stop = None if end is None else max(end - start, 0)
+
+    if ext in (".xlsx", ".xlsm"):
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            columns = list(next(rows))
+            yield from _chunked_frames(islice(rows, start, None if end is None else end), columns, chunksize, start)
+        finally:
+            workbook.close()
+
+    elif ext == ".csv":
+        import pandas as pd
+
+        skip = range(1, start + 1) if start else None
+        reader = pd.read_csv(path, chunksize=chunksize, skiprows=skip, nrows=stop)
+        offset = start
+        for chunk in reader:
+            chunk.index = pd.RangeIndex(offset, offset + len(chunk))
+            offset += len(chunk)
+            yield chunk
+
+    elif ext == ".parquet":
+        import pyarrow.parquet as pq
+
+        parquet = pq.ParquetFile(path)
+        columns = parquet.schema_arrow.names
+        rows = (
+            row
+            for batch in parquet.iter_batches(batch_size=chunksize)
+            for row in zip(*(column.to_pylist() for column in batch.columns))
+        )
+        yield from _chunked_frames(islice(rows, start, None if end is None else end), columns, chunksize, start)
+
+    else:
+        raise ValueError(f"Unsupported input format: {path}")
+
+
+class ChunkWriter:
+    """
+    완료된 row를 chunk 단위로 바로 파일에 추가하는 writer.
+    xlsx는 openpyxl write-only 모드, parquet은 row group 단위, csv는 append로 기록해서 메모리 사용량이 일정함.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.ext = os.path.splitext(path)[1].lower()
+        self.columns = None
+        self.rows = 0
+        self._workbook = self._sheet = self._parquet = self._csv = None
+        if self.ext not in (".xlsx", ".csv", ".parquet"):
+            raise ValueError(f"Unsupported output format: {path}")
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def write(self, df: pd.DataFrame) -> None:
+        if df.empty:
+            return
+        if self.columns is None:
+            self._open(list(df.columns))
+        df = df.reindex(columns=self.columns)
+        if self.ext == ".xlsx":
+            for row in df.astype(object).where(df.notna(), None).itertuples(index=False, name=None):
+                self._sheet.append(row)
+        elif self.ext == ".parquet":
+            import pyarrow as pa
+
+            self._parquet.write_table(pa.Table.from_pandas(df.astype(str).where(df.notna(), None), schema=self._schema, preserve_index=False))
+        else:
+            df.to_csv(self._csv, header=False, index=False)
+            self._csv.flush()
+        self.rows += len(df)
+
+    def _open(self, columns: list) -> None:
+        self.columns = columns
+        if self.ext == ".xlsx":
+            from openpyxl import Workbook
+
+            self._workbook = Workbook(write_only=True)
+            self._sheet = self._workbook.create_sheet()
+            self._sheet.append(columns)
+        elif self.ext == ".parquet":
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            # chunk마다 dtype이 달라질 수 있으므로 문자열 스키마로 고정
+            self._schema = pa.schema([(str(column), pa.string()) for column in columns])
+            self._parquet = pq.ParquetWriter(self.path, self._schema)
+        else:
+            self._csv = open(self.path, "w", encoding="utf-8-sig", newline="")
+            csv.writer(self._csv).writerow(columns)
+
+    def close(self) -> None:
+        if self._workbook is not None:
+            self._workbook.save(self.path)
+            self._workbook = None
+        if self._parquet is not None:
+            self._parquet.close()
+            self._parquet = None
+        if self._csv is not None:
+            self._csv.close()
+            self._csv = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+__all__ = ["ChunkWriter", "iter_chunks"]